@@ -0,0 +1,139 @@
+# APLICAÇÃO LOCAL DO MODELO
+# Aplica os índices e o modelo ajustado a um GeoTIFF de bandas já baixado,
+# janela por janela e em vários processos, gerando um Cloud-Optimized GeoTIFF.
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import rasterio
+import rasterio.shutil
+from rasterio.windows import Window
+
+from indices import BANDAS, INDICES_POR_PARAMETRO, bandas_necessarias, calcular_indices_numpy
+
+NODATA = -9999.0
+
+# Estado de cada processo do pool (o dataset é aberto uma vez por processo)
+_ORIGEM = None
+_CONFIG = None
+
+
+def _nomes_das_bandas(src, bandas):
+    """Mapeia nome da banda -> índice (1-based) no arquivo.
+
+    Usa as descrições gravadas no GeoTIFF (o Earth Engine grava o nome das
+    bandas) e, na falta delas, a ordem de `bandas`.
+    """
+    if all(src.descriptions):
+        return {nome: i + 1 for i, nome in enumerate(src.descriptions)}
+    return {nome: i + 1 for i, nome in enumerate(bandas[:src.count])}
+
+
+def _iniciar_processo(caminho, config):
+    global _ORIGEM, _CONFIG
+    _ORIGEM = rasterio.open(caminho)
+    _CONFIG = config
+
+
+def _processar_janela(janela):
+    """Calcula a estimativa de uma janela (executado nos processos do pool)."""
+    cfg = _CONFIG
+    janela = Window(*janela)
+    indices = [cfg['posicoes'][b] for b in cfg['bandas']]
+    dados = _ORIGEM.read(indices, window=janela, out_dtype=np.float32,
+                         masked=True)
+    invalido = np.ma.getmaskarray(dados).any(axis=0)
+    dados = np.ma.getdata(dados) * np.float32(cfg['escala'])
+    bandas = dict(zip(cfg['bandas'], dados))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mndwi = (bandas['B3'] - bandas['B11']) / (bandas['B3'] + bandas['B11'])
+        calculados = calcular_indices_numpy(
+            bandas, list(INDICES_POR_PARAMETRO), nomes=cfg['preditores'])
+
+    estimativa = np.zeros(invalido.shape, dtype=np.float32)
+    for pred, coef in zip(cfg['preditores'], cfg['coeficientes']):
+        valor = bandas[pred] if pred in bandas else calculados[pred]
+        estimativa += np.float32(coef) * valor
+
+    # Mesmo tratamento do app: negativos viram 0 e só a água é mantida
+    estimativa[estimativa < 0] = 0
+    invalido |= ~(mndwi >= cfg['limiar_mndwi']) | ~np.isfinite(estimativa)
+    estimativa[invalido] = NODATA
+    return janela.flatten(), estimativa
+
+
+def _janelas(largura, altura, bloco):
+    for linha in range(0, altura, bloco):
+        for coluna in range(0, largura, bloco):
+            yield (coluna, linha, min(bloco, largura - coluna),
+                   min(bloco, altura - linha))
+
+
+def aplicar_modelo_local(caminho_entrada, coeficientes, caminho_saida,
+                         limiar_mndwi=0.0, escala=1.0, bandas=BANDAS,
+                         bloco=512, processos=None):
+    """Gera o raster de estimativa a partir de um GeoTIFF de bandas.
+
+    `coeficientes` é o dicionário {preditor: coeficiente} de
+    `modelo_final.params`. `escala` converte os valores do arquivo em
+    reflectância (use 0.0001 para números digitais do Sentinel-2). As janelas
+    seguem a grade de blocos da saída (`bloco` x `bloco`), e só poucas janelas
+    por processo ficam em memória ao mesmo tempo, o que mantém o consumo
+    limitado mesmo para um tile inteiro de 10980 x 10980 pixels.
+    """
+    preditores = list(coeficientes)
+    necessarias = sorted(set(bandas_necessarias(preditores)) | {'B3', 'B11'},
+                         key=BANDAS.index)
+
+    with rasterio.open(caminho_entrada) as src:
+        posicoes = _nomes_das_bandas(src, bandas)
+        faltando = [b for b in necessarias if b not in posicoes]
+        if faltando:
+            raise ValueError(f"Bandas ausentes no arquivo: {', '.join(faltando)}")
+        perfil = src.profile.copy()
+        largura, altura = src.width, src.height
+
+    perfil.update(driver='GTiff', count=1, dtype='float32', nodata=NODATA,
+                  tiled=True, blockxsize=bloco, blockysize=bloco,
+                  compress='deflate', predictor=3, BIGTIFF='IF_SAFER')
+    config = {
+        'posicoes': posicoes,
+        'bandas': necessarias,
+        'preditores': preditores,
+        'coeficientes': [float(coeficientes[p]) for p in preditores],
+        'escala': escala,
+        'limiar_mndwi': limiar_mndwi,
+    }
+
+    processos = processos or os.cpu_count() or 1
+    pasta = os.path.dirname(os.path.abspath(caminho_saida))
+    with tempfile.NamedTemporaryFile(suffix='.tif', dir=pasta, delete=False) as tmp:
+        caminho_tmp = tmp.name
+    try:
+        with rasterio.open(caminho_tmp, 'w', **perfil) as dst, \
+                ProcessPoolExecutor(processos, initializer=_iniciar_processo,
+                                    initargs=(caminho_entrada, config)) as pool:
+            dst.set_band_description(1, 'estimativa')
+            pendentes = set()
+            for janela in _janelas(largura, altura, bloco):
+                if len(pendentes) >= 2 * processos:
+                    feitas, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                    for f in feitas:
+                        _gravar(dst, *f.result())
+                pendentes.add(pool.submit(_processar_janela, janela))
+            for f in pendentes:
+                _gravar(dst, *f.result())
+
+        rasterio.shutil.copy(caminho_tmp, caminho_saida, driver='COG',
+                             compress='DEFLATE', predictor='FLOATING_POINT',
+                             blocksize=bloco, overview_resampling='average',
+                             BIGTIFF='IF_SAFER')
+    finally:
+        os.remove(caminho_tmp)
+    return caminho_saida
+
+
+def _gravar(dst, janela, estimativa):
+    dst.write(estimativa, 1, window=Window(*janela))
@@ -1,17 +1,33 @@
 import streamlit as st
 import geemap.foliumap as geemap
-import ee
+import os
 import pandas as pd
 import numpy as np
-import json
 from datetime import datetime
-import statsmodels.api as sm
 import branca.colormap as cm
 
 # Funções externas
-from preprocessing import mask_cloud_and_shadows_sr, load_shapefile_from_zip, export_image
-from prediction_model import calcular_todos_os_modelos_turbidez, calcular_todos_os_modelos_chla, calcular_todos_os_modelos_tss, equacao_bandas, aplicar_modelo_na_imagem
+from preprocessing import load_shapefile_from_zip, export_image, COLUNAS_PARAMETROS
+from indices import calcular_indices, PREDITORES_POR_PARAMETRO
+from extracao import extrair_reflectancias
+from selecao_modelo import METODOS
+from pipeline import ajustar_modelos, roi_do_gdf, colecao_s2, preparar_imagem, estimar
+from cache_reflectancias import CacheReflectancias
+from catalogo import CatalogoCenas
 from report import gerar_relatorio_pdf
+from serie_temporal import estatisticas_por_cena
+from tabelas import FORMATOS, MIME, tabela_em_bytes, tabela_matchups
+from registro_modelos import RegistroModelos
+from camadas_mapa import CacheCamadas
+from grafo_etapas import GrafoEtapas
+from zonas import estatisticas_zonais
+import executor_ee
+import rastreamento
+import sessao_ee
+from rastreamento import etapa
+
+# Novo rastro de tempos a cada execução do script
+rastreamento.iniciar()
 
 # Configuração da página
 st.set_page_config(layout="wide")
@@ -30,31 +46,122 @@ O sistema integra três etapas principais:
 """)
 
 # Autenticação Earth Engine
-service_account = 'scriptspaulo@ee-scriptspaulo.iam.gserviceaccount.com'
-credentials = ee.ServiceAccountCredentials(
-    service_account, r'C:\Users\Paulo\Desktop\UFMG\TCC\ee-scriptspaulo-124cc67658c5.json')
-ee.Initialize(credentials)
+service_account = os.environ.get(
+    'QASAT_EE_CONTA', 'scriptspaulo@ee-scriptspaulo.iam.gserviceaccount.com')
+arquivo_chave = os.environ.get(
+    'QASAT_EE_CHAVE', r'C:\Users\Paulo\Desktop\UFMG\TCC\ee-scriptspaulo-124cc67658c5.json')
+
+
+@st.cache_resource
+def iniciar_earth_engine():
+    # Uma vez por processo; os reruns só conferem a validade do token
+    return sessao_ee.iniciar(service_account, arquivo_chave)
+
+
+iniciar_earth_engine()
+sessao_ee.renovar_token()
+
+
+@st.cache_resource
+def obter_cache_reflectancias():
+    return CacheReflectancias()
+
+
+@st.cache_resource
+def obter_catalogo():
+    return CatalogoCenas()
+
+
+@st.cache_resource
+def obter_camadas():
+    return CacheCamadas()
+
+
+@st.cache_resource
+def obter_registro():
+    return RegistroModelos()
+
+
+@st.cache_resource
+def obter_grafo():
+    """Etapas do app e suas dependências:
+
+    ingestao -> extracao -> indices -> ajuste
+    extracao + indices -> tabela
+    ingestao -> area -> colecao -> imagem -> estimativa
+    ingestao + estimativa -> zonal
+    """
+    grafo = GrafoEtapas()
+
+    @grafo.etapa('ingestao')
+    def _ingestao(arquivo):
+        gdf = load_shapefile_from_zip(arquivo)
+        if gdf is not None and gdf.crs != "EPSG:4326":
+            gdf = gdf.to_crs("EPSG:4326")
+        return gdf
+
+    @grafo.etapa('extracao', depende_de=['ingestao'])
+    def _extracao(ingestao, parametros):
+        return extrair_reflectancias(
+            ingestao, parametros, cache=obter_cache_reflectancias())
+
+    @grafo.etapa('indices', depende_de=['extracao'])
+    def _indices(extracao, parametros):
+        return calcular_indices(extracao[0], parametros)
+
+    @grafo.etapa('ajuste', depende_de=['extracao', 'indices'])
+    def _ajuste(extracao, indices, parametros, metodo, p_limite):
+        return ajustar_modelos(extracao[0], parametros, metodo=metodo,
+                               p_limite=p_limite, df_indices=indices)
+
+    @grafo.etapa('tabela', depende_de=['extracao', 'indices'])
+    def _tabela(extracao, indices, parametros, formato):
+        return tabela_em_bytes(
+            tabela_matchups(extracao[0], indices, parametros), formato)
+
+    @grafo.etapa('area', depende_de=['ingestao'])
+    def _area(ingestao):
+        return roi_do_gdf(ingestao)
+
+    @grafo.etapa('colecao', depende_de=['area'])
+    def _colecao(area, inicio, fim):
+        return colecao_s2(area, inicio, fim)
+
+    @grafo.etapa('imagem', depende_de=['colecao'])
+    def _imagem(colecao, id_cena, parametros):
+        return preparar_imagem(colecao, id_cena, parametros)
+
+    @grafo.etapa('estimativa', depende_de=['imagem'])
+    def _estimativa(imagem, coeficientes, parametros, limiar_mndwi):
+        return estimar(imagem, coeficientes, parametros, limiar_mndwi=limiar_mndwi)
+
+    @grafo.etapa('zonal', depende_de=['ingestao', 'estimativa'])
+    def _zonal(ingestao, estimativa, arquivo_zonas, campo):
+        # Sem um .zip de zonas, os polígonos do próprio shapefile enviado
+        zonas = ingestao if arquivo_zonas is None else load_shapefile_from_zip(arquivo_zonas)
+        if zonas.crs != "EPSG:4326":
+            zonas = zonas.to_crs("EPSG:4326")
+        return estatisticas_zonais(estimativa[0], zonas, campo=campo)
+
+    return grafo
+
 
 # Inicializar mapa
 m = geemap.Map()
 roi = None
+grafo = obter_grafo()
 
 # Upload shapefile
 uploaded_file_roi = st.sidebar.file_uploader(
     "Upload da área de estudo (.zip)", type=['zip'])
 
 if uploaded_file_roi:
-    gdf = load_shapefile_from_zip(uploaded_file_roi)
+    r_ingestao = grafo.executar('ingestao', arquivo=uploaded_file_roi)
+    gdf = r_ingestao.valor
     if gdf is not None:
-        gdf = gdf.to_crs("EPSG:4326") if gdf.crs != "EPSG:4326" else gdf
-
         # Validar colunas
-        parameters = []
-        for param in ['CHLA', 'TURBIDEZ', 'TSS']:
-            if param in gdf.columns:
-                parameters.append(param)
-                gdf[param] = gdf[param].astype(
-                    str).str.replace(',', '.').astype(float)
+        # (já convertidos para número em load_shapefile_from_zip)
+        parameters = [p for p in COLUNAS_PARAMETROS if p in gdf.columns]
 
         if parameters:
             st.sidebar.success(
@@ -67,86 +174,50 @@ if uploaded_file_roi:
             st.error(
                 "O shapefile precisa conter a coluna 'date' no formato YYYY-MM-DD.")
         else:
-            gdf['date'] = pd.to_datetime(gdf['date'])
-            datas_unicas = gdf['date'].dt.date.unique()
-            dados = []
-
-            for data in datas_unicas:
-                pontos_data = gdf[gdf['date'].dt.date == data].copy()
-                pontos_data = pontos_data.drop(columns='date')
-                pontos_ee = ee.FeatureCollection(
-                    json.loads(pontos_data.to_json())['features'])
-
-                imagem = ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED") \
-                    .filterBounds(pontos_ee) \
-                    .filterDate(str(data), str(data + pd.Timedelta(days=1))) \
-                    .map(mask_cloud_and_shadows_sr) \
-                    .first()
-
-                if not imagem:
-                    st.warning(f"Sem imagem Sentinel-2 para {data}.")
-                    continue
-
-                bandas = ['B2', 'B3', 'B4', 'B5',
-                          'B6', 'B8', 'B8A', 'B11', 'B12']
-                imagem = imagem.select(bandas)
-
-                reflectance = imagem.sampleRegions(
-                    collection=pontos_ee, scale=10, geometries=True)
-                features = reflectance.getInfo()['features']
-
-                for f in features:
-                    props = f['properties']
-                    latlon = f['geometry']['coordinates']
-                    row = {b: props.get(b) for b in bandas}
-                    row.update({p: props.get(p) for p in parameters})
-                    row.update(
-                        {'lon': latlon[0], 'lat': latlon[1], 'date': str(data)})
-                    dados.append(row)
-
-            if dados:
-                df_ref = pd.DataFrame(dados)
+            r_extracao = grafo.executar(
+                'extracao', ingestao=r_ingestao, parametros=parameters)
+            df_ref, datas_sem_imagem = r_extracao.valor
+            est = obter_cache_reflectancias().estatisticas()
+            st.sidebar.caption(
+                f"Cache de reflectâncias: {est['acertos']} acertos, "
+                f"{est['faltas']} faltas, {est['entradas']} entradas")
+
+            for data in datas_sem_imagem:
+                st.warning(f"Sem imagem Sentinel-2 para {data}.")
+
+            if not df_ref.empty:
                 st.success("Dados espectrais extraídos com sucesso!")
 
-                for parametro in parameters:
-                    if parametro == 'TURBIDEZ':
-                        df_param = calcular_todos_os_modelos_turbidez(
-                            df_ref.copy())
-                        preditores = ['B2', 'B3', 'B4', 'B5', 'B8', 'Turb1',
-                                      'Turb2', 'Turb3', 'Turb4', 'Turb5', 'Turb6']
-                    elif parametro == 'CHLA':
-                        df_param = calcular_todos_os_modelos_chla(
-                            df_ref.copy())
-                        preditores = ['B2', 'B3', 'B4', 'B5', 'B6', 'B8',
-                                      'B8A', 'Chla1', 'Chla2', 'Chla3', 'Chla4', 'Chla5']
-                    elif parametro == 'TSS':
-                        df_param = calcular_todos_os_modelos_tss(df_ref.copy())
-                        preditores = ['B3', 'B4', 'B5', 'B6', 'B8',
-                                      'B11', 'TSS1', 'TSS2', 'TSS3', 'TSS4']
-                    else:
-                        continue
-
-                    p_limite = st.sidebar.slider(
-                        "Limite de significância (p-valor)", 0.01, 0.1, 0.05, step=0.01)
-
-                    y = df_param[parametro]  # Variável dependente
-                    X = df_param.drop(
-                        columns=[parametro, 'lat', 'lon', 'date'], errors='ignore')
-                    # st.write(X)
-                    #X = sm.add_constant(X)
-                    # st.write(X)
-                    # st.write(y)
-
-                    modelo_inicial = sm.OLS(y, X).fit()
-                    # st.write(modelo_inicial.summary())
-                    p_valores = modelo_inicial.pvalues
-                    # st.write(p_valores)
-                    significativos = p_valores[p_valores <
-                                               p_limite].index.tolist()
-
-                    X_significativos = X[significativos]
-                    # st.write(X_significativos)
-                    modelo_final = sm.OLS(y, X_significativos).fit()
+                # Todos os índices dos parâmetros presentes em uma só passada
+                r_indices = grafo.executar(
+                    'indices', extracao=r_extracao, parametros=parameters)
+                df_indices = r_indices.valor
+
+                p_limite = st.sidebar.slider(
+                    "Limite de significância (p-valor)", 0.01, 0.1, 0.05, step=0.01)
+                metodo_selecao = st.sidebar.selectbox(
+                    "Seleção de preditores", list(METODOS), format_func=METODOS.get)
+
+                # Seleção de preditores, ajuste e validação de todos os parâmetros
+                # (só esta etapa é refeita quando o p-valor ou o método mudam)
+                itens_relatorio = grafo.executar(
+                    'ajuste', extracao=r_extracao, indices=r_indices,
+                    parametros=parameters, metodo=metodo_selecao,
+                    p_limite=p_limite).valor
+                sem_modelo = [p for p in parameters
+                              if p not in {item['parametro'] for item in itens_relatorio}]
+                if sem_modelo:
+                    st.warning("Nenhum preditor selecionado para: "
+                               f"{', '.join(sem_modelo)}. Tente outro método ou p-valor.")
+
+                for item in itens_relatorio:
+                    parametro = item['parametro']
+                    modelo_inicial = item['modelo_inicial']
+                    modelo_final = item['modelo']
+                    validacao = item['validacao']
+                    if item['substituto']:
+                        st.info(f"{parametro}: nenhum preditor com p-valor abaixo de "
+                                f"{p_limite}; o modelo usa o melhor preditor isolado.")
 
                     col1, col2 = st.columns(2)
                     with col1:
@@ -158,19 +229,54 @@ if uploaded_file_roi:
                         st.subheader("Modelo Final")
                         st.markdown(f"```text\n{modelo_final.summary()}\n```")
 
+                    with st.expander(f"Validação do modelo ({parametro})"):
+                        c1, c2, c3 = st.columns(3)
+                        c1.metric("RMSE (ajuste)", f"{validacao['rmse']:.4f}")
+                        c2.metric("RMSE (leave-one-out)", f"{validacao['rmse_loo']:.4f}")
+                        c3.metric(f"RMSE ({validacao['k']}-fold)", f"{validacao['rmse_kfold']:.4f}")
+                        st.caption(
+                            f"IC {validacao['nivel']:.0%} bootstrap do RMSE fora da amostra: "
+                            f"{validacao['rmse_ic'][0]:.4f} – {validacao['rmse_ic'][1]:.4f}")
+                        st.dataframe(validacao['coeficientes'])
+
+                # Registro: guarda os modelos ou soma estes pontos aos já salvos
+                registro = obter_registro()
+                with st.sidebar.expander("Registro de modelos"):
+                    nome_area = st.text_input("Nome da área", "padrao")
+                    tabela_modelos = pd.concat([df_ref, df_indices], axis=1)
+                    if st.button("Salvar modelos ajustados"):
+                        for item in itens_relatorio:
+                            registro.registrar(
+                                tabela_modelos, item['parametro'],
+                                PREDITORES_POR_PARAMETRO[item['parametro']],
+                                metodo=metodo_selecao, p_limite=p_limite,
+                                nome=f"{nome_area}/{item['parametro']}")
+                        registro.salvar()
+                        st.success("Modelos salvos.")
+                    salvos = [f"{nome_area}/{item['parametro']}" for item in itens_relatorio
+                              if f"{nome_area}/{item['parametro']}" in registro.modelos]
+                    if salvos and st.button("Acrescentar estes pontos aos modelos salvos"):
+                        novos = 0
+                        for nome in salvos:
+                            antes = registro.modelos[nome]['n']
+                            novos += registro.atualizar(nome, tabela_modelos)['n'] - antes
+                        if novos:
+                            registro.salvar()
+                            st.success(f"{len(salvos)} modelo(s) atualizado(s).")
+                        else:
+                            st.info("Estes pontos já estão nos modelos salvos.")
+                    st.caption("Pontos já incluídos (mesmo local e data) são ignorados.")
+
             else:
                 st.warning("Falha na extração dos dados espectrais.")
 
-        if 'date' in gdf.columns:
-            gdf = gdf.drop(columns='date')
-        shp_json = gdf.to_json()
-        f_json = json.loads(shp_json)['features']
-        roi = ee.FeatureCollection(f_json)
+        r_area = grafo.executar('area', ingestao=r_ingestao)
+        roi = r_area.valor
     else:
         st.sidebar.error("Erro ao carregar shapefile.")
 
-point = ee.Geometry.Point(-43.97766, -19.85118)
-m.centerObject(point, zoom=15)
+# Centralização local (centerObject consultaria o servidor a cada rerun)
+m.set_center(-43.97766, -19.85118, zoom=15)
 m.setOptions("HYBRID")
 
 st.session_state.setdefault('lista_carregada', False)
@@ -180,7 +286,8 @@ st.session_state.setdefault('collection', None)
 
 if 'df_ref' in locals() and not df_ref.empty:
     st.sidebar.markdown("### Configurações de imagem Sentinel-2")
-    user_max_cloud_coverage = st.sidebar.slider("Nuvem máxima (%)", 0, 100, 5)
+    user_max_cloud_coverage = st.sidebar.slider(
+        "Nuvem máxima sobre a área (%)", 0, 100, 5)
     start_date = st.sidebar.date_input("Data inicial", datetime(2024, 1, 1))
     end_date = st.sidebar.date_input("Data final", datetime.now())
     user_mndwi = st.sidebar.number_input(
@@ -196,71 +303,99 @@ if 'df_ref' in locals() and not df_ref.empty:
         st.session_state['collection'] = None
 
     if st.session_state['lista_carregada']:
-        collection = ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED") \
-            .filterBounds(roi) \
-            .filterDate(str(start_date), str(end_date)) \
-            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', user_max_cloud_coverage)) \
-            .map(mask_cloud_and_shadows_sr)
-
-        st.session_state['collection'] = collection
-
-        info_df = pd.DataFrame({
-            'ID': collection.aggregate_array('system:index').getInfo(),
-            'Data': collection.aggregate_array('system:time_start').map(
-                lambda t: ee.Date(t).format('YYYY-MM-dd')).getInfo(),
-            '% Nuvem': collection.aggregate_array('CLOUDY_PIXEL_PERCENTAGE').getInfo()
-        })
-
-        selected_row = st.selectbox(
+        r_colecao = grafo.executar(
+            'colecao', area=r_area, inicio=str(start_date), fim=str(end_date))
+        collection = r_colecao.valor
+
+        st.session_state['collection'] = r_colecao
+
+        # Metadados e triagem sobre a área vindos do catálogo local: o filtro
+        # de nuvem não vai à rede e a cena com mais água válida vem primeiro
+        catalogo = obter_catalogo()
+        with etapa("catálogo de cenas"):
+            catalogo.sincronizar(roi, start_date, end_date)
+            info_df = catalogo.listar(
+                roi, start_date, end_date, user_max_cloud_coverage, ordem='agua')
+        rotulos = dict(zip(
+            info_df['ID'],
+            info_df['Data']
+            + " | % Nuvem na área: " + info_df['% Nuvem na área'].round(1).astype(str) + "%"
+            + " | % Água válida: " + info_df['% Água válida'].round(1).astype(str) + "%"))
+
+        selected_id = st.selectbox(
             "Imagem:",
-            info_df.apply(
-                lambda row: f"{row['Data']} | % Nebulosidade: {row['% Nuvem']}%", axis=1)
+            info_df['ID'],
+            format_func=rotulos.get
         )
         with st.columns(3)[1]:
             if st.button("Carregar imagem selecionada"):
-                selected_id = info_df.loc[info_df.apply(
-                    lambda row: f"{row['Data']} | % Nebulosidade: {row['% Nuvem']}%", axis=1) == selected_row, 'ID'].values[0]
-
                 st.session_state['selected_id'] = selected_id
                 st.session_state['imagem_carregada'] = True
 
+        # Série temporal: todas as cenas listadas de uma vez
+        if itens_relatorio and st.button("Série temporal (todas as imagens)"):
+            modelos = {item['parametro']: item['modelo'].params.to_dict()
+                       for item in itens_relatorio}
+            barra = st.progress(0.0, text="Resumindo cenas...")
+            with etapa("série temporal", cenas=len(info_df)):
+                serie = estatisticas_por_cena(
+                    collection, info_df['ID'].tolist(), modelos, roi,
+                    limiar_mndwi=user_mndwi,
+                    cache=st.session_state.setdefault('serie_temporal', {}),
+                    progresso=lambda feitas, total: barra.progress(
+                        feitas / max(total, 1), text=f"Cenas resumidas: {feitas}/{total}"))
+            barra.empty()
+            if serie.empty:
+                st.warning("Nenhuma cena pôde ser resumida.")
+            else:
+                st.line_chart(serie[[f"{p}_mean" for p in modelos
+                                     if f"{p}_mean" in serie.columns]])
+                st.dataframe(serie)
+                st.download_button(
+                    label="Baixar série temporal (CSV)",
+                    data=serie.to_csv().encode('utf-8'),
+                    file_name="serie_temporal.csv",
+                    mime="text/csv"
+                )
+
     if st.session_state['imagem_carregada']:
-        image = ee.Image(st.session_state['collection']
-                         .filter(ee.Filter.eq('system:index', st.session_state['selected_id']))
-                         .first())
-
-        bandas = ['B2', 'B3', 'B4', 'B5', 'B6', 'B8', 'B8A', 'B11', 'B12']
-        image = image.select(bandas)
-        image = equacao_bandas(image, parameters)
-        # st.write(image.bandNames().getInfo())
-
-        mndwi = image.normalizedDifference(['B3', 'B11']).rename('MNDWI')
-        mask = mndwi.gte(user_mndwi)
-        mndwi_masked = mndwi.updateMask(mask)
-
-        m.addLayer(image, {'bands': ['B4', 'B3', 'B2'],
-                   'min': 0, 'max': 0.2}, 'Imagem RGB')
-        m.addLayer(mndwi_masked, {'palette': [
-                   'white', 'blue'], 'min': 0, 'max': 1}, 'MNDWI')
-
-        params = modelo_final.params
-        # st.write(params)
-        coeficientes = params.to_dict()
+        # Modelo desta sessão ou um do registro (só os coeficientes)
+        registro = obter_registro()
+        modelo_aplicado = st.sidebar.selectbox(
+            "Modelo aplicado", [None] + registro.nomes(),
+            format_func=lambda nome: "Ajustado nesta sessão" if nome is None else nome)
+        if modelo_aplicado is None:
+            coeficientes = modelo_final.params.to_dict()
+        else:
+            coeficientes = registro.coeficientes(modelo_aplicado)
+            parametro = registro.modelos[modelo_aplicado]['parametro']
+        parametros_imagem = list(dict.fromkeys(parameters + [parametro]))
         st.write(coeficientes)
 
-        estimativa = aplicar_modelo_na_imagem(
-            preditores=list(coeficientes.keys()),
-            coeficientes=coeficientes,
-            image=image
-        )
-
-        estimativa = estimativa.where(estimativa.lt(0), 0)
-        estimativa = estimativa.updateMask(mask).rename("estimativa")
-
+        # O limiar MNDWI só refaz a estimativa (máscara); a imagem fica na memória
+        r_imagem = grafo.executar(
+            'imagem', colecao=st.session_state['collection'],
+            id_cena=st.session_state['selected_id'], parametros=parametros_imagem)
+        image = r_imagem.valor
+        r_estimativa = grafo.executar(
+            'estimativa', imagem=r_imagem, coeficientes=coeficientes,
+            parametros=parametros_imagem, limiar_mndwi=user_mndwi)
+        estimativa, mndwi_masked = r_estimativa.valor
+
+        # Camadas pelo cache de map IDs: só as que mudaram vão ao servidor
+        # (os map IDs que faltam são pedidos em paralelo)
+        camadas = obter_camadas()
         vis_params = {'min': 0, 'max': 5, 'palette': [
             'blue', 'cyan', 'green', 'yellow', 'red']}
 
-        m.addLayer(estimativa, vis_params, f"{parametro} Estimado")
+        camadas.adicionar_varias(m, [
+            (image, {'bands': ['B4', 'B3', 'B2'], 'min': 0, 'max': 0.2},
+             'Imagem RGB', True),
+            (mndwi_masked, {'palette': ['white', 'blue'], 'min': 0, 'max': 1},
+             'MNDWI', True),
+            (estimativa, vis_params, f"{parametro} Estimado", True),
+            (roi, {'color': 'yellow'}, 'Pontos de coleta', True),
+        ])
         unidade = {
             "TURBIDEZ": "NTU",
             "CHLA": "µg/L",
@@ -280,25 +415,63 @@ if 'df_ref' in locals() and not df_ref.empty:
         # Adiciona ao mapa interativo
         colormap.add_to(m)
 
-        m.addLayer(roi, {'color': 'yellow'}, 'Pontos de coleta')
-        m.centerObject(roi)
+        xmin, ymin, xmax, ymax = gdf.total_bounds
+        m.fit_bounds([[ymin, xmin], [ymax, xmax]])
+        est = camadas.estatisticas()
+        st.sidebar.caption(
+            f"Cache de camadas: {est['acertos']} acertos, "
+            f"{est['faltas']} faltas, {est['entradas']} entradas")
 
-        with st.columns(3)[1]:
+        with st.columns(3)[1], etapa("relatório PDF"):
             gerar_relatorio_pdf(
-                parametro=parametro,
-                modelo=modelo_final,
-                X=X[modelo_final.params.index],
-                y=df_param[parametro],
-                image_id=image.get('system:index').getInfo()
+                itens_relatorio,
+                image_id=st.session_state['selected_id']
             )
 
+            # Matchups e índices de todos os parâmetros em um só arquivo
+            formato = st.radio("Formato da tabela", FORMATOS, horizontal=True,
+                               format_func=str.upper)
+            dados_tabela = grafo.executar(
+                'tabela', extracao=r_extracao, indices=r_indices,
+                parametros=parameters, formato=formato).valor
             st.download_button(
-                label="Baixar dados no formato CSV",
-                data=df_param.to_csv(index=False).encode('utf-8'),
-                file_name=f"{parametro}.csv",
-                mime="text/csv"
+                label=f"Baixar dados no formato {formato.upper()}",
+                data=dados_tabela,
+                file_name=f"matchups.{formato}",
+                mime=MIME[formato]
             )
 
+        # Estatísticas por zona (reservatórios, braços...) em uma só requisição
+        with st.expander(f"Estatísticas de {parametro} por zona"):
+            arquivo_zonas = st.file_uploader(
+                "Zonas (.zip com polígonos; padrão: polígonos da área enviada)",
+                type=['zip'])
+            zonas = load_shapefile_from_zip(arquivo_zonas) if arquivo_zonas else gdf
+            if zonas is not None and not zonas.geom_type.isin(['Polygon', 'MultiPolygon']).all():
+                st.info("Envie um shapefile de polígonos para calcular as estatísticas por zona.")
+            elif zonas is not None:
+                campo = st.selectbox(
+                    "Nome da zona", [None] + [c for c in zonas.columns if c != 'geometry'],
+                    format_func=lambda c: "Número do polígono" if c is None else c)
+                if st.button("Calcular estatísticas por zona"):
+                    st.session_state['zonal_calculado'] = True
+                if st.session_state.get('zonal_calculado'):
+                    zonal = grafo.executar(
+                        'zonal', ingestao=r_ingestao, estimativa=r_estimativa,
+                        arquivo_zonas=arquivo_zonas, campo=campo).valor
+                    st.dataframe(zonal.drop(columns='histograma'))
+                    st.bar_chart(pd.DataFrame(
+                        zonal['histograma'].tolist(), index=zonal.index,
+                        columns=[f"{a:g}–{b:g}" for a, b in zip(
+                            zonal.attrs['bordas_histograma'][:-1],
+                            zonal.attrs['bordas_histograma'][1:])]).T)
+                    st.download_button(
+                        label="Baixar estatísticas por zona (CSV)",
+                        data=zonal.to_csv().encode('utf-8'),
+                        file_name=f"{parametro}_zonas.csv",
+                        mime="text/csv"
+                    )
+
         with st.sidebar:
             if st.button("Download Estimativa"):
                 with st.spinner("Baixando.."):
@@ -311,4 +484,15 @@ st.sidebar.markdown("""
 *Trabalho de Conclusão de Curso (2025)*  
 """)
 
-m.to_streamlit()
+with etapa("renderização do mapa"):
+    m.to_streamlit()
+
+with st.sidebar.expander("Etapas (cache)"):
+    st.dataframe(grafo.tabela(), hide_index=True)
+    est = executor_ee.padrao().estatisticas
+    st.caption(
+        f"Executor do EE: {est['enviadas']} requisições, {est['repetidas']} repetidas, "
+        f"{est['compartilhadas']} compartilhadas, {est['falhas']} falhas")
+
+rastreamento.salvar()
+rastreamento.mostrar_cascata()
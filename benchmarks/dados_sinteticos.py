@@ -0,0 +1,79 @@
+# DADOS SINTÉTICOS PARA OS BENCHMARKS
+import io
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+BANDAS = ['B2', 'B3', 'B4', 'B5', 'B6', 'B8', 'B8A', 'B11', 'B12']
+
+
+def tabela_matchups(n, semente=0, parametros=('TURBIDEZ', 'CHLA', 'TSS')):
+    """Tabela no formato de `df_ref` com reflectâncias e parâmetros in situ."""
+    rng = np.random.default_rng(semente)
+    dados = {b: rng.uniform(0.005, 0.2, n) for b in BANDAS}
+    for i, p in enumerate(parametros):
+        dados[p] = 5 + 40 * dados['B4'] - 10 * dados['B2'] + rng.normal(0, 0.5 + i, n)
+    dados['lon'] = rng.uniform(-44.0, -43.9, n)
+    dados['lat'] = rng.uniform(-19.9, -19.8, n)
+    dados['date'] = pd.to_datetime('2024-01-01') + pd.to_timedelta(
+        rng.integers(0, 365, n), unit='D')
+    dados['date'] = dados['date'].dt.strftime('%Y-%m-%d')
+    return pd.DataFrame(dados)
+
+
+class ArquivoEnviado:
+    """Imita o `UploadedFile` do Streamlit."""
+
+    def __init__(self, nome, conteudo):
+        self.name = nome
+        self._conteudo = conteudo
+
+    def getvalue(self):
+        return self._conteudo
+
+    def read(self):
+        return self._conteudo
+
+
+def raster_bandas(caminho, lado, semente=0):
+    """GeoTIFF `lado` x `lado` com as bandas em reflectância, nomeadas na
+    descrição como nos arquivos baixados do Earth Engine."""
+    import rasterio
+    from rasterio.transform import from_origin
+
+    rng = np.random.default_rng(semente)
+    perfil = {'driver': 'GTiff', 'width': lado, 'height': lado, 'count': len(BANDAS),
+              'dtype': 'float32', 'crs': 'EPSG:32723', 'tiled': True,
+              'blockxsize': 256, 'blockysize': 256,
+              'transform': from_origin(600000, 7810000, 10, 10)}
+    with rasterio.open(caminho, 'w', **perfil) as dst:
+        for i, banda in enumerate(BANDAS, 1):
+            dst.write(rng.uniform(0.005, 0.2, (lado, lado)).astype(np.float32), i)
+            dst.set_band_description(i, banda)
+    return caminho
+
+
+def shapefile_zip(n, semente=0, n_datas=30):
+    """Shapefile de pontos com CHLA/TURBIDEZ/TSS com vírgula decimal."""
+    import geopandas as gpd
+
+    rng = np.random.default_rng(semente)
+    datas = pd.date_range('2024-01-01', periods=n_datas, freq='7D').strftime('%Y-%m-%d')
+    gdf = gpd.GeoDataFrame({
+        'CHLA': [f'{v:.3f}'.replace('.', ',') for v in rng.uniform(1, 50, n)],
+        'TURBIDEZ': [f'{v:.3f}'.replace('.', ',') for v in rng.uniform(1, 100, n)],
+        'TSS': [f'{v:.3f}'.replace('.', ',') for v in rng.uniform(1, 80, n)],
+        'date': rng.choice(datas, n),
+    }, geometry=gpd.points_from_xy(rng.uniform(-44.0, -43.9, n),
+                                   rng.uniform(-19.9, -19.8, n)), crs='EPSG:4326')
+
+    buffer = io.BytesIO()
+    with tempfile.TemporaryDirectory() as pasta:
+        gdf.to_file(os.path.join(pasta, 'pontos.shp'))
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for nome in os.listdir(pasta):
+                zf.write(os.path.join(pasta, nome), nome)
+    return ArquivoEnviado('pontos.zip', buffer.getvalue())
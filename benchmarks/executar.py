@@ -0,0 +1,290 @@
+# BENCHMARKS DO PIPELINE
+# Uso (a partir da raiz do repositório):
+#   python -m benchmarks.executar [--rapido] [--latencia 0.1] [--saida bench.json]
+#   python -m benchmarks.executar partida   # import e primeira renderização
+#   python -m benchmarks.executar aplicacao_local   # modelo sobre um GeoTIFF
+#
+# O Earth Engine é substituído por `benchmarks.fake_ee`, então nenhuma
+# credencial é necessária. O resultado é um JSON com tempo de execução,
+# pico de memória (tracemalloc) e número de chamadas bloqueantes ao EE de
+# cada caso, identificado pelo commit atual.
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks import fake_ee
+
+# O módulo simulado precisa estar instalado antes de importar o app
+SERVIDOR = fake_ee.instalar()
+
+import statsmodels.api as sm  # noqa: E402
+
+import preprocessing  # noqa: E402
+import report  # noqa: E402
+from aplicacao_local import aplicar_modelo_local  # noqa: E402
+from benchmarks.dados_sinteticos import raster_bandas, shapefile_zip, tabela_matchups  # noqa: E402
+from catalogo import CatalogoCenas  # noqa: E402
+from extracao import extrair_reflectancias  # noqa: E402
+from indices import PREDITORES_POR_PARAMETRO, adicionar_indices, calcular_indices  # noqa: E402
+from pipeline import processar_area  # noqa: E402
+from prediction_model import (calcular_todos_os_modelos_chla,  # noqa: E402
+                              calcular_todos_os_modelos_tss,
+                              calcular_todos_os_modelos_turbidez)
+from selecao_modelo import METODOS, selecionar_modelos  # noqa: E402
+from validacao import validar_modelo  # noqa: E402
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def medir(nome, funcao, repeticoes=3, preparar=None, **info):
+    """Tempo (melhor e mediana), pico de memória e chamadas ao EE."""
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        SERVIDOR.zerar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    chamadas, bytes_ee = SERVIDOR.chamadas, SERVIDOR.bytes
+
+    # Execução separada para a memória, já que o tracemalloc deixa tudo mais lento
+    if preparar:
+        preparar()
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    resultado = {'nome': nome, **info,
+                 'tempo_s': min(tempos),
+                 'tempo_mediano_s': statistics.median(tempos),
+                 'pico_mb': pico / 2 ** 20,
+                 'chamadas_ee': chamadas,
+                 'bytes_ee': bytes_ee}
+    print(f"{nome:<40} {json.dumps(info):<30} {resultado['tempo_s']:9.4f} s "
+          f"{resultado['pico_mb']:9.1f} MB {chamadas:5d} chamadas", file=sys.stderr)
+    return resultado
+
+
+# ------------------------- Casos -------------------------
+def bench_indices(tamanhos):
+    funcoes = {
+        'turbidez': calcular_todos_os_modelos_turbidez,
+        'chla': calcular_todos_os_modelos_chla,
+        'tss': calcular_todos_os_modelos_tss,
+    }
+    for n in tamanhos:
+        df = tabela_matchups(n)
+        for nome, funcao in funcoes.items():
+            yield medir(f'indices.{nome}', lambda: funcao(df), linhas=n)
+        yield medir('indices.todos', lambda: calcular_indices(df, list(PREDITORES_POR_PARAMETRO)),
+                    linhas=n)
+
+
+def bench_selecao(tamanhos):
+    for n in tamanhos:
+        df = adicionar_indices(tabela_matchups(n), list(PREDITORES_POR_PARAMETRO))
+        for metodo in METODOS:
+            yield medir('selecao.' + metodo,
+                        lambda: selecionar_modelos(df, PREDITORES_POR_PARAMETRO, metodo),
+                        linhas=n)
+        # Referência: o ajuste único com statsmodels que o app fazia antes
+        yield medir('selecao.statsmodels_unico', lambda: [
+            sm.OLS(df[p], df[c]).fit() for p, c in PREDITORES_POR_PARAMETRO.items()], linhas=n)
+
+
+def _itens_relatorio(n):
+    df = adicionar_indices(tabela_matchups(n), list(PREDITORES_POR_PARAMETRO))
+    selecoes = selecionar_modelos(df, PREDITORES_POR_PARAMETRO, 'backward')
+    itens = []
+    for parametro, sel in selecoes.items():
+        X = df[sel['preditores'] or PREDITORES_POR_PARAMETRO[parametro]]
+        itens.append({'parametro': parametro, 'modelo': sm.OLS(df[parametro], X).fit(),
+                      'X': X, 'y': df[parametro], 'validacao': validar_modelo(X, df[parametro])})
+    return itens
+
+
+def bench_relatorio():
+    itens = _itens_relatorio(200)
+
+    def limpar():
+        report._CACHE_FIGURAS.clear()
+        report._CACHE_PDFS.clear()
+
+    yield medir('relatorio.frio', lambda: report.montar_relatorio_pdf(itens, 'cena'),
+                preparar=limpar, parametros=len(itens))
+    yield medir('relatorio.em_cache', lambda: report.montar_relatorio_pdf(itens, 'cena'),
+                parametros=len(itens))
+    X, y = itens[0]['X'], itens[0]['y']
+    yield medir('validacao.validar_modelo', lambda: validar_modelo(X, y), linhas=len(y))
+
+
+def bench_shapefile(tamanhos):
+    for n in tamanhos:
+        arquivo = shapefile_zip(n)
+        yield medir('shapefile.frio', lambda: preprocessing.load_shapefile_from_zip(arquivo),
+                    preparar=preprocessing._CACHE_SHAPEFILES.clear, pontos=n)
+        yield medir('shapefile.em_cache', lambda: preprocessing.load_shapefile_from_zip(arquivo),
+                    pontos=n)
+
+
+def bench_aplicacao_local(lados, processos=4):
+    """Modelo ajustado aplicado a um GeoTIFF de bandas, janela por janela.
+
+    O pico de memória medido é o do processo principal; as janelas são
+    calculadas nos processos do pool.
+    """
+    coeficientes = _itens_relatorio(200)[0]['modelo'].params.to_dict()
+    with tempfile.TemporaryDirectory() as pasta:
+        for lado in lados:
+            entrada = raster_bandas(os.path.join(pasta, f'bandas_{lado}.tif'), lado)
+            saida = os.path.join(pasta, f'estimativa_{lado}.tif')
+            yield medir('aplicacao_local',
+                        lambda: aplicar_modelo_local(entrada, coeficientes, saida,
+                                                     processos=processos),
+                        repeticoes=2, pixels=lado * lado, processos=processos)
+
+
+def _tempos_de_import(stderr, quantos=10):
+    """Imports de primeiro nível mais lentos, pela saída do -X importtime."""
+    tempos = []
+    for linha in stderr.splitlines():
+        if not linha.startswith('import time:') or '|' not in linha:
+            continue
+        _, acumulado, modulo = linha.split('|')
+        if acumulado.strip().isdigit() and not modulo[1:].startswith(' '):
+            tempos.append((int(acumulado) / 1e6, modulo.strip()))
+    return [{'modulo': m, 'tempo_s': t} for t, m in sorted(tempos, reverse=True)[:quantos]]
+
+
+def bench_partida(repeticoes):
+    """Partida a frio do app, cada repetição em um interpretador novo."""
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    execucoes, stderr = [], ''
+    for _ in range(repeticoes):
+        processo = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-m', 'benchmarks.partida'],
+            cwd=raiz, capture_output=True, text=True, check=True)
+        execucoes.append(json.loads(processo.stdout.splitlines()[-1]))
+        stderr = processo.stderr
+
+    for medida in ('importacao_s', 'primeira_renderizacao_s', 'rerun_s'):
+        tempos = [e[medida] for e in execucoes if medida in e]
+        if not tempos:
+            continue
+        ultima = execucoes[-1]
+        resultado = {'nome': 'partida.' + medida[:-2],
+                     'tempo_s': min(tempos),
+                     'tempo_mediano_s': statistics.median(tempos)}
+        if medida == 'importacao_s':
+            resultado['pesados_carregados'] = ultima['pesados_carregados']
+            resultado['imports_mais_lentos'] = _tempos_de_import(stderr)
+        else:
+            resultado['chamadas_ee'] = ultima[medida[:-2] + '_chamadas_ee']
+            resultado['erros_app'] = ultima['erros_app']
+        print(f"{resultado['nome']:<40} {'':<30} {resultado['tempo_s']:9.4f} s",
+              file=sys.stderr)
+        yield resultado
+
+
+def bench_extracao(tamanhos):
+    """Extração das reflectâncias nos dois modos, sem cache."""
+    for n in tamanhos:
+        preprocessing._CACHE_SHAPEFILES.clear()
+        gdf = preprocessing.load_shapefile_from_zip(shapefile_zip(n))
+        parametros = [p for p in preprocessing.COLUNAS_PARAMETROS if p in gdf.columns]
+        for modo in ('lote', 'por_data'):
+            yield medir('extracao', lambda: extrair_reflectancias(gdf, parametros, modo=modo),
+                        repeticoes=2, pontos=n, modo=modo, latencia_s=SERVIDOR.latencia)
+
+
+def bench_pipeline(tamanhos):
+    """`pipeline.processar_area`, o fluxo da linha de comando (qasat.py), do
+    .zip ao relatório, sem baixar o raster. A interface (app.py) só é
+    medida no caso `partida`."""
+    with tempfile.TemporaryDirectory() as pasta:
+        for n in tamanhos:
+            caminho = os.path.join(pasta, f'pontos_{n}.zip')
+            with open(caminho, 'wb') as f:
+                f.write(shapefile_zip(n).getvalue())
+
+            def executar():
+                preprocessing._CACHE_SHAPEFILES.clear()
+                report._CACHE_PDFS.clear()
+                catalogo = CatalogoCenas(os.path.join(pasta, f'catalogo_{time.time_ns()}.sqlite'))
+                processar_area(caminho, os.path.join(pasta, 'saida'), '2023-01-01',
+                               '2025-01-01', nuvem_maxima=20, raster=False,
+                               catalogo=catalogo)
+
+            yield medir('pipeline.processar_area', executar, repeticoes=2, pontos=n,
+                        latencia_s=SERVIDOR.latencia)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do QASat")
+    parser.add_argument('--rapido', action='store_true',
+                        help="tamanhos menores, para uso em CI")
+    parser.add_argument('--latencia', type=float, default=0.0,
+                        help="latência simulada por chamada ao EE, em segundos")
+    parser.add_argument('--gravacoes', help="JSON com respostas gravadas do EE")
+    parser.add_argument('--saida', help="arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument('casos', nargs='*',
+                        default=['indices', 'selecao', 'relatorio', 'shapefile', 'extracao',
+                                 'pipeline', 'aplicacao_local', 'partida'])
+    args = parser.parse_args(argv)
+
+    SERVIDOR.latencia = args.latencia
+    if args.gravacoes:
+        SERVIDOR.carregar(args.gravacoes)
+
+    grande = [10 ** 3, 10 ** 4] if args.rapido else [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+    medio = [10 ** 3] if args.rapido else [10 ** 3, 10 ** 5]
+    casos = {
+        'indices': lambda: bench_indices(grande),
+        'selecao': lambda: bench_selecao(medio),
+        'relatorio': bench_relatorio,
+        'shapefile': lambda: bench_shapefile(medio),
+        'extracao': lambda: bench_extracao([200] if args.rapido else [200, 2000]),
+        'pipeline': lambda: bench_pipeline([200] if args.rapido else [200, 2000]),
+        'aplicacao_local': lambda: bench_aplicacao_local(
+            [1024] if args.rapido else [1024, 4096]),
+        'partida': lambda: bench_partida(3 if args.rapido else 5),
+    }
+
+    resultados = []
+    for caso in args.casos:
+        resultados.extend(casos[caso]())
+
+    saida = {
+        'commit': _commit(),
+        'data': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'resultados': resultados,
+    }
+    texto = json.dumps(saida, indent=2)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+# EARTH ENGINE SIMULADO
+# Substituto local do módulo `ee` para os benchmarks: monta o grafo de
+# chamadas como o cliente real, mas as chamadas bloqueantes (getInfo,
+# getDownloadURL, getMapId) devolvem respostas gravadas ou sintéticas após
+# uma latência configurável, e cada ida ao "servidor" é contada.
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+import types
+from datetime import date, timedelta
+
+BANDAS = ['B2', 'B3', 'B4', 'B5', 'B6', 'B8', 'B8A', 'B11', 'B12']
+
+
+class EEException(Exception):
+    pass
+
+
+class No:
+    """Um nó do grafo de chamadas (equivalente a um ComputedObject)."""
+
+    def __init__(self, nome, args=(), kwargs=None, origem=None):
+        self.nome = nome
+        self.origem = origem
+        self.args = tuple(_resolver_funcoes(a) for a in args)
+        self.kwargs = {k: _resolver_funcoes(v) for k, v in (kwargs or {}).items()}
+
+    def __getattr__(self, nome):
+        if nome.startswith('__'):
+            raise AttributeError(nome)
+        return lambda *args, **kwargs: No(nome, args, kwargs, self)
+
+    def cadeia(self):
+        nos, no = [], self
+        while no is not None:
+            nos.append(no.nome)
+            no = no.origem
+        return list(reversed(nos))
+
+    def nos(self):
+        """Todos os nós alcançáveis (origem e argumentos)."""
+        pilha, vistos, ids = [self], [], set()
+        while pilha:
+            no = pilha.pop()
+            if not isinstance(no, No) or id(no) in ids:
+                continue
+            ids.add(id(no))
+            vistos.append(no)
+            pilha.append(no.origem)
+            pilha.extend(_aninhados(list(no.args) + list(no.kwargs.values())))
+        return vistos
+
+    def serialize(self):
+        return json.dumps(_descrever(self), sort_keys=True, default=str)
+
+    def getInfo(self):
+        return SERVIDOR.executar(self, 'getInfo')
+
+    def getDownloadURL(self, params=None):
+        return SERVIDOR.executar(No('getDownloadURL', (params,), None, self), 'getDownloadURL')
+
+    def getMapId(self, vis_params=None):
+        return SERVIDOR.executar(No('getMapId', (vis_params,), None, self), 'getMapId')
+
+
+def _aninhados(valores):
+    for v in valores:
+        if isinstance(v, No):
+            yield v
+        elif isinstance(v, (list, tuple)):
+            yield from _aninhados(v)
+        elif isinstance(v, dict):
+            yield from _aninhados(v.values())
+
+
+def _resolver_funcoes(valor):
+    # Como o cliente real, funções passadas a map() são chamadas com uma
+    # variável para montar o grafo
+    if callable(valor) and not isinstance(valor, (No, _Classe, type)):
+        return valor(No('variavel'))
+    return valor
+
+
+def _descrever(valor):
+    if isinstance(valor, No):
+        return {'f': valor.nome, 'o': _descrever(valor.origem),
+                'a': [_descrever(a) for a in valor.args],
+                'k': {k: _descrever(v) for k, v in valor.kwargs.items()}}
+    if isinstance(valor, (list, tuple)):
+        return [_descrever(v) for v in valor]
+    if isinstance(valor, dict):
+        return {k: _descrever(v) for k, v in valor.items()}
+    return valor
+
+
+class _Classe:
+    """ee.Image, ee.Filter, ... : construtor e métodos estáticos."""
+
+    def __init__(self, nome):
+        self.nome = nome
+
+    def __call__(self, *args, **kwargs):
+        return No(self.nome, args, kwargs)
+
+    def __instancecheck__(self, objeto):
+        # isinstance(x, ee.FeatureCollection): objetos criados pelo construtor
+        return isinstance(objeto, No) and objeto.nome == self.nome
+
+    def __getattr__(self, nome):
+        if nome.startswith('__'):
+            raise AttributeError(nome)
+        return lambda *args, **kwargs: No(f'{self.nome}.{nome}', args, kwargs)
+
+
+# ------------------------- Servidor simulado -------------------------
+def _valor_pseudo(*chave):
+    semente = int(hashlib.sha1(repr(chave).encode()).hexdigest()[:8], 16)
+    return random.Random(semente).uniform(0.005, 0.2)
+
+
+def _literais_de_filtro(raiz, propriedade):
+    """Valores literais usados em Filter.eq/inList sobre `propriedade`."""
+    conjuntos = []
+    for no in raiz.nos():
+        if no.nome in ('Filter.eq', 'Filter.inList') and no.args and no.args[0] == propriedade:
+            valor = no.args[1]
+            if isinstance(valor, str):
+                conjuntos.append({valor})
+            elif isinstance(valor, (list, tuple)) and all(isinstance(v, str) for v in valor):
+                conjuntos.append(set(valor))
+    return conjuntos
+
+
+def _amostrar(raiz):
+    pontos = []
+    for no in raiz.nos():
+        if no.nome == 'FeatureCollection' and no.args and isinstance(no.args[0], list):
+            pontos = no.args[0]
+    filtros = [(propriedade, valores) for propriedade in ('date', 'grupo')
+               for valores in _literais_de_filtro(raiz, propriedade)]
+    features = []
+    for p in pontos:
+        props = dict(p.get('properties', {}))
+        if any(props.get(propriedade) not in f for propriedade, f in filtros):
+            continue
+        coords = p['geometry']['coordinates']
+        props.update({b: _valor_pseudo(coords[0], coords[1], props.get('date'), b)
+                      for b in BANDAS})
+        features.append({'type': 'Feature', 'geometry': p['geometry'],
+                         'properties': props})
+    for no in raiz.nos():
+        # reduceColumns(toList().repeat(n), seletores): uma lista por coluna
+        if no.nome == 'reduceColumns':
+            seletores = no.args[1] if len(no.args) > 1 else no.kwargs['selectors']
+            return [[f['properties'].get(c) for f in features] for c in seletores]
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def _cenas(raiz, n=150, inicio=date(2023, 1, 1)):
+    seletores = next(no.args[1] for no in raiz.nos() if no.nome == 'reduceColumns')
+    cenas = [[f'{(inicio + timedelta(days=5 * i)).strftime("%Y%m%d")}T130251_{i:04d}_T23KPT',
+              int(time.mktime((inicio + timedelta(days=5 * i)).timetuple()) * 1000),
+              round(_valor_pseudo(i) * 400, 2)] for i in range(n)]
+    if 'valida' in seletores:
+        # Triagem sobre a área: frações de pixels válidos e de água válida
+        for i, cena in enumerate(cenas):
+            valida = min(_valor_pseudo(i, 'valida') * 5, 1.0)
+            cena += [valida, valida * 0.6]
+    return cenas
+
+
+def _resumos(raiz):
+    ids = set().union(*_literais_de_filtro(raiz, 'system:index') or [set()])
+    return {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'geometry': None,
+         'properties': {'id': i, 'data': i[:8], 'estimativa_mean': _valor_pseudo(i)}}
+        for i in sorted(ids)]}
+
+
+RESPONDEDORES = [
+    ('getDownloadURL', lambda raiz: 'https://earthengine.invalid/download'),
+    ('getMapId', lambda raiz: {'mapid': 'simulado', 'token': '',
+                               'tile_fetcher': types.SimpleNamespace(
+                                   url_format='https://earthengine.invalid/{z}/{x}/{y}')}),
+    ('sampleRegions', _amostrar),
+    ('reduceColumns', _cenas),
+    ('reduceRegion', _resumos),
+    ('bandNames', lambda raiz: BANDAS),
+]
+
+
+class Servidor:
+    """Conta as chamadas bloqueantes e devolve as respostas."""
+
+    def __init__(self):
+        self.latencia = 0.0
+        self.gravacoes = {}
+        self._lock = threading.Lock()
+        self.zerar()
+
+    def zerar(self):
+        self.chamadas = 0
+        self.bytes = 0
+        self.por_tipo = {}
+
+    def carregar(self, caminho):
+        """Carrega respostas gravadas: {assinatura: resposta}.
+
+        A assinatura é a sequência de nomes de chamadas da raiz até a chamada
+        bloqueante, separada por pontos (ex.: 'ImageCollection.filterBounds.
+        reduceColumns.get.getInfo').
+        """
+        with open(caminho, encoding='utf-8') as f:
+            self.gravacoes.update(json.load(f))
+
+    def executar(self, raiz, tipo):
+        time.sleep(self.latencia)
+        assinatura = '.'.join(raiz.cadeia() + ([tipo] if tipo == 'getInfo' else []))
+        if assinatura in self.gravacoes:
+            resposta = self.gravacoes[assinatura]
+        else:
+            nomes = {no.nome for no in raiz.nos()}
+            resposta = None
+            for chave, responder in RESPONDEDORES:
+                if chave in nomes:
+                    resposta = responder(raiz)
+                    break
+        with self._lock:
+            self.chamadas += 1
+            self.por_tipo[tipo] = self.por_tipo.get(tipo, 0) + 1
+            self.bytes += len(json.dumps(resposta, default=str))
+        return resposta
+
+
+SERVIDOR = Servidor()
+
+
+def instalar(latencia=0.0):
+    """Coloca o módulo simulado em sys.modules['ee'] e devolve o servidor."""
+    modulo = types.ModuleType('ee')
+    for nome in ['Image', 'ImageCollection', 'Feature', 'FeatureCollection',
+                 'Filter', 'Join', 'Reducer', 'Geometry', 'Date', 'List',
+                 'Dictionary', 'Array', 'Algorithms', 'Number', 'String',
+                 'Kernel', 'Terrain']:
+        setattr(modulo, nome, _Classe(nome))
+    modulo.EEException = EEException
+    modulo.ComputedObject = No
+    modulo.Initialize = lambda *a, **k: None
+    modulo.ServiceAccountCredentials = lambda *a, **k: None
+    modulo.data = types.SimpleNamespace()
+    SERVIDOR.latencia = latencia
+    sys.modules['ee'] = modulo
+    return SERVIDOR
@@ -0,0 +1,60 @@
+# PARTIDA DO APP
+# Executado em um interpretador novo por `executar.py` (caso `partida`):
+#
+#   python -X importtime -m benchmarks.partida
+#
+# Mede o import dos módulos do app, lista as bibliotecas pesadas que esse
+# import já carrega e, com o `AppTest` do Streamlit, o tempo da primeira
+# renderização do app.py e de um rerun. O resultado vai em JSON no stdout;
+# a saída do -X importtime fica no stderr.
+import json
+import os
+import sys
+import time
+
+from benchmarks import fake_ee
+
+SERVIDOR = fake_ee.instalar()
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos importados pelo app.py
+MODULOS_APP = [
+    'preprocessing', 'indices', 'extracao', 'selecao_modelo', 'pipeline',
+    'cache_reflectancias', 'catalogo', 'report', 'serie_temporal', 'tabelas',
+    'registro_modelos', 'camadas_mapa', 'grafo_etapas', 'rastreamento', 'sessao_ee',
+]
+
+# Só devem ser carregadas quando a etapa que as usa roda
+PESADOS = ['statsmodels', 'scipy', 'seaborn', 'matplotlib', 'fpdf', 'geopandas',
+           'pyarrow', 'shapely', 'rasterio', 'altair']
+
+
+def main():
+    resultado = {}
+    inicio = time.perf_counter()
+    for modulo in MODULOS_APP:
+        __import__(modulo)
+    resultado['importacao_s'] = time.perf_counter() - inicio
+    resultado['pesados_carregados'] = [m for m in PESADOS if m in sys.modules]
+
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        AppTest = None
+    if AppTest is not None:
+        app = AppTest.from_file(os.path.join(RAIZ, 'app.py'), default_timeout=120)
+        # O primeiro run já encontra os módulos do app importados acima
+        for nome in ('primeira_renderizacao', 'rerun'):
+            SERVIDOR.zerar()
+            inicio = time.perf_counter()
+            app.run()
+            resultado[f'{nome}_s'] = time.perf_counter() - inicio
+            resultado[f'{nome}_chamadas_ee'] = SERVIDOR.chamadas
+        resultado['erros_app'] = [str(e.value) for e in app.exception]
+
+    print(json.dumps(resultado))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# CACHE DE REFLECTÂNCIAS
+# Guarda em disco (SQLite) as reflectâncias já extraídas por ponto e data,
+# para que novas execuções só busquem no Earth Engine o que falta.
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import grade_s2
+from preprocessing import mascara_valida, mask_cloud_and_shadows_sr
+from triagem import melhor_cena, triar
+
+CAMINHO_PADRAO = os.path.join(
+    os.environ.get('QASAT_CACHE_DIR',
+                   os.path.join(os.path.expanduser('~'), '.cache', 'qasat')),
+    'reflectancias.sqlite')
+
+
+def versao_mascara():
+    """Identificador da versão atual da máscara, da escolha da cena e da
+    amostragem.
+
+    Qualquer alteração no código da máscara, da triagem que escolhe a cena
+    de cada data, ou de qual pixel e cena cada ponto é amostrado muda a
+    versão e invalida as entradas antigas.
+    """
+    # extracao importa este módulo: a importação fica aqui dentro
+    from extracao import _amostras_em_lote, _amostras_por_grupo
+
+    codigo = ''.join(inspect.getsource(f) for f in (
+        mascara_valida, mask_cloud_and_shadows_sr, triar, melhor_cena,
+        grade_s2, _amostras_em_lote, _amostras_por_grupo))
+    return hashlib.sha1(codigo.encode('utf-8')).hexdigest()[:12]
+
+
+def chave_ponto(lon, lat):
+    """Hash da geometria do ponto (coordenadas arredondadas a ~1 cm)."""
+    return hashlib.sha1(f"{lon:.7f},{lat:.7f}".encode('utf-8')).hexdigest()[:16]
+
+
+class CacheReflectancias:
+    """Cache persistente de pares (ponto, data) já amostrados.
+
+    As entradas são endereçadas pelo conteúdo: hash do ponto, data, lista de
+    bandas e versão da máscara de nuvens. Pontos sem pixel válido também são
+    guardados (valores None) para não serem buscados de novo. Quando o número
+    de entradas passa de `max_entradas`, as menos usadas recentemente são
+    removidas.
+    """
+
+    def __init__(self, caminho=CAMINHO_PADRAO, max_entradas=500_000):
+        self.caminho = caminho
+        self.max_entradas = max_entradas
+        self.versao = versao_mascara()
+        self.acertos = 0
+        self.faltas = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        with self._conectar() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS matchups (
+                    chave TEXT PRIMARY KEY,
+                    valores TEXT,
+                    acessado REAL NOT NULL
+                )""")
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_acessado ON matchups (acessado)")
+
+    @contextmanager
+    def _conectar(self):
+        con = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def _chave(self, ponto, data, bandas):
+        texto = '|'.join([ponto, data, ','.join(bandas), self.versao])
+        return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+    def buscar(self, pares, bandas):
+        """Busca vários pares (chave do ponto, data) de uma vez.
+
+        Retorna {(ponto, data): {banda: valor} ou None} apenas para os pares
+        encontrados.
+        """
+        chaves = {self._chave(p, d, bandas): (p, d) for p, d in pares}
+        encontrados = {}
+        with self._lock, self._conectar() as con:
+            lista = list(chaves)
+            for i in range(0, len(lista), 500):
+                bloco = lista[i:i + 500]
+                marcadores = ','.join('?' * len(bloco))
+                for chave, valores in con.execute(
+                        f"SELECT chave, valores FROM matchups "
+                        f"WHERE chave IN ({marcadores})", bloco):
+                    encontrados[chaves[chave]] = (
+                        json.loads(valores) if valores is not None else None)
+                con.execute(
+                    f"UPDATE matchups SET acessado = ? "
+                    f"WHERE chave IN ({marcadores})", [time.time()] + bloco)
+        self.acertos += len(encontrados)
+        self.faltas += len(chaves) - len(encontrados)
+        return encontrados
+
+    def guardar(self, registros, bandas):
+        """Grava {(ponto, data): {banda: valor} ou None} e aplica o limite."""
+        agora = time.time()
+        linhas = [
+            (self._chave(p, d, bandas),
+             json.dumps(v) if v is not None else None, agora)
+            for (p, d), v in registros.items()
+        ]
+        with self._lock, self._conectar() as con:
+            con.executemany(
+                "INSERT OR REPLACE INTO matchups (chave, valores, acessado) "
+                "VALUES (?, ?, ?)", linhas)
+            excesso = con.execute(
+                "SELECT COUNT(*) FROM matchups").fetchone()[0] - self.max_entradas
+            if excesso > 0:
+                con.execute(
+                    "DELETE FROM matchups WHERE chave IN ("
+                    "SELECT chave FROM matchups ORDER BY acessado LIMIT ?)",
+                    (excesso,))
+
+    def estatisticas(self):
+        with self._conectar() as con:
+            entradas = con.execute("SELECT COUNT(*) FROM matchups").fetchone()[0]
+        return {'acertos': self.acertos, 'faltas': self.faltas,
+                'entradas': entradas}
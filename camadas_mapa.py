@@ -0,0 +1,100 @@
+# CAMADAS DO MAPA
+# Cache dos map IDs do Earth Engine: uma camada com a mesma imagem e os
+# mesmos parâmetros de visualização reaproveita a URL de tiles já obtida em
+# vez de pedir um novo map ID a cada rerun.
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import ee
+
+import executor_ee
+
+# Os tokens dos map IDs expiram depois de algumas horas; renovamos antes
+TTL_PADRAO = 2 * 3600
+
+
+def impressao_digital(ee_object, vis_params):
+    """Hash do grafo da imagem e dos parâmetros de visualização."""
+    texto = ee_object.serialize() + json.dumps(vis_params or {}, sort_keys=True,
+                                               default=str)
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+
+def _como_imagem(ee_object, vis_params):
+    """Feições viram uma imagem com o contorno na cor pedida (como no geemap)."""
+    if isinstance(ee_object, (ee.FeatureCollection, ee.Feature, ee.Geometry)):
+        cor = (vis_params or {}).get('color', '000000')
+        largura = (vis_params or {}).get('width', 2)
+        return ee.FeatureCollection(ee_object).style(
+            color=cor, fillColor='00000000', width=largura), {}
+    return ee_object, vis_params or {}
+
+
+class CacheCamadas:
+    """LRU de URLs de tiles com validade (`ttl`, em segundos)."""
+
+    def __init__(self, max_entradas=64, ttl=TTL_PADRAO):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+    def _em_cache(self, chave, agora):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and agora - entrada[1] < self.ttl:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return entrada[0]
+            self.faltas += 1
+            return None
+
+    def _guardar(self, chave, url, agora):
+        with self._lock:
+            self._entradas[chave] = (url, agora)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def urls(self, camadas):
+        """URLs de tiles de várias camadas [(ee_object, vis_params), ...].
+
+        Os map IDs que faltam são pedidos todos juntos ao executor do EE.
+        """
+        agora = time.time()
+        chaves = [impressao_digital(obj, vis) for obj, vis in camadas]
+        urls = [self._em_cache(chave, agora) for chave in chaves]
+        futuros = {}
+        for i, (obj, vis) in enumerate(camadas):
+            if urls[i] is None:
+                imagem, vis_imagem = _como_imagem(obj, vis)
+                futuros[i] = executor_ee.padrao().submeter(imagem, 'getMapId', vis_imagem)
+        for i, futuro in futuros.items():
+            urls[i] = futuro.result()['tile_fetcher'].url_format
+            self._guardar(chaves[i], urls[i], agora)
+        return urls
+
+    def url(self, ee_object, vis_params=None):
+        """URL de tiles da camada, pedindo um map ID só quando necessário."""
+        return self.urls([(ee_object, vis_params)])[0]
+
+    def adicionar(self, mapa, ee_object, vis_params=None, nome='Camada', visivel=True):
+        """Equivalente a `mapa.addLayer`, usando a URL em cache."""
+        self.adicionar_varias(mapa, [(ee_object, vis_params, nome, visivel)])
+
+    def adicionar_varias(self, mapa, camadas):
+        """Várias camadas [(ee_object, vis_params, nome, visivel), ...], na
+        ordem dada, com os map IDs que faltam pedidos em paralelo."""
+        urls = self.urls([(obj, vis) for obj, vis, _, _ in camadas])
+        for url, (_, _, nome, visivel) in zip(urls, camadas):
+            mapa.add_tile_layer(url=url, name=nome,
+                                attribution='Google Earth Engine', shown=visivel)
+
+    def estatisticas(self):
+        return {'acertos': self.acertos, 'faltas': self.faltas,
+                'entradas': len(self._entradas)}
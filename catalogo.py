@@ -0,0 +1,194 @@
+# CATÁLOGO LOCAL DE CENAS
+# Metadados das cenas Sentinel-2 de cada área de estudo guardados em SQLite,
+# para que a listagem e o filtro por nuvem sejam feitos localmente. Junto
+# com a nebulosidade do tile, cada cena guarda a triagem sobre a própria
+# área (nuvem e água válida, ver triagem.py), feita na mesma requisição.
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+
+import ee
+import pandas as pd
+
+import executor_ee
+from extracao import COLECAO_S2
+from triagem import area_triagem, triar
+
+CAMINHO_PADRAO = os.path.join(
+    os.environ.get('QASAT_CACHE_DIR',
+                   os.path.join(os.path.expanduser('~'), '.cache', 'qasat')),
+    'catalogo.sqlite')
+
+# Cenas recentes podem ser ingeridas com atraso: os últimos dias do
+# intervalo sincronizado são relidos, no máximo uma vez por hora
+_MARGEM_DIAS = 5
+_INTERVALO_ATUALIZACAO = 3600
+
+# Colunas acrescentadas depois da primeira versão do catálogo
+_COLUNAS_TRIAGEM = {'nuvem_area': 'REAL', 'agua_valida': 'REAL'}
+
+_ORDENS = {'data': 'data', 'agua': 'agua_valida DESC, data'}
+
+
+def chave_roi(roi):
+    """Hash do grafo da área de estudo (calculado localmente)."""
+    return hashlib.sha1(roi.serialize().encode('utf-8')).hexdigest()[:16]
+
+
+def _recuar(data):
+    return (date.fromisoformat(data) - timedelta(days=_MARGEM_DIAS)).isoformat()
+
+
+def _texto(data):
+    return data.isoformat() if isinstance(data, (date, datetime)) else str(data)[:10]
+
+
+class CatalogoCenas:
+    """Catálogo de cenas por área de estudo com atualização incremental.
+
+    Para cada área é guardado o intervalo de datas já sincronizado; um novo
+    pedido só busca no Earth Engine as partes do intervalo ainda não cobertas
+    e, periodicamente, os últimos dias, que podem ter recebido cenas novas.
+    """
+
+    def __init__(self, caminho=CAMINHO_PADRAO):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        with self._conectar() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS cenas (
+                    roi TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    nuvem REAL,
+                    nuvem_area REAL,
+                    agua_valida REAL,
+                    PRIMARY KEY (roi, id)
+                )""")
+            existentes = {linha[1] for linha in con.execute("PRAGMA table_info(cenas)")}
+            for coluna, tipo in _COLUNAS_TRIAGEM.items():
+                if coluna not in existentes:
+                    con.execute(f"ALTER TABLE cenas ADD COLUMN {coluna} {tipo}")
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cenas_data ON cenas (roi, data)")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS sincronizacoes (
+                    roi TEXT PRIMARY KEY,
+                    inicio TEXT NOT NULL,
+                    fim TEXT NOT NULL,
+                    atualizado REAL NOT NULL
+                )""")
+
+    @contextmanager
+    def _conectar(self):
+        con = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def _buscar(self, roi, inicio, fim, ids=None):
+        """Uma única requisição com id, data, nuvem do tile e triagem sobre a
+        área das cenas do intervalo (ou só das cenas `ids`).
+
+        Devolve um future do executor do EE; o resultado passa por `_linhas`.
+        """
+        colecao = ee.ImageCollection(COLECAO_S2) \
+            .filterBounds(roi) \
+            .filterDate(inicio, fim)
+        if ids is not None:
+            colecao = colecao.filter(ee.Filter.inList('system:index', list(ids)))
+        lista = colecao.map(triar(area_triagem(roi))).reduceColumns(
+            ee.Reducer.toList(5),
+            ['system:index', 'system:time_start', 'CLOUDY_PIXEL_PERCENTAGE',
+             'valida', 'agua_valida']
+        ).get('list')
+        return executor_ee.padrao().submeter(lista)
+
+    @staticmethod
+    def _linhas(lista):
+        # Sem pixels na área (frações nulas), a cena conta como toda nublada
+        return [(i, datetime.fromtimestamp(t / 1000, tz=timezone.utc).date().isoformat(), n,
+                 100 * (1 - (valida or 0)), 100 * (agua or 0))
+                for i, t, n, valida, agua in lista]
+
+    def _gravar(self, chave, linhas):
+        with self._lock, self._conectar() as con:
+            con.executemany(
+                "INSERT OR REPLACE INTO cenas (roi, id, data, nuvem, nuvem_area, "
+                "agua_valida) VALUES (?, ?, ?, ?, ?, ?)",
+                [(chave,) + linha for linha in linhas])
+
+    def sincronizar(self, roi, inicio, fim):
+        """Garante que o intervalo [inicio, fim) esteja no catálogo.
+
+        Cenas gravadas antes da triagem existir são triadas em uma
+        requisição extra. Retorna o número de requisições feitas ao Earth
+        Engine (0 quando o intervalo já está coberto).
+        """
+        chave = chave_roi(roi)
+        inicio, fim = _texto(inicio), _texto(fim)
+        with self._conectar() as con:
+            atual = con.execute(
+                "SELECT inicio, fim, atualizado FROM sincronizacoes WHERE roi = ?",
+                (chave,)).fetchone()
+
+        if atual is None:
+            faixas = [(inicio, fim)]
+            novo = (inicio, fim)
+        else:
+            inicio_atual, fim_atual, atualizado = atual
+            faixas = []
+            if inicio < inicio_atual:
+                faixas.append((inicio, inicio_atual))
+            if fim > fim_atual:
+                faixas.append((_recuar(fim_atual), fim))
+            elif (fim_atual >= _recuar(date.today().isoformat())
+                  and time.time() - atualizado > _INTERVALO_ATUALIZACAO):
+                faixas.append((_recuar(fim_atual), fim_atual))
+            novo = (min(inicio, inicio_atual), max(fim, fim_atual))
+
+        faixas = [(a, b) for a, b in faixas if a < b]
+        # As faixas que faltam são buscadas em paralelo
+        for futuro in [self._buscar(roi, a, b) for a, b in faixas]:
+            self._gravar(chave, self._linhas(futuro.result()))
+        if faixas:
+            with self._lock, self._conectar() as con:
+                con.execute(
+                    "INSERT OR REPLACE INTO sincronizacoes "
+                    "(roi, inicio, fim, atualizado) VALUES (?, ?, ?, ?)",
+                    (chave,) + novo + (time.time(),))
+
+        with self._conectar() as con:
+            sem_triagem = [linha[0] for linha in con.execute(
+                "SELECT id FROM cenas WHERE roi = ? AND data >= ? AND data < ? "
+                "AND agua_valida IS NULL",
+                (chave, inicio, fim))]
+        if sem_triagem:
+            self._gravar(chave, self._linhas(
+                self._buscar(roi, inicio, fim, ids=sem_triagem).result()))
+        return len(faixas) + bool(sem_triagem)
+
+    def listar(self, roi, inicio, fim, nuvem_maxima=100, ordem='data'):
+        """Cenas do catálogo no intervalo e abaixo do limite de nuvem.
+
+        O limite vale para a nuvem sobre a área de estudo (a do tile só é
+        usada em cenas ainda sem triagem). `ordem` é 'data' ou 'agua' (mais
+        água válida primeiro).
+        """
+        with self._conectar() as con:
+            return pd.read_sql_query(
+                "SELECT id AS ID, data AS Data, nuvem AS \"% Nuvem\", "
+                "nuvem_area AS \"% Nuvem na área\", "
+                "agua_valida AS \"% Água válida\" FROM cenas "
+                "WHERE roi = ? AND data >= ? AND data < ? "
+                "AND COALESCE(nuvem_area, nuvem) < ? "
+                f"ORDER BY {_ORDENS[ordem]}",
+                con, params=(chave_roi(roi), _texto(inicio), _texto(fim),
+                             nuvem_maxima))
@@ -0,0 +1,133 @@
+# EXECUTOR DO EARTH ENGINE
+# Pool de threads compartilhado por todo o processo para as chamadas
+# bloqueantes ao EE (getInfo, getDownloadURL, getMapId...). Requisições
+# independentes rodam em paralelo dentro de um limite de simultâneas e de
+# requisições por segundo; erros de cota (429) e falhas transitórias são
+# repetidos com espera exponencial; pedidos idênticos já em andamento
+# compartilham o mesmo future em vez de irem duas vezes ao servidor.
+import contextvars
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ee
+
+MAX_SIMULTANEAS = int(os.environ.get('QASAT_EE_SIMULTANEAS', 8))
+MAX_POR_SEGUNDO = float(os.environ.get('QASAT_EE_QPS', 20))
+
+# Trechos das mensagens de erro que indicam que vale a pena tentar de novo
+_TRANSITORIOS = ('429', 'too many requests', 'quota', 'rate limit',
+                 'resource exhausted', 'service unavailable', '503', '502',
+                 'deadline exceeded', 'timed out', 'connection')
+
+
+def _transitorio(erro):
+    if isinstance(erro, (ConnectionError, TimeoutError)):
+        return True
+    return isinstance(erro, ee.EEException) and any(
+        trecho in str(erro).lower() for trecho in _TRANSITORIOS)
+
+
+def _texto(valor):
+    # Objetos do EE entram na chave pelo grafo serializado
+    return valor.serialize() if hasattr(valor, 'serialize') else str(valor)
+
+
+def chave_requisicao(objeto, metodo, args=(), kwargs=None):
+    """Hash do grafo do objeto, do método e dos argumentos da chamada."""
+    texto = json.dumps([_texto(objeto), metodo, list(args), kwargs or {}],
+                       sort_keys=True, default=_texto)
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+
+class ExecutorEE:
+    """Executa chamadas ao EE em paralelo, com limite de taxa e novas tentativas.
+
+    `submeter` devolve um `concurrent.futures.Future`; `executar` é o
+    equivalente bloqueante.
+    """
+
+    def __init__(self, max_simultaneas=MAX_SIMULTANEAS, max_por_segundo=MAX_POR_SEGUNDO,
+                 tentativas=5, espera_maxima=60):
+        self.max_simultaneas = max_simultaneas
+        self.max_por_segundo = max_por_segundo
+        self.tentativas = tentativas
+        self.espera_maxima = espera_maxima
+        self._pool = ThreadPoolExecutor(max_simultaneas, thread_name_prefix='ee')
+        self._lock = threading.Lock()
+        self._em_andamento = {}
+        self._proxima_vez = 0.0
+        self.estatisticas = {'enviadas': 0, 'repetidas': 0, 'compartilhadas': 0,
+                             'falhas': 0}
+
+    def _aguardar_vez(self):
+        """Espaça o início das requisições em 1 / `max_por_segundo` s."""
+        if not self.max_por_segundo:
+            return
+        with self._lock:
+            agora = time.monotonic()
+            vez = max(self._proxima_vez, agora)
+            self._proxima_vez = vez + 1.0 / self.max_por_segundo
+        if vez > agora:
+            time.sleep(vez - agora)
+
+    def _chamar(self, objeto, metodo, args, kwargs):
+        for tentativa in range(self.tentativas):
+            self._aguardar_vez()
+            with self._lock:
+                self.estatisticas['enviadas'] += 1
+            try:
+                return getattr(objeto, metodo)(*args, **kwargs)
+            except Exception as e:
+                if not _transitorio(e) or tentativa == self.tentativas - 1:
+                    with self._lock:
+                        self.estatisticas['falhas'] += 1
+                    raise
+            with self._lock:
+                self.estatisticas['repetidas'] += 1
+            time.sleep(min(self.espera_maxima, 2 ** tentativa) + random.random())
+
+    def submeter(self, objeto, metodo='getInfo', *args, chave=None, **kwargs):
+        """Agenda `objeto.metodo(*args, **kwargs)` e devolve o future.
+
+        Se uma chamada idêntica (mesma `chave`, por padrão o hash do grafo e
+        dos argumentos) ainda está em andamento, o future dela é devolvido.
+        """
+        chave = chave or chave_requisicao(objeto, metodo, args, kwargs)
+        with self._lock:
+            futuro = self._em_andamento.get(chave)
+            if futuro is not None:
+                self.estatisticas['compartilhadas'] += 1
+                return futuro
+            # No contexto de quem pediu, para a chamada entrar no rastro dele
+            futuro = self._pool.submit(contextvars.copy_context().run,
+                                       self._chamar, objeto, metodo, args, kwargs)
+            self._em_andamento[chave] = futuro
+        futuro.add_done_callback(lambda _: self._esquecer(chave, futuro))
+        return futuro
+
+    def _esquecer(self, chave, futuro):
+        with self._lock:
+            if self._em_andamento.get(chave) is futuro:
+                del self._em_andamento[chave]
+
+    def executar(self, objeto, metodo='getInfo', *args, **kwargs):
+        """Versão bloqueante de `submeter`."""
+        return self.submeter(objeto, metodo, *args, **kwargs).result()
+
+
+_PADRAO = None
+_LOCK_PADRAO = threading.Lock()
+
+
+def padrao():
+    """Executor compartilhado do processo (criado na primeira chamada)."""
+    global _PADRAO
+    with _LOCK_PADRAO:
+        if _PADRAO is None:
+            _PADRAO = ExecutorEE()
+        return _PADRAO
@@ -0,0 +1,222 @@
+# EXPORTAÇÃO EM TILES
+# Divide a região em tiles adaptativos (quadtree), baixa os tiles em paralelo
+# com novas tentativas e junta tudo localmente em um único GeoTIFF.
+import contextvars
+import hashlib
+import json
+import os
+import random
+import shutil
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import ee
+import requests
+
+import executor_ee
+
+PASTA_PADRAO = os.path.join(
+    os.environ.get('QASAT_CACHE_DIR',
+                   os.path.join(os.path.expanduser('~'), '.cache', 'qasat')),
+    'exportacoes')
+
+
+class LimiteDeTamanho(Exception):
+    """O tile pedido passa do limite de tamanho do getDownloadURL."""
+
+
+def impressao_digital(image, parametros):
+    """Hash do grafo da imagem e dos parâmetros de exportação."""
+    texto = image.serialize() + json.dumps(parametros, sort_keys=True)
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]
+
+
+def _dividir(caixa):
+    xmin, ymin, xmax, ymax = caixa
+    xm, ym = (xmin + xmax) / 2, (ymin + ymax) / 2
+    return [(xmin, ym, xm, ymax), (xm, ym, xmax, ymax),
+            (xmin, ymin, xm, ym), (xm, ymin, xmax, ym)]
+
+
+def _grade_inicial(caixa, tamanho):
+    xmin, ymin, xmax, ymax = caixa
+    if not tamanho:
+        return {'r': caixa}
+    tiles = {}
+    y, i = ymin, 0
+    while y < ymax:
+        x, j = xmin, 0
+        while x < xmax:
+            tiles[f'r{i}_{j}'] = (x, y, min(x + tamanho, xmax), min(y + tamanho, ymax))
+            x += tamanho
+            j += 1
+        y += tamanho
+        i += 1
+    return tiles
+
+
+class ExportacaoEmTiles:
+    """Exportação retomável de uma imagem em tiles.
+
+    O estado (tiles concluídos e tiles que precisaram ser divididos) fica em
+    `manifesto.json` dentro da pasta da exportação, identificada pela
+    impressão digital da imagem, dos parâmetros, da região e da grade
+    inicial. Uma exportação interrompida continua de onde parou quando
+    chamada de novo com os mesmos argumentos. Depois do `mosaico`, os tiles
+    e o manifesto são apagados.
+    """
+
+    def __init__(self, image, regiao, escala=20, crs='EPSG:4674',
+                 tamanho_inicial=None, pasta=PASTA_PADRAO, max_paralelo=4,
+                 tentativas=5):
+        self.image = image
+        self.parametros = {'scale': escala, 'crs': crs, 'format': 'GEO_TIFF'}
+        self.regiao = regiao
+        self.tamanho_inicial = tamanho_inicial
+        self.max_paralelo = max_paralelo
+        self.tentativas = tentativas
+        # A região e a grade inicial entram no hash: o manifesto guarda a
+        # caixa e os nomes dos tiles, que dependem das duas
+        self.id = impressao_digital(image, dict(
+            self.parametros, regiao=regiao.bounds().serialize(),
+            tamanho_inicial=tamanho_inicial))
+        self.pasta = os.path.join(pasta, self.id)
+        os.makedirs(self.pasta, exist_ok=True)
+        self._lock = threading.Lock()
+        self._manifesto = self._ler_manifesto()
+
+    # ---- manifesto ----
+    @property
+    def _caminho_manifesto(self):
+        return os.path.join(self.pasta, 'manifesto.json')
+
+    def _ler_manifesto(self):
+        if os.path.exists(self._caminho_manifesto):
+            with open(self._caminho_manifesto, encoding='utf-8') as f:
+                return json.load(f)
+        return {'caixa': None, 'concluidos': {}, 'divididos': {}}
+
+    def _salvar_manifesto(self):
+        tmp = self._caminho_manifesto + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._manifesto, f)
+        os.replace(tmp, self._caminho_manifesto)
+
+    # ---- download de um tile ----
+    def _baixar_tile(self, nome, caixa):
+        destino = os.path.join(self.pasta, f'{nome}.tif')
+        # Erros de cota e falhas transitórias do EE já são repetidos pelo
+        # executor; aqui só o download do arquivo é tentado de novo
+        try:
+            url = executor_ee.padrao().executar(self.image, 'getDownloadURL', dict(
+                self.parametros, name=nome,
+                region=ee.Geometry.Rectangle(list(caixa), None, False)))
+        except ee.EEException as e:
+            if 'Total request size' in str(e) or 'must be less than' in str(e):
+                raise LimiteDeTamanho(str(e))
+            raise
+        for tentativa in range(self.tentativas):
+            try:
+                resposta = requests.get(url, stream=True, timeout=300)
+                if resposta.status_code == 429 or resposta.status_code >= 500:
+                    raise IOError(f"HTTP {resposta.status_code}")
+                resposta.raise_for_status()
+                with open(destino + '.part', 'wb') as f:
+                    for bloco in resposta.iter_content(1 << 20):
+                        f.write(bloco)
+                os.replace(destino + '.part', destino)
+                return destino
+            except (IOError, requests.RequestException):
+                if tentativa == self.tentativas - 1:
+                    raise
+            time.sleep(min(60, 2 ** tentativa) + random.random())
+
+    def executar(self, progresso=None):
+        """Baixa todos os tiles que faltam e retorna a lista de arquivos.
+
+        `progresso(concluidos, total)` é chamado a cada tile terminado.
+        """
+        if self._manifesto['caixa'] is None:
+            coords = executor_ee.padrao().executar(
+                self.regiao.bounds().coordinates())[0]
+            xs, ys = [c[0] for c in coords], [c[1] for c in coords]
+            self._manifesto['caixa'] = [min(xs), min(ys), max(xs), max(ys)]
+            self._salvar_manifesto()
+
+        fila = dict(_grade_inicial(tuple(self._manifesto['caixa']),
+                                   self.tamanho_inicial))
+        # Reaplica as divisões já conhecidas e pula os tiles concluídos
+        pendentes = {}
+        while fila:
+            nome, caixa = fila.popitem()
+            if nome in self._manifesto['divididos']:
+                fila.update({f'{nome}-{i}': c for i, c in enumerate(_dividir(caixa))})
+            elif nome not in self._manifesto['concluidos']:
+                pendentes[nome] = caixa
+
+        erros = []
+        with ThreadPoolExecutor(self.max_paralelo) as pool:
+            futuros = {pool.submit(contextvars.copy_context().run,
+                                   self._baixar_tile, n, c): (n, c)
+                       for n, c in pendentes.items()}
+            while futuros:
+                feitos, _ = wait(futuros, return_when=FIRST_COMPLETED)
+                for futuro in feitos:
+                    nome, caixa = futuros.pop(futuro)
+                    try:
+                        futuro.result()
+                    except LimiteDeTamanho:
+                        with self._lock:
+                            self._manifesto['divididos'][nome] = caixa
+                            self._salvar_manifesto()
+                        for i, c in enumerate(_dividir(caixa)):
+                            filho = f'{nome}-{i}'
+                            futuros[pool.submit(contextvars.copy_context().run,
+                                                self._baixar_tile, filho, c)] = (filho, c)
+                        continue
+                    except Exception as e:
+                        erros.append(f"{nome}: {e}")
+                        continue
+                    with self._lock:
+                        self._manifesto['concluidos'][nome] = caixa
+                        self._salvar_manifesto()
+                    if progresso:
+                        total = len(self._manifesto['concluidos']) + len(futuros)
+                        progresso(len(self._manifesto['concluidos']), total)
+
+        if erros:
+            raise RuntimeError(
+                "Falha ao baixar alguns tiles (execute novamente para retomar): "
+                + '; '.join(erros))
+        return [os.path.join(self.pasta, f'{n}.tif')
+                for n in sorted(self._manifesto['concluidos'])]
+
+    def mosaico(self, arquivos, caminho_saida=None):
+        """Junta os tiles em um único GeoTIFF comprimido e apaga os tiles.
+
+        Sem `caminho_saida`, o mosaico fica na pasta da exportação (o único
+        arquivo que sobra nela); quem o usa pode apagá-la com `limpar`.
+        """
+        from rasterio.merge import merge
+
+        caminho_saida = caminho_saida or os.path.join(self.pasta, 'mosaico.tif')
+        if len(arquivos) == 1:
+            shutil.copyfile(arquivos[0], caminho_saida)
+        else:
+            merge(arquivos, dst_path=caminho_saida,
+                  dst_kwds={'compress': 'deflate', 'tiled': True,
+                            'BIGTIFF': 'IF_SAFER'})
+
+        # A exportação terminou: os tiles e o manifesto não servem mais
+        for nome in os.listdir(self.pasta):
+            caminho = os.path.join(self.pasta, nome)
+            if os.path.abspath(caminho) != os.path.abspath(caminho_saida):
+                os.remove(caminho)
+        if not os.listdir(self.pasta):
+            os.rmdir(self.pasta)
+        return caminho_saida
+
+    def limpar(self):
+        """Apaga a pasta da exportação (tiles, manifesto e mosaico interno)."""
+        shutil.rmtree(self.pasta, ignore_errors=True)
@@ -0,0 +1,227 @@
+# EXTRAÇÃO DE REFLECTÂNCIAS
+# Amostragem das bandas Sentinel-2 nos pontos coletados in situ.
+import json
+
+import ee
+import numpy as np
+import pandas as pd
+
+import executor_ee
+from cache_reflectancias import chave_ponto
+from grade_s2 import pedidos_por_pixel
+from indices import BANDAS
+from rastreamento import rastreado
+from triagem import melhor_cena
+
+COLECAO_S2 = "COPERNICUS/S2_SR_HARMONIZED"
+
+
+def _pontos_para_ee(pedidos):
+    """Pedidos como FeatureCollection só com o número da linha (o índice de
+    `pedidos`), a data e o grupo ('AAAA-MM-DD|tile MGRS')."""
+    pontos = pedidos[['geometry']].copy()
+    pontos['linha'] = pedidos.index.to_numpy()
+    pontos['date'] = pedidos['date'].dt.strftime('%Y-%m-%d')
+    pontos['grupo'] = pontos['date'] + '|' + pedidos['tile']
+    return ee.FeatureCollection(json.loads(pontos.to_json())['features'])
+
+
+def _grupos(pedidos):
+    return (pedidos['date'].dt.strftime('%Y-%m-%d') + '|' + pedidos['tile']).to_numpy()
+
+
+def _paginar_grupos(pedidos, pontos_por_requisicao):
+    """Agrupa os pares (data, tile) em lotes com no máximo
+    `pontos_por_requisicao` pedidos.
+
+    Um grupo com mais pedidos que o limite fica sozinho em seu lote.
+    """
+    contagem = pd.Series(_grupos(pedidos)).value_counts().sort_index()
+    lotes, lote, total = [], [], 0
+    for grupo, n in contagem.items():
+        if lote and total + n > pontos_por_requisicao:
+            lotes.append(lote)
+            lote, total = [], 0
+        lote.append(grupo)
+        total += n
+    if lote:
+        lotes.append(lote)
+    return lotes
+
+
+def _amostras_em_lote(pontos, grupos, bandas):
+    """Monta a amostragem de vários grupos como um único grafo no servidor.
+
+    `pontos` traz só os pedidos dos `grupos` do lote. Cada grupo (data, tile MGRS) é unido (join) às cenas Sentinel-2 daquele
+    tile no mesmo dia, então todo ponto é amostrado de uma cena que o cobre.
+    Entre elas, fica a com mais pixels válidos nos pontos (`melhor_cena`), e
+    só essa recebe a máscara de nuvens.
+    """
+    datas = sorted({g.split('|')[0] for g in grupos})
+    tiles = sorted({g.split('|')[1] for g in grupos})
+
+    imagens = ee.ImageCollection(COLECAO_S2) \
+        .filterDate(ee.Date(datas[0]), ee.Date(datas[-1]).advance(1, 'day')) \
+        .filter(ee.Filter.inList('MGRS_TILE', tiles)) \
+        .map(lambda img: img.set('grupo', ee.Date(img.get('system:time_start'))
+                                 .format('YYYY-MM-dd').cat('|').cat(img.get('MGRS_TILE'))))
+
+    chaves = ee.FeatureCollection(ee.List(grupos).map(
+        lambda grupo: ee.Feature(None, {'grupo': grupo})))
+    juncao = ee.Join.saveAll('imagens').apply(
+        chaves, imagens, ee.Filter.equals(leftField='grupo', rightField='grupo'))
+
+    def amostrar(grupo):
+        pontos_grupo = pontos.filter(ee.Filter.eq('grupo', grupo.get('grupo')))
+        imagem = melhor_cena(
+            ee.ImageCollection.fromImages(grupo.get('imagens')), pontos_grupo.geometry())
+        return imagem.select(bandas).sampleRegions(
+            collection=pontos_grupo, properties=['linha'], scale=10)
+
+    return juncao.map(amostrar).flatten()
+
+
+def _amostras_por_grupo(pontos, grupo, bandas):
+    """Amostragem de um único par (data, tile) (modo antigo, uma requisição
+    por grupo); `pontos` traz só os pedidos do grupo."""
+    data, tile = grupo.split('|')
+    candidatas = ee.ImageCollection(COLECAO_S2) \
+        .filterDate(data, ee.Date(data).advance(1, 'day')) \
+        .filter(ee.Filter.eq('MGRS_TILE', tile))
+    return melhor_cena(candidatas, pontos.geometry()).select(bandas).sampleRegions(
+        collection=pontos, properties=['linha'], scale=10)
+
+
+def _pedir_colunas(amostras, bandas):
+    """Agenda no executor a busca das amostras como uma lista por coluna.
+
+    Em vez de um GeoJSON com um dicionário por ponto, o servidor devolve
+    [[linha...], [B2...], ...] via `reduceColumns`.
+    """
+    seletores = ['linha'] + list(bandas)
+    return executor_ee.padrao().submeter(amostras.reduceColumns(
+        ee.Reducer.toList().repeat(len(seletores)), seletores
+    ).get('list'))
+
+
+def _colunas(colunas, bandas):
+    """Decodifica as listas por coluna: cada uma vira direto um array
+    float32. Retorna (linhas, valores[n, bandas])."""
+    linhas = np.asarray(colunas[0], dtype=np.int64)
+    valores = np.empty((len(linhas), len(bandas)), dtype=np.float32)
+    for j, coluna in enumerate(colunas[1:]):
+        valores[:, j] = coluna
+    return linhas, valores
+
+
+@rastreado
+def _buscar_no_ee(gdf, bandas, modo, pontos_por_requisicao, valores, encontrados,
+                  concluidos):
+    """Preenche `valores`, `encontrados` e `concluidos` nas linhas (índice de
+    `gdf`) amostradas.
+
+    Vai ao servidor um pedido por (data, pixel de 10 m); o resultado de cada
+    pedido é copiado para todos os pontos daquele pixel. `concluidos` fica
+    False nas linhas cuja requisição falhou (modo 'por_data'): para elas não
+    se sabe se há imagem.
+    """
+    pedidos, grupo = pedidos_por_pixel(gdf)
+    grupos = _grupos(pedidos)
+    if modo == 'lote':
+        lotes = _paginar_grupos(pedidos, pontos_por_requisicao)
+    elif modo == 'por_data':
+        lotes = [[g] for g in sorted(set(grupos))]
+    else:
+        raise ValueError(f"Modo de extração desconhecido: {modo}")
+
+    def amostrar(pontos, lote):
+        if modo == 'lote':
+            return _amostras_em_lote(pontos, lote, bandas)
+        return _amostras_por_grupo(pontos, lote[0], bandas)
+
+    # Cada requisição leva só os pontos do seu lote (ou grupo); os lotes são
+    # independentes e vão todos ao executor de uma vez
+    selecoes = [np.isin(grupos, lote) for lote in lotes]
+    futuros = [_pedir_colunas(amostrar(_pontos_para_ee(pedidos[selecao]), lote), bandas)
+               for lote, selecao in zip(lotes, selecoes)]
+
+    valores_pixel = np.full((len(pedidos), len(bandas)), np.nan, dtype=np.float32)
+    encontrados_pixel = np.zeros(len(pedidos), dtype=bool)
+    concluidos_pixel = np.ones(len(pedidos), dtype=bool)
+    for futuro, selecao in zip(futuros, selecoes):
+        try:
+            linhas, amostra = _colunas(futuro.result(), bandas)
+        except ee.EEException:
+            if modo == 'lote':
+                raise
+            # Grupo sem imagem ou erro do servidor: segue sem ele, mas não
+            # marca os pontos como sem imagem
+            concluidos_pixel[selecao] = False
+            continue
+        valores_pixel[linhas] = amostra
+        encontrados_pixel[linhas] = True
+
+    valores[gdf.index] = valores_pixel[grupo]
+    encontrados[gdf.index] = encontrados_pixel[grupo]
+    concluidos[gdf.index] = concluidos_pixel[grupo]
+
+
+@rastreado
+def extrair_reflectancias(gdf, parametros, bandas=BANDAS, modo='lote',
+                          pontos_por_requisicao=5000, cache=None):
+    """Extrai as reflectâncias de todos os pontos do GeoDataFrame.
+
+    Pontos da mesma data no mesmo pixel de 10 m viram um único pedido, e os
+    pedidos são agrupados pelo tile MGRS que os cobre (ver grade_s2.py). No
+    modo 'lote' todos os grupos são resolvidos no servidor e os resultados
+    voltam em poucas requisições, limitadas a `pontos_por_requisicao`
+    pedidos cada. O modo 'por_data' faz uma requisição por data e tile.
+
+    Só o número da linha e as bandas vão e voltam do servidor: parâmetros,
+    coordenadas e datas já estão no GeoDataFrame. As bandas são gravadas em
+    um array float32 pré-alocado com uma linha por ponto.
+
+    Com um `CacheReflectancias`, os pares (ponto, data) já extraídos vêm do
+    disco e apenas os que faltam são buscados no Earth Engine. Um par só é
+    gravado como sem imagem quando a requisição dele terminou sem erro.
+
+    Retorna (df_ref, datas_sem_imagem).
+    """
+    gdf = gdf.reset_index(drop=True)
+    datas_pontos = gdf['date'].dt.strftime('%Y-%m-%d').to_numpy()
+    datas = sorted(set(datas_pontos))
+
+    valores = np.full((len(gdf), len(bandas)), np.nan, dtype=np.float32)
+    encontrados = np.zeros(len(gdf), dtype=bool)
+    faltando = np.ones(len(gdf), dtype=bool)
+    if cache is not None:
+        pares = list(zip((chave_ponto(x, y)
+                          for x, y in zip(gdf.geometry.x, gdf.geometry.y)),
+                         datas_pontos))
+        em_cache = cache.buscar(set(pares), bandas)
+        for i, par in enumerate(pares):
+            if par in em_cache:
+                faltando[i] = False
+                if em_cache[par] is not None:
+                    valores[i] = [em_cache[par][b] for b in bandas]
+                    encontrados[i] = True
+
+    if faltando.any():
+        concluidos = np.zeros(len(gdf), dtype=bool)
+        _buscar_no_ee(gdf[faltando], bandas, modo, pontos_por_requisicao,
+                      valores, encontrados, concluidos)
+        if cache is not None:
+            registros = {}
+            for i in np.flatnonzero(faltando & concluidos):
+                registros[pares[i]] = (dict(zip(bandas, valores[i].tolist()))
+                                       if encontrados[i] else None)
+            cache.guardar(registros, bandas)
+
+    df_ref = pd.DataFrame(valores[encontrados], columns=bandas)
+    for p in parametros:
+        df_ref[p] = gdf[p].to_numpy()[encontrados]
+    df_ref['lon'] = gdf.geometry.x.to_numpy()[encontrados]
+    df_ref['lat'] = gdf.geometry.y.to_numpy()[encontrados]
+    df_ref['date'] = datas_pontos[encontrados]
+    datas_sem_imagem = sorted(set(datas) - set(df_ref['date']))
+    return df_ref, datas_sem_imagem
@@ -0,0 +1,91 @@
+# GRADE SENTINEL-2
+# Índice espacial dos pontos coletados sobre a grade de 10 m do Sentinel-2:
+# cada ponto é levado ao pixel que o contém (zona UTM, coluna, linha) e ao
+# tile MGRS que cobre esse pixel. Pontos da mesma data no mesmo pixel viram
+# um único pedido de amostragem, e os pedidos são agrupados por tile para
+# que cada ponto seja amostrado de uma cena que de fato o cobre.
+import numpy as np
+import pandas as pd
+
+RESOLUCAO = 10  # metros
+
+_BANDAS_LATITUDE = 'CDEFGHJKLMNPQRSTUVWX'
+_COLUNAS_100K = ('ABCDEFGH', 'JKLMNPQR', 'STUVWXYZ')
+_LINHAS_100K = 'ABCDEFGHJKLMNPQRSTUV'
+
+
+def _tiles_mgrs(zona, lat, x, y):
+    """Nome do tile MGRS (ex.: '23KPU') a partir das coordenadas UTM.
+
+    Os tiles do Sentinel-2 cobrem o quadrado de 100 km de mesmo nome (com
+    sobra de 9,8 km), então o ponto está sempre dentro do tile calculado.
+    As exceções de zona da Noruega e de Svalbard não são tratadas.
+    """
+    banda = np.clip(np.floor((lat + 80) / 8).astype(np.int64), 0, 19)
+    coluna = np.floor(x / 100_000).astype(np.int64) - 1
+    linha = (np.floor(y / 100_000).astype(np.int64) + np.where(zona % 2 == 0, 5, 0)) % 20
+    return [f'{z:02d}{_BANDAS_LATITUDE[b]}{_COLUNAS_100K[(z - 1) % 3][c]}{_LINHAS_100K[r]}'
+            for z, b, c, r in zip(zona, banda, coluna, linha)]
+
+
+def indexar_pontos(gdf):
+    """Pixel de 10 m e tile MGRS de cada ponto (GeoDataFrame em EPSG:4326).
+
+    Retorna um DataFrame com o mesmo índice e as colunas 'epsg', 'coluna',
+    'linha' (posição do pixel na grade UTM) e 'tile'.
+    """
+    lon = gdf.geometry.x.to_numpy()
+    lat = gdf.geometry.y.to_numpy()
+    zona = np.floor((lon + 180) / 6).astype(np.int64) % 60 + 1
+    epsg = np.where(lat >= 0, 32600, 32700) + zona
+
+    # Uma reprojeção por zona UTM presente (em geral, uma só)
+    x, y = np.empty(len(gdf)), np.empty(len(gdf))
+    for codigo in np.unique(epsg):
+        selecao = epsg == codigo
+        utm = gdf.geometry[selecao].to_crs(epsg=int(codigo))
+        x[selecao], y[selecao] = utm.x.to_numpy(), utm.y.to_numpy()
+
+    return pd.DataFrame({
+        'epsg': epsg,
+        'coluna': np.floor(x / RESOLUCAO).astype(np.int64),
+        'linha': np.floor(y / RESOLUCAO).astype(np.int64),
+        'tile': _tiles_mgrs(zona, lat, x, y),
+    }, index=gdf.index)
+
+
+def _centros(epsg, coluna, linha):
+    """Centro de cada pixel, em lon/lat."""
+    import geopandas as gpd
+
+    lon, lat = np.empty(len(epsg)), np.empty(len(epsg))
+    for codigo in np.unique(epsg):
+        selecao = epsg == codigo
+        centros = gpd.GeoSeries.from_xy(
+            (coluna[selecao] + 0.5) * RESOLUCAO, (linha[selecao] + 0.5) * RESOLUCAO,
+            crs=int(codigo)).to_crs(4326)
+        lon[selecao], lat[selecao] = centros.x.to_numpy(), centros.y.to_numpy()
+    return gpd.points_from_xy(lon, lat, crs=4326)
+
+
+def pedidos_por_pixel(gdf):
+    """Um pedido de amostragem por (data, pixel) dos pontos de `gdf`.
+
+    Retorna (pedidos, grupo): `pedidos` é um GeoDataFrame com o centro do
+    pixel, 'date' e 'tile'; `grupo[i]` é a linha de `pedidos` cujo resultado
+    vale para a i-ésima linha de `gdf`.
+    """
+    import geopandas as gpd
+
+    indice = indexar_pontos(gdf)
+    indice['date'] = gdf['date'].dt.strftime('%Y-%m-%d').to_numpy()
+    chaves = ['date', 'epsg', 'coluna', 'linha']
+    grupo = indice.groupby(chaves, sort=True).ngroup().to_numpy()
+    unicos = indice.drop_duplicates(chaves).sort_values(chaves)
+
+    pedidos = gpd.GeoDataFrame({
+        'date': pd.to_datetime(unicos['date'].to_numpy()),
+        'tile': unicos['tile'].to_numpy(),
+    }, geometry=_centros(unicos['epsg'].to_numpy(), unicos['coluna'].to_numpy(),
+                         unicos['linha'].to_numpy()))
+    return pedidos, grupo
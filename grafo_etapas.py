@@ -0,0 +1,106 @@
+# GRAFO DE ETAPAS
+# Etapas do app com dependências explícitas e resultados memorizados pela
+# chave das entradas. A chave de uma etapa combina as chaves das etapas de
+# que ela depende com os seus parâmetros, então mudar um widget só refaz a
+# etapa que o usa e as que vêm depois dela.
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import pandas as pd
+
+from rastreamento import etapa as intervalo
+
+Resultado = namedtuple('Resultado', ['valor', 'chave'])
+
+
+def _impressao(valor):
+    """Texto estável que identifica um parâmetro de etapa."""
+    if isinstance(valor, (bytes, bytearray)):
+        return hashlib.sha1(valor).hexdigest()
+    if hasattr(valor, 'getvalue'):  # arquivo enviado
+        return getattr(valor, 'name', '') + hashlib.sha1(valor.getvalue()).hexdigest()
+    if hasattr(valor, 'serialize'):  # objeto do Earth Engine
+        return hashlib.sha1(valor.serialize().encode('utf-8')).hexdigest()
+    if isinstance(valor, dict):
+        return repr(sorted((k, _impressao(v)) for k, v in valor.items()))
+    if isinstance(valor, (list, tuple)):
+        return repr([_impressao(v) for v in valor])
+    return repr(valor)
+
+
+class GrafoEtapas:
+    """Registro das etapas e memória dos últimos resultados de cada uma."""
+
+    def __init__(self, max_por_etapa=4):
+        self.max_por_etapa = max_por_etapa
+        self.etapas = {}
+        self._memoria = {}
+        self.estatisticas = {}
+        self._lock = threading.Lock()
+
+    def etapa(self, nome, depende_de=()):
+        """Decorador que registra `funcao` como a etapa `nome`.
+
+        A função recebe o valor de cada dependência e os parâmetros como
+        argumentos nomeados.
+        """
+        for dependencia in depende_de:
+            if dependencia not in self.etapas:
+                raise ValueError(f"Etapa '{nome}' depende de '{dependencia}', "
+                                 "que ainda não foi registrada.")
+
+        def registrar(funcao):
+            self.etapas[nome] = (funcao, tuple(depende_de))
+            self._memoria[nome] = OrderedDict()
+            self.estatisticas[nome] = {'acertos': 0, 'faltas': 0, 'tempo': None}
+            return funcao
+        return registrar
+
+    def executar(self, nome, **argumentos):
+        """Resultado da etapa `nome`, recalculado só se as entradas mudaram.
+
+        As dependências são passadas como `Resultado` (o retorno de outra
+        chamada a `executar`) e os demais argumentos são parâmetros.
+        """
+        funcao, dependencias = self.etapas[nome]
+        faltando = [d for d in dependencias if not isinstance(argumentos.get(d), Resultado)]
+        if faltando:
+            raise ValueError(f"Etapa '{nome}' sem o resultado de: {', '.join(faltando)}")
+
+        partes = [nome] + [f"{d}={argumentos[d].chave}" for d in dependencias]
+        partes += [f"{k}={_impressao(v)}" for k, v in sorted(argumentos.items())
+                   if k not in dependencias]
+        chave = hashlib.sha1('|'.join(partes).encode('utf-8')).hexdigest()
+
+        memoria, estatisticas = self._memoria[nome], self.estatisticas[nome]
+        with self._lock:
+            if chave in memoria:
+                memoria.move_to_end(chave)
+                estatisticas['acertos'] += 1
+                return Resultado(memoria[chave], chave)
+            estatisticas['faltas'] += 1
+
+        valores = {k: (v.valor if k in dependencias else v) for k, v in argumentos.items()}
+        inicio = time.perf_counter()
+        with intervalo(nome):
+            valor = funcao(**valores)
+        estatisticas['tempo'] = time.perf_counter() - inicio
+
+        with self._lock:
+            memoria[chave] = valor
+            while len(memoria) > self.max_por_etapa:
+                memoria.popitem(last=False)
+        return Resultado(valor, chave)
+
+    def tabela(self):
+        """Estatísticas de cada etapa, na ordem de registro."""
+        return pd.DataFrame([
+            {'etapa': nome, 'depende de': ', '.join(dependencias),
+             'acertos': self.estatisticas[nome]['acertos'],
+             'faltas': self.estatisticas[nome]['faltas'],
+             'último cálculo (s)': self.estatisticas[nome]['tempo'],
+             'em memória': len(self._memoria[nome])}
+            for nome, (_, dependencias) in self.etapas.items()
+        ])
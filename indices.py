@@ -0,0 +1,210 @@
+# ÍNDICES ESPECTRAIS
+# Registro único das equações usadas tanto na tabela de pontos (NumPy)
+# quanto na imagem do Earth Engine.
+import ast
+import operator
+from functools import lru_cache
+
+import ee
+import numpy as np
+import pandas as pd
+
+BANDAS = ['B2', 'B3', 'B4', 'B5', 'B6', 'B8', 'B8A', 'B11', 'B12']
+
+INDICES_POR_PARAMETRO = {
+    'TURBIDEZ': {
+        'Turb1': '(B2 + B8) * B8',
+        'Turb2': '0.419 + (-94.129 * B2) + (56.261 * B3) + (135.372 * B4) + (-110.431 * B8)',
+        'Turb3': '(B5 - B11) + (B2 / B12)',
+        'Turb4': '(B8 * B4) / B3',
+        'Turb5': '(B4 - B3) / (B4 + B3)',
+        'Turb6': 'B4 / B2',
+    },
+    'CHLA': {
+        'Chla1': 'B4 / B8',
+        'Chla2': 'B2 / B3',
+        'Chla3': 'B5 - 1.005 + ((B6 - B4) * (B5 - B4)) / (B6 - B4 + B4)',
+        'Chla4': '(B5 - B4) + ((B8A - B4) * (B5 - B4)) / (B8A - B4)',
+        'Chla5': 'B5 / B4',
+        'Chla6': '(B5 + B6) / B4',
+        'Chla7': 'B5 - ((B4 + B6) / 2)',
+    },
+    'TSS': {
+        'TSS1': 'B8 + B4',
+        'TSS2': '(B3 + B4) / (B8 + B11)',
+        'TSS3': 'B6 - B5',
+        'TSS4': 'B6 - ((B6 + B4) / 2)',
+    }
+}
+
+PREDITORES_POR_PARAMETRO = {
+    'TURBIDEZ': ['B2', 'B3', 'B4', 'B5', 'B8', 'Turb1', 'Turb2', 'Turb3',
+                 'Turb4', 'Turb5', 'Turb6'],
+    'CHLA': ['B2', 'B3', 'B4', 'B5', 'B6', 'B8', 'B8A', 'Chla1', 'Chla2',
+             'Chla3', 'Chla4', 'Chla5'],
+    'TSS': ['B3', 'B4', 'B5', 'B6', 'B8', 'B11', 'TSS1', 'TSS2', 'TSS3',
+            'TSS4'],
+}
+
+_OPERACOES = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+_COMUTATIVAS = (ast.Add, ast.Mult)
+
+
+def indices_do_parametro(parametros):
+    """Retorna {nome: fórmula} de todos os índices dos parâmetros pedidos."""
+    if isinstance(parametros, str):
+        parametros = [parametros]
+    formulas = {}
+    for parametro in parametros:
+        formulas.update(INDICES_POR_PARAMETRO.get(parametro.upper(), {}))
+    return formulas
+
+
+@lru_cache(maxsize=None)
+def _compilar(formula):
+    """Converte a fórmula em uma árvore canônica de tuplas.
+
+    Operandos de soma e multiplicação são ordenados, de modo que
+    `B4 + B3` e `B3 + B4` geram a mesma chave e são calculados uma vez.
+    """
+    def converter(no):
+        if isinstance(no, ast.BinOp) and type(no.op) in _OPERACOES:
+            esquerda, direita = converter(no.left), converter(no.right)
+            if isinstance(no.op, _COMUTATIVAS):
+                esquerda, direita = sorted((esquerda, direita), key=repr)
+            return (type(no.op), esquerda, direita)
+        if isinstance(no, ast.UnaryOp) and isinstance(no.op, ast.USub):
+            valor = converter(no.operand)
+            if valor[0] == 'const':
+                return ('const', -valor[1])
+            return (ast.Mult, ('const', -1.0), valor)
+        if isinstance(no, ast.Constant) and isinstance(no.value, (int, float)):
+            return ('const', float(no.value))
+        if isinstance(no, ast.Name):
+            if no.id not in BANDAS:
+                raise ValueError(f"Banda desconhecida na fórmula: {no.id}")
+            return ('banda', no.id)
+        raise ValueError(f"Expressão não suportada na fórmula: {formula}")
+
+    return converter(ast.parse(formula, mode='eval').body)
+
+
+def _bandas_usadas(arvore, usadas):
+    if arvore[0] == 'banda':
+        usadas.add(arvore[1])
+    elif arvore[0] != 'const':
+        _bandas_usadas(arvore[1], usadas)
+        _bandas_usadas(arvore[2], usadas)
+    return usadas
+
+
+def _avaliar(arvores, folha, constante, aplicar):
+    """Avalia várias árvores compartilhando as subexpressões comuns."""
+    memo = {}
+
+    def avaliar(no):
+        if no in memo:
+            return memo[no]
+        if no[0] == 'banda':
+            valor = folha(no[1])
+        elif no[0] == 'const':
+            valor = constante(no[1])
+        else:
+            valor = aplicar(no[0], avaliar(no[1]), avaliar(no[2]))
+        memo[no] = valor
+        return valor
+
+    return {nome: avaliar(arvore) for nome, arvore in arvores.items()}
+
+
+# ------------------------- Avaliação em NumPy -------------------------
+def bandas_necessarias(preditores):
+    """Bandas brutas necessárias para obter os preditores (bandas ou índices)."""
+    formulas = indices_do_parametro(list(INDICES_POR_PARAMETRO))
+    usadas = set()
+    for pred in preditores:
+        if pred in BANDAS:
+            usadas.add(pred)
+        elif pred in formulas:
+            _bandas_usadas(_compilar(formulas[pred]), usadas)
+        else:
+            raise ValueError(f"Preditor desconhecido: {pred}")
+    return [b for b in BANDAS if b in usadas]
+
+
+def calcular_indices_numpy(bandas, parametros, nomes=None):
+    """Calcula os índices sobre arrays float32 em uma única passada.
+
+    `bandas` é um mapeamento {nome da banda: array}. Com `nomes`, apenas
+    esses índices são calculados.
+    """
+    arvores = {nome: _compilar(formula)
+               for nome, formula in indices_do_parametro(parametros).items()
+               if nomes is None or nome in nomes}
+    cache_bandas = {}
+
+    def folha(nome):
+        if nome not in cache_bandas:
+            cache_bandas[nome] = np.asarray(bandas[nome], dtype=np.float32)
+        return cache_bandas[nome]
+
+    def aplicar(op, a, b):
+        return _OPERACOES[op](a, b)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _avaliar(arvores, folha, np.float32, aplicar)
+
+
+def calcular_indices(dados, parametros):
+    """Retorna um DataFrame apenas com as colunas de índices calculadas."""
+    resultado = calcular_indices_numpy(
+        {b: dados[b].to_numpy() for b in BANDAS if b in dados.columns},
+        parametros)
+    return pd.DataFrame(resultado, index=dados.index)
+
+
+def adicionar_indices(dados, parametros):
+    """Adiciona todas as colunas de índices de uma vez ao DataFrame."""
+    indices = calcular_indices(dados, parametros)
+    return pd.concat([dados.drop(columns=indices.columns, errors='ignore'),
+                      indices], axis=1)
+
+
+# ------------------------- Avaliação no Earth Engine -------------------------
+def calcular_indices_ee(image, parametros):
+    """Monta um único grafo com todos os índices pedidos.
+
+    Cada banda é selecionada uma vez e as subexpressões repetidas reutilizam
+    o mesmo objeto, o que o serializador do Earth Engine deduplica.
+    Retorna None quando nenhum índice é pedido.
+    """
+    arvores = {nome: _compilar(formula)
+               for nome, formula in indices_do_parametro(parametros).items()}
+    if not arvores:
+        return None
+
+    usadas = set()
+    for arvore in arvores.values():
+        _bandas_usadas(arvore, usadas)
+    bandas = {b: image.select(b) for b in sorted(usadas)}
+
+    def aplicar(op, a, b):
+        if isinstance(a, float) and isinstance(b, float):
+            return _OPERACOES[op](a, b)
+        if isinstance(a, float):
+            a = ee.Image.constant(a)
+        metodo = {ast.Add: 'add', ast.Sub: 'subtract',
+                  ast.Mult: 'multiply', ast.Div: 'divide'}[op]
+        return getattr(a, metodo)(b)
+
+    resultado = _avaliar(arvores, bandas.__getitem__, float, aplicar)
+    return ee.Image.cat([
+        (valor if not isinstance(valor, float) else ee.Image.constant(valor))
+        .rename(nome)
+        for nome, valor in resultado.items()
+    ])
@@ -0,0 +1,228 @@
+# PIPELINE
+# As etapas do app como funções sem interface, usadas pelo app e pela linha
+# de comando (qasat.py): área de estudo -> reflectâncias -> índices ->
+# modelos -> estimativa na cena -> arquivos de saída.
+import json
+import os
+import warnings
+from contextlib import nullcontext
+
+import ee
+import pandas as pd
+
+from catalogo import CatalogoCenas
+from exportacao import PASTA_PADRAO, ExportacaoEmTiles
+from extracao import COLECAO_S2, extrair_reflectancias
+from indices import BANDAS, INDICES_POR_PARAMETRO, PREDITORES_POR_PARAMETRO, calcular_indices
+from prediction_model import aplicar_modelo_na_imagem, bandas_esperadas, equacao_bandas
+from preprocessing import COLUNAS_PARAMETROS, ler_shapefile_zip, mask_cloud_and_shadows_sr
+from rastreamento import etapa, rastreado
+from report import montar_relatorio_pdf
+from selecao_modelo import selecionar_modelos
+from tabelas import FORMATOS, escrever_csv, escrever_dataset, tabela_matchups
+from validacao import validar_modelo
+from zonas import estatisticas_zonais_locais
+
+
+def carregar_area(caminho_zip):
+    """GeoDataFrame dos pontos em EPSG:4326 e os parâmetros presentes."""
+    gdf = ler_shapefile_zip(caminho_zip)
+    if gdf.crs != "EPSG:4326":
+        gdf = gdf.to_crs("EPSG:4326")
+    if 'date' not in gdf.columns:
+        raise ValueError(
+            "O shapefile precisa conter a coluna 'date' no formato YYYY-MM-DD.")
+    parametros = [p for p in COLUNAS_PARAMETROS if p in gdf.columns]
+    if not parametros:
+        raise ValueError("Nenhum parâmetro de qualidade da água encontrado.")
+    return gdf, parametros
+
+
+def roi_do_gdf(gdf):
+    """FeatureCollection dos pontos (sem a coluna de data)."""
+    if 'date' in gdf.columns:
+        gdf = gdf.drop(columns='date')
+    return ee.FeatureCollection(json.loads(gdf.to_json())['features'])
+
+
+@rastreado
+def ajustar_modelos(df_ref, parametros, metodo='unico', p_limite=0.05,
+                    df_indices=None):
+    """Seleção de preditores, ajuste OLS e validação de cada parâmetro.
+
+    Retorna uma lista de dicionários no formato de `montar_relatorio_pdf`
+    ('parametro', 'modelo', 'X', 'y', 'validacao'), mais 'modelo_inicial'
+    (todos os preditores), 'dados' (reflectâncias e índices do parâmetro) e
+    'substituto' (nenhum preditor passou no critério e ficou o melhor
+    preditor isolado). Parâmetros sem nenhum candidato ficam de fora, com um
+    aviso.
+    """
+    import statsmodels.api as sm
+
+    if df_indices is None:
+        with etapa("índices"):
+            df_indices = calcular_indices(df_ref, parametros)
+
+    # Seleção de todos os parâmetros sobre a mesma matriz de Gram
+    with etapa("seleção de preditores", metodo=metodo):
+        selecoes = selecionar_modelos(
+            pd.concat([df_ref, df_indices], axis=1),
+            {p: PREDITORES_POR_PARAMETRO[p]
+             for p in parametros if p in PREDITORES_POR_PARAMETRO},
+            metodo=metodo, p_limite=p_limite)
+
+    itens = []
+    for parametro in parametros:
+        if parametro not in INDICES_POR_PARAMETRO:
+            continue
+        if not selecoes[parametro]['preditores']:
+            warnings.warn(f"{parametro}: nenhum preditor selecionado ({metodo}); "
+                          "parâmetro ignorado.")
+            continue
+        # Ajuste nas mesmas linhas da seleção (índices finitos, y presente)
+        df_param = pd.concat(
+            [df_ref, df_indices[list(INDICES_POR_PARAMETRO[parametro])]], axis=1
+        )[selecoes[parametro]['validas']]
+        y = df_param[parametro]
+        X = df_param[PREDITORES_POR_PARAMETRO[parametro]]
+
+        with etapa("ajuste OLS", parametro=parametro):
+            modelo_inicial = sm.OLS(y, X).fit()
+            X_significativos = X[selecoes[parametro]['preditores']]
+            modelo_final = sm.OLS(y, X_significativos).fit()
+
+        with etapa("validação", parametro=parametro):
+            validacao = validar_modelo(X_significativos, y)
+
+        itens.append({
+            'parametro': parametro,
+            'modelo': modelo_final,
+            'modelo_inicial': modelo_inicial,
+            'X': X_significativos,
+            'y': y,
+            'validacao': validacao,
+            'dados': df_param,
+            'substituto': selecoes[parametro]['substituto'],
+        })
+    return itens
+
+
+def colecao_s2(roi, inicio, fim):
+    """Coleção Sentinel-2 da área no intervalo, ainda sem máscara.
+
+    As cenas são escolhidas pela triagem sobre a área (catálogo) e só a
+    usada é mascarada, em `preparar_imagem`.
+    """
+    return ee.ImageCollection(COLECAO_S2) \
+        .filterBounds(roi) \
+        .filterDate(str(inicio), str(fim))
+
+
+def preparar_imagem(colecao, id_cena, parametros):
+    """Cena `id_cena`, mascarada, com as bandas do modelo e os índices dos
+    parâmetros."""
+    cena = colecao.filter(ee.Filter.eq('system:index', id_cena)).first()
+    image = mask_cloud_and_shadows_sr(ee.Image(cena))
+    return equacao_bandas(image.select(BANDAS), parametros)
+
+
+def estimar(image, coeficientes, parametros, limiar_mndwi=0.0):
+    """Estimativa do modelo na imagem, sem valores negativos e só na água.
+
+    Retorna (estimativa, mndwi_mascarado).
+    """
+    mndwi = image.normalizedDifference(['B3', 'B11']).rename('MNDWI')
+    mask = mndwi.gte(limiar_mndwi)
+
+    estimativa = aplicar_modelo_na_imagem(
+        preditores=list(coeficientes.keys()),
+        coeficientes=coeficientes,
+        image=image,
+        bandas_disponiveis=bandas_esperadas(parametros)
+    )
+    estimativa = estimativa.where(estimativa.lt(0), 0)
+    return estimativa.updateMask(mask).rename("estimativa"), mndwi.updateMask(mask)
+
+
+@rastreado
+def exportar_raster(image, roi, caminho_saida, escala=20, crs='EPSG:4674',
+                    pasta=PASTA_PADRAO):
+    """Baixa a imagem sobre a área (em tiles, se preciso) para um GeoTIFF."""
+    regiao = roi.geometry().buffer(10000).bounds()
+    exportacao = ExportacaoEmTiles(image, regiao, escala=escala, crs=crs,
+                                   pasta=pasta)
+    return exportacao.mosaico(exportacao.executar(), caminho_saida)
+
+
+@rastreado
+def processar_area(caminho_zip, pasta_saida, inicio, fim, nuvem_maxima=5,
+                   limiar_mndwi=0.0, metodo='unico', p_limite=0.05,
+                   id_cena=None, raster=True, formato=FORMATOS[0], cache=None,
+                   catalogo=None, limite_ee=None, zonas=None):
+    """Executa o fluxo completo de uma área de estudo e grava as saídas.
+
+    Em `pasta_saida` ficam a tabela de matchups e índices (dataset Parquet
+    `matchups/` particionado por ano ou `matchups.csv`, conforme `formato`),
+    o relatório PDF e, com `raster=True`, a estimativa de cada parâmetro em
+    GeoTIFF. Com `zonas` (um .zip de polígonos) e `raster=True`, as
+    estatísticas por zona de cada estimativa vão para `{parametro}_zonas.csv`,
+    calculadas sobre o GeoTIFF baixado. Sem `id_cena`, é usada a cena com
+    mais água válida sobre a área entre as que têm menos de `nuvem_maxima` %
+    de nuvem nela. `limite_ee` é um context manager (ex.: um semáforo) que
+    envolve as etapas que consultam o Earth Engine. Retorna um dicionário
+    com o resumo da área.
+    """
+    limite_ee = limite_ee or nullcontext()
+    os.makedirs(pasta_saida, exist_ok=True)
+
+    gdf, parametros = carregar_area(caminho_zip)
+    with limite_ee:
+        df_ref, datas_sem_imagem = extrair_reflectancias(gdf, parametros, cache=cache)
+    if df_ref.empty:
+        raise ValueError("Falha na extração dos dados espectrais.")
+
+    with etapa("índices"):
+        df_indices = calcular_indices(df_ref, parametros)
+    itens = ajustar_modelos(df_ref, parametros, metodo=metodo, p_limite=p_limite,
+                            df_indices=df_indices)
+    if not itens:
+        raise ValueError("Nenhum parâmetro com modelo disponível.")
+
+    roi = roi_do_gdf(gdf)
+    if id_cena is None:
+        catalogo = catalogo or CatalogoCenas()
+        with limite_ee:
+            catalogo.sincronizar(roi, inicio, fim)
+        cenas = catalogo.listar(roi, inicio, fim, nuvem_maxima, ordem='agua')
+        if cenas.empty:
+            raise ValueError("Nenhuma imagem Sentinel-2 no intervalo e limite de nuvem.")
+        id_cena = cenas['ID'].iloc[0]
+
+    tabela = tabela_matchups(df_ref, df_indices, parametros)
+    if formato == 'parquet':
+        escrever_dataset(tabela, os.path.join(pasta_saida, 'matchups'))
+    else:
+        escrever_csv(tabela, os.path.join(pasta_saida, 'matchups.csv'))
+    with open(os.path.join(pasta_saida, 'relatorio.pdf'), 'wb') as f:
+        f.write(montar_relatorio_pdf(itens, image_id=id_cena))
+
+    resumo = {'cena': id_cena, 'matchups': len(df_ref),
+              'datas_sem_imagem': len(datas_sem_imagem)}
+    image = preparar_imagem(
+        colecao_s2(roi, inicio, fim), id_cena, parametros)
+    poligonos = ler_shapefile_zip(zonas) if zonas is not None and raster else None
+    for item in itens:
+        parametro, modelo = item['parametro'], item['modelo']
+        resumo[f'{parametro}_preditores'] = ' + '.join(item['X'].columns)
+        resumo[f'{parametro}_r2'] = modelo.rsquared
+        resumo[f'{parametro}_rmse_loo'] = item['validacao']['rmse_loo']
+        if raster:
+            estimativa, _ = estimar(image, modelo.params.to_dict(), parametros,
+                                    limiar_mndwi)
+            caminho_raster = os.path.join(pasta_saida, f'{parametro}_estimativa.tif')
+            with limite_ee:
+                exportar_raster(estimativa, roi, caminho_raster)
+            if poligonos is not None:
+                estatisticas_zonais_locais(caminho_raster, poligonos).to_csv(
+                    os.path.join(pasta_saida, f'{parametro}_zonas.csv'))
+    return resumo
@@ -1,14 +1,63 @@
 # PRÉ-PROCESSAMENTO
+import hashlib
 import io
 import os
-import tempfile
 import zipfile
+from collections import OrderedDict
 import streamlit as st
-import ee
-import geopandas as gpd
-import geemap
+import pandas as pd
 
+import executor_ee
+from exportacao import ExportacaoEmTiles
+from rastreamento import rastreado
 
+
+COLUNAS_PARAMETROS = ['CHLA', 'TURBIDEZ', 'TSS']
+
+# Shapefiles já lidos, indexados pelo hash do conteúdo do .zip
+_CACHE_SHAPEFILES = OrderedDict()
+_MAX_SHAPEFILES = 8
+# Acima deste tamanho de .shp a leitura usa o caminho colunar (Arrow)
+_LIMITE_ARROW = 1024 * 1024
+
+
+def _normalizar_colunas(gdf):
+    """Converte os parâmetros com vírgula decimal e a data de uma só vez."""
+    for param in COLUNAS_PARAMETROS:
+        if param in gdf.columns and not pd.api.types.is_numeric_dtype(gdf[param]):
+            gdf[param] = gdf[param].astype(str).str.replace(
+                ',', '.', regex=False).astype(float)
+    if 'date' in gdf.columns:
+        gdf['date'] = pd.to_datetime(gdf['date'])
+    return gdf
+
+
+@rastreado
+def _ler_shapefile(conteudo):
+    """Lê o primeiro .shp do .zip direto da memória, sem extrair o arquivo."""
+    with zipfile.ZipFile(io.BytesIO(conteudo), 'r') as zip_ref:
+        shp_files = [i for i in zip_ref.infolist()
+                     if i.filename.lower().endswith('.shp') and '/' not in i.filename]
+    if not shp_files:
+        return None
+
+    camada = os.path.splitext(shp_files[0].filename)[0]
+    use_arrow = False
+    if shp_files[0].file_size > _LIMITE_ARROW:
+        try:
+            import pyarrow  # noqa: F401
+            use_arrow = True
+        except ImportError:
+            pass
+
+    import geopandas as gpd
+
+    gdf = gpd.read_file(io.BytesIO(conteudo), layer=camada,
+                        engine='pyogrio', use_arrow=use_arrow)
+    return _normalizar_colunas(gdf)
+
+
+@rastreado
 def load_shapefile_from_zip(uploaded_file):
     try:
         # Verificar se o arquivo é um .zip
@@ -16,34 +65,51 @@ def load_shapefile_from_zip(uploaded_file):
             st.error("Por favor, envie um arquivo .zip contendo o Shapefile.")
             return None
 
-        # Extrair o conteúdo do arquivo .zip
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            with zipfile.ZipFile(io.BytesIO(uploaded_file.read()), 'r') as zip_ref:
-                zip_ref.extractall(tmp_dir)
-
-            # Encontrar o arquivo .shp
-            shp_files = [f for f in os.listdir(
-                tmp_dir) if f.lower().endswith('.shp')]
-            if not shp_files:
-                st.error("Nenhum arquivo .shp encontrado no .zip.")
-                return None
-
-            # Carregar o Shapefile usando o geopandas
-            shp_path = os.path.join(tmp_dir, shp_files[0])
-            gdf = gpd.read_file(shp_path)
-
-            # Verificar se o GeoDataFrame foi carregado corretamente
-            if gdf.empty:
-                st.error("O Shapefile está vazio ou não pôde ser lido.")
-                return None
-            return gdf
+        conteudo = uploaded_file.getvalue()
+        chave = hashlib.sha1(conteudo).hexdigest()
+
+        if chave in _CACHE_SHAPEFILES:
+            _CACHE_SHAPEFILES.move_to_end(chave)
+            return _CACHE_SHAPEFILES[chave].copy()
+
+        gdf = _ler_shapefile(conteudo)
+        if gdf is None:
+            st.error("Nenhum arquivo .shp encontrado no .zip.")
+            return None
+
+        # Verificar se o GeoDataFrame foi carregado corretamente
+        if gdf.empty:
+            st.error("O Shapefile está vazio ou não pôde ser lido.")
+            return None
+
+        _CACHE_SHAPEFILES[chave] = gdf
+        if len(_CACHE_SHAPEFILES) > _MAX_SHAPEFILES:
+            _CACHE_SHAPEFILES.popitem(last=False)
+        return gdf.copy()
     except Exception as e:
         st.error(f"Erro ao carregar o Shapefile: {e}")
         return None
 
 
+def ler_shapefile_zip(caminho):
+    """Versão sem interface de `load_shapefile_from_zip` para um .zip em disco.
+
+    Levanta ValueError em vez de exibir a mensagem de erro.
+    """
+    if not caminho.lower().endswith('.zip'):
+        raise ValueError(f"{caminho}: envie um arquivo .zip contendo o Shapefile.")
+    with open(caminho, 'rb') as f:
+        gdf = _ler_shapefile(f.read())
+    if gdf is None:
+        raise ValueError(f"{caminho}: nenhum arquivo .shp encontrado no .zip.")
+    if gdf.empty:
+        raise ValueError(f"{caminho}: o Shapefile está vazio ou não pôde ser lido.")
+    return gdf
+
+
 # Função de nuvens e fator de escala
-def mask_cloud_and_shadows_sr(image):
+def mascara_valida(image):
+    """1 nos pixels sem nuvem, neve, sombra de nuvem ou cirrus."""
     cloud_prob = image.select('MSK_CLDPRB')
     snow_prob = image.select('MSK_SNWPRB')
     cloud = cloud_prob.lt(5)
@@ -51,24 +117,33 @@ def mask_cloud_and_shadows_sr(image):
     scl = image.select('SCL')
     shadow = scl.eq(3)  # 3 = cloud shadow
     cirrus = scl.eq(10)  # 10 = cirrus
-    mask = (cloud.And(snow)).And(cirrus.neq(1)).And(shadow.neq(1))
+    return (cloud.And(snow)).And(cirrus.neq(1)).And(shadow.neq(1))
+
+
+def mask_cloud_and_shadows_sr(image):
+    mask = mascara_valida(image)
     return image.updateMask(mask).divide(10000).select("B.*").copyProperties(image, image.propertyNames())
 
 
 # ------------------------- Funções de Exportação -------------------------
+@rastreado
 def export_image(image, roi):
     try:
-        if image.bandNames().size().getInfo() == 0:
-            st.sidebar.error("Erro: A imagem selecionada não contém bandas.")
-            return
+        # Verificação das bandas e pedido da URL vão juntos ao executor do EE
+        executor = executor_ee.padrao()
+        n_bandas = executor.submeter(image.bandNames().size())
         roi = roi.geometry().buffer(10000).bounds()
-        url = image.getDownloadURL({
+        url = executor.submeter(image, 'getDownloadURL', {
             'name': 'image_export',
             'scale': 20,
             'crs': 'EPSG:4674',
             'region': roi,
             'format': 'GEO_TIFF'
         })
+        if n_bandas.result() == 0:
+            st.sidebar.error("Erro: A imagem selecionada não contém bandas.")
+            return
+        url = url.result()
         st.sidebar.success(
             f"Imagem exportada com sucesso. [Clique para baixar]({url})")
     except Exception as e:
@@ -80,25 +155,35 @@ def export_image(image, roi):
             st.sidebar.error(f"Erro ao exportar imagem: {str(e)}")
 
 
+@rastreado
 def export_image_by_tiles(image, roi, tile_size=0.05):
-    """Exportar imagem dividida em tiles menores para evitar exceder o limite de 50MB."""
-    grid = geemap.fishnet(roi, rows=5, cols=5)
-    for idx, feature in enumerate(grid.getInfo()['features']):
-        tile_geometry = ee.Feature(feature).geometry()
-        try:
-            if image.bandNames().size().getInfo() == 0:
-                st.sidebar.warning(
-                    f"Tile {idx+1} não possui bandas e será ignorado.")
-                continue
-
-            url = image.getDownloadURL({
-                'name': f'image_export_tile_{idx+1}',
-                'scale': 20,
-                'crs': 'EPSG:4674',
-                'region': tile_geometry,
-                'format': 'GEO_TIFF'
-            })
-            st.sidebar.success(
-                f"Tile {idx+1} exportado com sucesso. [Clique para baixar]({url})")
-        except Exception as e:
-            st.sidebar.error(f"Erro no tile {idx+1}: {str(e)}")
+    """Exportar imagem dividida em tiles menores para evitar exceder o limite de 50MB.
+
+    Os tiles partem de uma grade de `tile_size` graus e só são subdivididos
+    onde o limite é atingido. O download é paralelo, pode ser retomado e os
+    tiles são unidos em um único GeoTIFF.
+    """
+    exportacao = ExportacaoEmTiles(image, roi, escala=20, crs='EPSG:4674',
+                                   tamanho_inicial=tile_size)
+    barra = st.sidebar.progress(0.0, text="Baixando tiles...")
+
+    def progresso(concluidos, total):
+        barra.progress(concluidos / max(total, 1),
+                       text=f"Tiles baixados: {concluidos}/{total}")
+
+    try:
+        arquivos = exportacao.executar(progresso)
+        caminho = exportacao.mosaico(arquivos)
+    except Exception as e:
+        st.sidebar.error(f"Erro na exportação em tiles: {str(e)}")
+        return
+
+    with open(caminho, 'rb') as f:
+        dados = f.read()
+    exportacao.limpar()
+    st.sidebar.download_button(
+        label=f"Baixar mosaico ({len(arquivos)} tiles)",
+        data=dados,
+        file_name='image_export.tif',
+        mime='image/tiff'
+    )
@@ -0,0 +1,207 @@
+# LINHA DE COMANDO
+# Processa várias áreas de estudo em paralelo, sem a interface:
+#
+#   python qasat.py entradas/ --saida resultados/ --inicio 2024-01-01 --fim 2024-12-31
+#
+# `entradas` é uma pasta com os .zip ou um manifesto CSV com a coluna `zip`
+# e, opcionalmente, `nome`, `inicio`, `fim`, `nuvem`, `mndwi`, `cena` e
+# `zonas` (.zip de polígonos) para sobrescrever as opções de cada área. Cada área ganha uma pasta em `--saida`
+# e um resumo de todas fica em `resumo.csv`.
+#
+# Credenciais do Earth Engine: QASAT_EE_CONTA e QASAT_EE_CHAVE (conta de
+# serviço e arquivo JSON da chave) ou, sem elas, as credenciais padrão.
+#
+# Um modelo já ajustado também pode ser aplicado, sem o Earth Engine, a um
+# GeoTIFF de bandas baixado (uma cena ou um tile inteiro):
+#
+#   python qasat.py aplicar bandas.tif estimativa.tif --modelo represa/TURBIDEZ
+#
+# O modelo vem do registro de modelos (`--registro`) ou de um JSON
+# {preditor: coeficiente} (`--coeficientes`).
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+import pandas as pd
+
+import rastreamento
+import sessao_ee
+from cache_reflectancias import CacheReflectancias
+from catalogo import CatalogoCenas
+from pipeline import processar_area
+from selecao_modelo import METODOS
+from tabelas import FORMATOS
+
+# Estado de cada processo do pool (definido em `_iniciar_processo`)
+_LIMITE_EE = None
+_CACHE = None
+_CATALOGO = None
+
+
+def _iniciar_processo(limite_ee):
+    global _LIMITE_EE, _CACHE, _CATALOGO
+    _LIMITE_EE = limite_ee
+    sessao_ee.iniciar()
+    _CACHE = CacheReflectancias()
+    _CATALOGO = CatalogoCenas()
+
+
+def ler_tarefas(entrada, padrao):
+    """Lista de áreas a processar, a partir de uma pasta ou de um manifesto."""
+    if os.path.isdir(entrada):
+        linhas = [{'zip': os.path.join(entrada, nome)}
+                  for nome in sorted(os.listdir(entrada))
+                  if nome.lower().endswith('.zip')]
+    else:
+        base = os.path.dirname(os.path.abspath(entrada))
+        linhas = pd.read_csv(entrada, dtype=str).to_dict('records')
+        for linha in linhas:
+            linha['zip'] = os.path.join(base, linha['zip'])
+            if pd.notna(linha.get('zonas')):
+                linha['zonas'] = os.path.join(base, linha['zonas'])
+
+    tarefas, nomes = [], set()
+    for linha in linhas:
+        tarefa = dict(padrao)
+        tarefa.update({k: v for k, v in linha.items() if pd.notna(v)})
+        nome = tarefa.get('nome') or os.path.splitext(os.path.basename(tarefa['zip']))[0]
+        while nome in nomes:
+            nome += '_'
+        nomes.add(nome)
+        tarefa['nome'] = nome
+        tarefa['nuvem'] = float(tarefa['nuvem'])
+        tarefa['mndwi'] = float(tarefa['mndwi'])
+        tarefa['p_limite'] = float(tarefa['p_limite'])
+        tarefas.append(tarefa)
+    return tarefas
+
+
+def _processar(tarefa, saida):
+    pasta = os.path.join(saida, tarefa['nome'])
+    os.makedirs(pasta, exist_ok=True)
+    rastreamento.iniciar()
+    sessao_ee.renovar_token()
+    inicio = time.perf_counter()
+    resumo = {'area': tarefa['nome']}
+    try:
+        resumo.update(processar_area(
+            tarefa['zip'], pasta, tarefa['inicio'], tarefa['fim'],
+            nuvem_maxima=tarefa['nuvem'], limiar_mndwi=tarefa['mndwi'],
+            metodo=tarefa['metodo'], p_limite=tarefa['p_limite'],
+            id_cena=tarefa.get('cena'), raster=tarefa['raster'],
+            formato=tarefa['formato'], zonas=tarefa.get('zonas'),
+            cache=_CACHE, catalogo=_CATALOGO, limite_ee=_LIMITE_EE))
+        resumo['status'] = 'ok'
+    except Exception as e:
+        resumo.update({'status': 'erro', 'erro': f"{type(e).__name__}: {e}"})
+        with open(os.path.join(pasta, 'erro.txt'), 'w', encoding='utf-8') as f:
+            f.write(traceback.format_exc())
+    resumo['tempo_s'] = round(time.perf_counter() - inicio, 2)
+    rastreamento.salvar(pasta)
+    return resumo
+
+
+def aplicar(argv=None):
+    """Subcomando `aplicar`: estimativa local a partir de um GeoTIFF de bandas."""
+    from aplicacao_local import aplicar_modelo_local
+    from registro_modelos import CAMINHO_PADRAO, RegistroModelos
+
+    parser = argparse.ArgumentParser(
+        prog='qasat aplicar',
+        description="Aplica um modelo salvo a um GeoTIFF de bandas Sentinel-2")
+    parser.add_argument('entrada', help="GeoTIFF com as bandas (nomes na descrição)")
+    parser.add_argument('saida', help="Cloud-Optimized GeoTIFF da estimativa")
+    modelo = parser.add_mutually_exclusive_group(required=True)
+    modelo.add_argument('--modelo', help="nome no registro (ex.: represa/TURBIDEZ)")
+    modelo.add_argument('--coeficientes', help="JSON {preditor: coeficiente}")
+    parser.add_argument('--registro', default=CAMINHO_PADRAO,
+                        help="arquivo .npz do registro de modelos")
+    parser.add_argument('--mndwi', type=float, default=0.0, help="limiar MNDWI")
+    parser.add_argument('--escala', type=float, default=1.0,
+                        help="fator para reflectância (0.0001 para números digitais)")
+    parser.add_argument('--bloco', type=int, default=512, help="lado da janela, em pixels")
+    parser.add_argument('--processos', type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    if args.coeficientes:
+        with open(args.coeficientes, encoding='utf-8') as f:
+            coeficientes = json.load(f)
+    else:
+        registro = RegistroModelos(args.registro)
+        if args.modelo not in registro.modelos:
+            parser.error(f"modelo {args.modelo!r} não está em {args.registro}")
+        coeficientes = registro.coeficientes(args.modelo)
+
+    inicio = time.perf_counter()
+    aplicar_modelo_local(args.entrada, coeficientes, args.saida,
+                         limiar_mndwi=args.mndwi, escala=args.escala,
+                         bloco=args.bloco, processos=args.processos)
+    print(f"{args.saida} ({time.perf_counter() - inicio:.1f} s)", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['aplicar']:
+        return aplicar(argv[1:])
+
+    parser = argparse.ArgumentParser(
+        prog='qasat', description="Processamento em lote de áreas de estudo do QASat")
+    parser.add_argument('entrada', help="pasta com os .zip ou manifesto CSV")
+    parser.add_argument('--saida', default='resultados_qasat')
+    parser.add_argument('--inicio', default='2024-01-01')
+    parser.add_argument('--fim', default=date.today().isoformat())
+    parser.add_argument('--nuvem', type=float, default=5,
+                        help="nuvem máxima sobre a área de estudo (%%)")
+    parser.add_argument('--mndwi', type=float, default=0.0, help="limiar MNDWI")
+    parser.add_argument('--metodo', choices=list(METODOS), default='unico',
+                        help="seleção de preditores (padrão: a mesma do app)")
+    parser.add_argument('--p-limite', type=float, default=0.05)
+    parser.add_argument('--sem-raster', action='store_true',
+                        help="não baixa a estimativa em GeoTIFF")
+    parser.add_argument('--formato', choices=FORMATOS, default=FORMATOS[0],
+                        help="formato da tabela de matchups e índices")
+    parser.add_argument('--zonas', help=".zip de polígonos para estatísticas por zona")
+    parser.add_argument('--processos', type=int, default=os.cpu_count(),
+                        help="áreas processadas ao mesmo tempo")
+    parser.add_argument('--ee-simultaneas', type=int, default=4,
+                        help="etapas consultando o Earth Engine ao mesmo tempo")
+    args = parser.parse_args(argv)
+
+    padrao = {'inicio': args.inicio, 'fim': args.fim, 'nuvem': args.nuvem,
+              'mndwi': args.mndwi, 'metodo': args.metodo,
+              'p_limite': args.p_limite, 'raster': not args.sem_raster,
+              'formato': args.formato, 'zonas': args.zonas}
+    tarefas = ler_tarefas(args.entrada, padrao)
+    if not tarefas:
+        parser.error(f"nenhum .zip encontrado em {args.entrada}")
+    os.makedirs(args.saida, exist_ok=True)
+
+    contexto = multiprocessing.get_context('spawn')
+    limite_ee = contexto.BoundedSemaphore(max(1, args.ee_simultaneas))
+    resumos = []
+    with ProcessPoolExecutor(max_workers=min(args.processos, len(tarefas)),
+                             mp_context=contexto,
+                             initializer=_iniciar_processo,
+                             initargs=(limite_ee,)) as pool:
+        futuros = [pool.submit(_processar, t, args.saida) for t in tarefas]
+        for i, futuro in enumerate(as_completed(futuros), 1):
+            resumo = futuro.result()
+            resumos.append(resumo)
+            print(f"[{i}/{len(tarefas)}] {resumo['area']}: {resumo['status']}"
+                  f" ({resumo['tempo_s']} s){' - ' + resumo['erro'] if 'erro' in resumo else ''}",
+                  file=sys.stderr)
+
+    tabela = pd.DataFrame(resumos).sort_values('area')
+    tabela.to_csv(os.path.join(args.saida, 'resumo.csv'), index=False)
+    return 0 if (tabela['status'] == 'ok').all() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
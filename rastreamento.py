@@ -0,0 +1,228 @@
+# RASTREAMENTO
+# Intervalos cronometrados das etapas do pipeline e de cada chamada bloqueante
+# ao Earth Engine, para saber onde o tempo de uma execução é gasto. Cada
+# execução tem o seu rastro em uma ContextVar: sessões do Streamlit rodam em
+# threads do mesmo processo e não se misturam. Quem repassa trabalho a outras
+# threads (executor do EE, pools) roda a tarefa em `contextvars.copy_context()`.
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+import ee
+import pandas as pd
+import streamlit as st
+
+logger = logging.getLogger('qasat.rastreamento')
+
+# Chamadas do cliente que vão à rede; o restante só monta o grafo
+METODOS_EE = ('getInfo', 'getDownloadURL', 'getMapId', 'getThumbURL')
+
+PASTA_RASTROS = os.environ.get('QASAT_RASTROS_DIR')
+
+
+def _tamanho(valor):
+    try:
+        return len(json.dumps(valor, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class Rastreador:
+    """Intervalos de uma execução do script (um rerun do Streamlit)."""
+
+    def __init__(self):
+        self.origem = time.perf_counter()
+        self.intervalos = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def intervalo(self, nome, categoria='etapa', **atributos):
+        pilha = self._local.__dict__.setdefault('pilha', [])
+        registro = {'nome': nome, 'categoria': categoria, 'nivel': len(pilha),
+                    'thread': threading.get_ident(), **atributos}
+        pilha.append(registro)
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        except BaseException as erro:
+            registro['erro'] = type(erro).__name__
+            raise
+        finally:
+            registro['inicio'] = inicio - self.origem
+            registro['duracao'] = time.perf_counter() - inicio
+            pilha.pop()
+            with self._lock:
+                self.intervalos.append(registro)
+            logger.debug(json.dumps(registro, default=str))
+
+    def ordenados(self):
+        with self._lock:
+            return sorted(self.intervalos, key=lambda r: r['inicio'])
+
+    def resumo(self):
+        """Tempo decorrido, número de chamadas ao EE, tempo nelas e bytes recebidos."""
+        chamadas = [r for r in self.ordenados() if r['categoria'] == 'ee']
+        return {
+            'total': time.perf_counter() - self.origem,
+            'chamadas_ee': len(chamadas),
+            'tempo_ee': sum(r['duracao'] for r in chamadas),
+            'bytes_ee': sum(r.get('bytes', 0) for r in chamadas),
+        }
+
+    def json_linhas(self):
+        """Um objeto JSON por intervalo (log estruturado)."""
+        return '\n'.join(json.dumps(r, default=str) for r in self.ordenados())
+
+    def chrome_trace(self):
+        """Formato Trace Event, aberto em chrome://tracing ou no Perfetto."""
+        fixos = ('nome', 'categoria', 'inicio', 'duracao', 'thread')
+        eventos = [{
+            'name': r['nome'], 'cat': r['categoria'], 'ph': 'X',
+            'ts': r['inicio'] * 1e6, 'dur': r['duracao'] * 1e6,
+            'pid': os.getpid(), 'tid': r['thread'],
+            'args': {k: v for k, v in r.items() if k not in fixos},
+        } for r in self.ordenados()]
+        return json.dumps({'traceEvents': eventos, 'displayTimeUnit': 'ms'},
+                          default=str)
+
+
+# Rastro da execução corrente; `iniciar` cria um novo no contexto atual. Fora
+# de uma execução iniciada não há rastro e nada é registrado.
+_ATUAL = contextvars.ContextVar('rastreador', default=None)
+_EM_CHAMADA_EE = threading.local()
+_INSTRUMENTADO = False
+
+
+def iniciar():
+    """Começa um novo rastro (chamado no início de cada execução do app)."""
+    rastreador = Rastreador()
+    _ATUAL.set(rastreador)
+    return rastreador
+
+
+def atual():
+    """Rastro da execução corrente, ou None fora de `iniciar`."""
+    return _ATUAL.get()
+
+
+def _intervalo(nome, categoria, **atributos):
+    rastreador = _ATUAL.get()
+    if rastreador is None:
+        return nullcontext({})
+    return rastreador.intervalo(nome, categoria, **atributos)
+
+
+def etapa(nome, **atributos):
+    """Context manager que cronometra uma etapa do pipeline."""
+    return _intervalo(nome, 'etapa', **atributos)
+
+
+def rastreado(funcao):
+    """Decorador: cada chamada de `funcao` vira um intervalo no rastro."""
+    nome = f'{funcao.__module__}.{funcao.__qualname__}'
+
+    @functools.wraps(funcao)
+    def envolvida(*args, **kwargs):
+        with _intervalo(nome, 'etapa'):
+            return funcao(*args, **kwargs)
+    return envolvida
+
+
+def _envolver_ee(original, nome):
+    @functools.wraps(original)
+    def envolvida(self, *args, **kwargs):
+        # getInfo de subclasses chama o da classe base: conta uma vez só
+        if _ATUAL.get() is None or getattr(_EM_CHAMADA_EE, 'ativo', False):
+            return original(self, *args, **kwargs)
+        _EM_CHAMADA_EE.ativo = True
+        try:
+            with _intervalo(nome, 'ee') as registro:
+                resultado = original(self, *args, **kwargs)
+                registro['bytes'] = _tamanho(resultado)
+                return resultado
+        finally:
+            _EM_CHAMADA_EE.ativo = False
+
+    envolvida._rastreado = True
+    return envolvida
+
+
+def instrumentar_ee():
+    """Envolve as chamadas bloqueantes do cliente `ee` (uma vez por processo)."""
+    global _INSTRUMENTADO
+    if _INSTRUMENTADO:
+        return
+    _INSTRUMENTADO = True
+    for nome_classe in ('ComputedObject', 'Image', 'ImageCollection',
+                        'Feature', 'FeatureCollection'):
+        classe = getattr(ee, nome_classe, None)
+        if not isinstance(classe, type):
+            continue
+        for metodo in METODOS_EE:
+            original = classe.__dict__.get(metodo)
+            if original is not None and not getattr(original, '_rastreado', False):
+                setattr(classe, metodo,
+                        _envolver_ee(original, f'{nome_classe}.{metodo}'))
+
+
+def salvar(pasta=PASTA_RASTROS):
+    """Grava o rastro corrente como Chrome trace em `pasta` (se definida)."""
+    rastreador = _ATUAL.get()
+    if not pasta or rastreador is None:
+        return None
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(
+        pasta, f"rastro_{datetime.now():%Y%m%d_%H%M%S_%f}.json")
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write(rastreador.chrome_trace())
+    return caminho
+
+
+def mostrar_cascata():
+    """Cascata das etapas e chamadas ao EE desta execução, na barra lateral."""
+    import altair as alt
+
+    rastreador = _ATUAL.get()
+    if rastreador is None:
+        return
+    intervalos = rastreador.ordenados()
+    if not intervalos:
+        return
+    resumo = rastreador.resumo()
+
+    df = pd.DataFrame(intervalos).reindex(
+        columns=['nome', 'categoria', 'nivel', 'inicio', 'duracao', 'bytes', 'erro'])
+    df['fim'] = df['inicio'] + df['duracao']
+    df['rotulo'] = [f"{i:03d} {'  ' * n}{nome}"
+                    for i, (n, nome) in enumerate(zip(df['nivel'], df['nome']))]
+
+    with st.sidebar.expander(
+            f"Desempenho: {resumo['total']:.2f} s, "
+            f"{resumo['chamadas_ee']} chamadas ao EE"):
+        st.caption(
+            f"Earth Engine: {resumo['tempo_ee']:.2f} s, "
+            f"{resumo['bytes_ee'] / 1024:.0f} KiB recebidos")
+        grafico = alt.Chart(df).mark_bar().encode(
+            x=alt.X('inicio:Q', title='segundos'),
+            x2='fim:Q',
+            y=alt.Y('rotulo:N', sort=None, title=None,
+                    axis=alt.Axis(labels=False, ticks=False)),
+            color=alt.Color('categoria:N', legend=alt.Legend(orient='bottom')),
+            tooltip=['nome', alt.Tooltip('duracao:Q', format='.3f'), 'bytes'],
+        ).properties(height=max(120, 12 * len(df)))
+        st.altair_chart(grafico, use_container_width=True)
+        st.dataframe(df[['nome', 'categoria', 'inicio', 'duracao', 'bytes']],
+                     hide_index=True)
+        st.download_button("Baixar rastro (Chrome trace)",
+                           rastreador.chrome_trace(), file_name="rastro.json",
+                           mime="application/json")
+        st.download_button("Baixar log (JSON por linha)",
+                           rastreador.json_linhas(), file_name="rastro.jsonl",
+                           mime="application/x-ndjson")
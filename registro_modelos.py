@@ -0,0 +1,150 @@
+# REGISTRO DE MODELOS
+# Modelos ajustados guardados em um arquivo .npz, junto com as estatísticas
+# suficientes (XᵀX, Xᵀy, yᵀy, n) sobre todos os preditores candidatos. Uma
+# nova campanha de campo entra como atualização de posto k, sem reprocessar
+# os pontos antigos (pontos já incluídos são reconhecidos pelo local e pela
+# data e não entram de novo), e aplicar um modelo a uma cena só exige ler os
+# coeficientes (apenas numpy, sem statsmodels).
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+CAMINHO_PADRAO = os.path.join(
+    os.environ.get('QASAT_CACHE_DIR',
+                   os.path.join(os.path.expanduser('~'), '.cache', 'qasat')),
+    'modelos.npz')
+
+
+def _chaves_linhas(dados):
+    """Hash (uint64) de cada matchup pelo ponto ('lon', 'lat') e pela 'date'."""
+    textos = (f"{lon:.7f},{lat:.7f}|{data}"
+              for lon, lat, data in zip(dados['lon'], dados['lat'], dados['date']))
+    return np.fromiter(
+        (int.from_bytes(hashlib.sha1(t.encode('utf-8')).digest()[:8], 'little')
+         for t in textos), dtype=np.uint64, count=len(dados))
+
+
+def _estatisticas(dados, parametro, candidatos, absorvidas=None):
+    """(XᵀX, Xᵀy, yᵀy, n, chaves) das linhas completas de `dados`.
+
+    Linhas cuja chave está em `absorvidas` ficam de fora; `chaves` são as
+    das linhas usadas.
+    """
+    from selecao_modelo import linhas_validas
+
+    X = dados[list(candidatos)].to_numpy(dtype=np.float64)
+    y = dados[parametro].to_numpy(dtype=np.float64)
+    chaves = _chaves_linhas(dados)
+    validas = linhas_validas(dados, parametro, candidatos)
+    if absorvidas is not None:
+        validas &= ~np.isin(chaves, absorvidas)
+    X, y = X[validas], y[validas]
+    return X.T @ X, X.T @ y, float(y @ y), int(len(y)), chaves[validas]
+
+
+class RegistroModelos:
+    """Modelos por nome (ex.: 'represa/TURBIDEZ').
+
+    Cada modelo guarda o parâmetro, os candidatos, os preditores escolhidos,
+    coeficientes, p-valores, método, limite de p-valor e as estatísticas
+    suficientes, além das chaves dos matchups já incluídos. As alterações só
+    vão para o disco com `salvar()`.
+    """
+
+    def __init__(self, caminho=CAMINHO_PADRAO):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self.modelos = {}
+        self._estatisticas = {}
+        if os.path.exists(caminho):
+            self._carregar()
+
+    def _carregar(self):
+        with np.load(self.caminho, allow_pickle=False) as arquivo:
+            meta = json.loads(arquivo['meta'].tobytes().decode('utf-8'))
+            for i, (nome, modelo) in enumerate(meta.items()):
+                self.modelos[nome] = modelo
+                # Registros antigos não têm as chaves das linhas
+                linhas = (arquivo[f'linhas_{i}'] if f'linhas_{i}' in arquivo.files
+                          else np.empty(0, dtype=np.uint64))
+                self._estatisticas[nome] = (arquivo[f'XtX_{i}'], arquivo[f'Xty_{i}'], linhas)
+
+    def salvar(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.caminho)), exist_ok=True)
+        with self._lock:
+            nomes = sorted(self.modelos)
+            meta = json.dumps({n: self.modelos[n] for n in nomes})
+            arrays = {'meta': np.frombuffer(meta.encode('utf-8'), dtype=np.uint8)}
+            for i, nome in enumerate(nomes):
+                (arrays[f'XtX_{i}'], arrays[f'Xty_{i}'],
+                 arrays[f'linhas_{i}']) = self._estatisticas[nome]
+            tmp = self.caminho + '.tmp'
+            with open(tmp, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp, self.caminho)
+
+    def _ajustar(self, nome, parametro, candidatos, XtX, Xty, yty, n, linhas,
+                 metodo, p_limite, campanhas):
+        from selecao_modelo import selecionar_de_estatisticas
+
+        selecao = selecionar_de_estatisticas(
+            XtX, Xty, yty, n, candidatos, metodo=metodo, p_limite=p_limite)
+        modelo = {
+            'parametro': parametro,
+            'candidatos': list(candidatos),
+            'preditores': selecao['preditores'],
+            'coeficientes': {k: float(v) for k, v in selecao['params'].items()},
+            'pvalues': {k: float(v) for k, v in selecao['pvalues'].items()},
+            'substituto': selecao['substituto'],
+            'metodo': metodo,
+            'p_limite': p_limite,
+            'yty': yty,
+            'n': n,
+            'campanhas': campanhas,
+            'atualizado': time.time(),
+        }
+        with self._lock:
+            self.modelos[nome] = modelo
+            self._estatisticas[nome] = (XtX, Xty, linhas)
+        return modelo
+
+    def registrar(self, dados, parametro, candidatos, metodo='unico',
+                  p_limite=0.05, nome=None):
+        """Seleciona, ajusta e registra o modelo de `parametro`.
+
+        `dados` é a tabela de matchups com os índices calculados (e as
+        colunas 'lon', 'lat' e 'date'). Um modelo com o mesmo nome é
+        substituído.
+        """
+        XtX, Xty, yty, n, linhas = _estatisticas(dados, parametro, candidatos)
+        return self._ajustar(nome or parametro, parametro, candidatos, XtX, Xty,
+                             yty, n, linhas, metodo, p_limite, campanhas=1)
+
+    def atualizar(self, nome, dados):
+        """Acrescenta novos matchups ao modelo `nome` e refaz a seleção.
+
+        As estatísticas dos pontos novos são somadas às guardadas
+        (XᵀX + X₁ᵀX₁, ...). Matchups já incluídos (mesmo ponto e data) são
+        ignorados; se nenhum sobrar, o modelo fica como está.
+        """
+        atual = self.modelos[nome]
+        XtX0, Xty0, linhas0 = self._estatisticas[nome]
+        XtX, Xty, yty, n, linhas = _estatisticas(
+            dados, atual['parametro'], atual['candidatos'], absorvidas=linhas0)
+        if n == 0:
+            return atual
+        return self._ajustar(
+            nome, atual['parametro'], atual['candidatos'], XtX0 + XtX, Xty0 + Xty,
+            atual['yty'] + yty, atual['n'] + n, np.concatenate([linhas0, linhas]),
+            atual['metodo'], atual['p_limite'], atual['campanhas'] + 1)
+
+    def coeficientes(self, nome):
+        """{preditor: coeficiente}, no formato de `aplicar_modelo_na_imagem`."""
+        return dict(self.modelos[nome]['coeficientes'])
+
+    def nomes(self):
+        return sorted(self.modelos)
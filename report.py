@@ -1,19 +1,53 @@
-import seaborn as sns
-import matplotlib.pyplot as plt
-from statsmodels.tools.eval_measures import rmse
-from fpdf import FPDF
+# seaborn, matplotlib, statsmodels e fpdf são importados só quando um
+# relatório é montado: importar este módulo no início do app fica barato
 import numpy as np
+import contextvars
+import hashlib
+import io
 import os
 import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 
+from rastreamento import rastreado
 
-def gerar_relatorio_pdf(parametro, modelo, X, y, image_id=None):
-    y_pred = modelo.predict(X)
-    erro_rmse = rmse(y, y_pred)
+# Figuras e PDFs já gerados, indexados pela impressão digital dos modelos
+_CACHE_FIGURAS = OrderedDict()
+_CACHE_PDFS = OrderedDict()
+_MAX_CACHE = 16
 
-    # Criar scatter plot
-    fig, ax = plt.subplots(figsize=(6, 4))
+
+def _guardar(cache, chave, valor):
+    cache[chave] = valor
+    cache.move_to_end(chave)
+    if len(cache) > _MAX_CACHE:
+        cache.popitem(last=False)
+
+
+def impressao_digital(item):
+    """Hash do parâmetro, dos coeficientes e dos dados de um modelo."""
+    h = hashlib.sha1(item['parametro'].encode('utf-8'))
+    params = item['modelo'].params
+    h.update(','.join(params.index).encode('utf-8'))
+    h.update(np.ascontiguousarray(params.to_numpy(dtype=np.float64)).tobytes())
+    h.update(np.ascontiguousarray(item['X'].to_numpy(dtype=np.float64)).tobytes())
+    h.update(np.ascontiguousarray(item['y'].to_numpy(dtype=np.float64)).tobytes())
+    return h.hexdigest()
+
+
+@rastreado
+def _figura_png(parametro, y, y_pred):
+    """Gráfico observado x estimado como bytes PNG (sem arquivo temporário).
+
+    Usa `Figure` diretamente (sem pyplot), o que permite renderizar várias
+    figuras em paralelo.
+    """
+    import seaborn as sns
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(6, 4))
+    ax = fig.subplots()
     sns.scatterplot(x=y, y=y_pred, ax=ax)
     ax.plot([y.min(), y.max()], [y.min(), y.max()], '--r', label='1:1')
     ax.set_xlabel('Valor Observado')
@@ -21,14 +55,33 @@ def gerar_relatorio_pdf(parametro, modelo, X, y, image_id=None):
     ax.set_title(f'{parametro}: Observado vs Estimado')
     ax.legend()
 
-    # Salvar gráfico
-    temp_dir = tempfile.mkdtemp()
-    graph_path = os.path.join(temp_dir, f'{parametro}_scatter.png')
-    plt.savefig(graph_path)
-    plt.close()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+@rastreado
+def _figuras(itens, chaves):
+    """Renderiza as figuras que não estão no cache, em paralelo."""
+    faltando = [(item, chave) for item, chave in zip(itens, chaves)
+                if chave not in _CACHE_FIGURAS]
+    if len(faltando) > 1:
+        with ThreadPoolExecutor(len(faltando)) as pool:
+            pngs = list(pool.map(
+                lambda par: contextvars.copy_context().run(
+                    _figura_png, par[0]['parametro'], par[0]['y'], par[0]['y_pred']),
+                faltando))
+    else:
+        pngs = [_figura_png(item['parametro'], item['y'], item['y_pred'])
+                for item, _ in faltando]
+    for (_, chave), png in zip(faltando, pngs):
+        _guardar(_CACHE_FIGURAS, chave, png)
+    return [_CACHE_FIGURAS[chave] for chave in chaves]
+
+
+def _pagina_parametro(pdf, item, png, image_id):
+    parametro, modelo, validacao = item['parametro'], item['modelo'], item.get('validacao')
 
-    # Criar PDF
-    pdf = FPDF()
     pdf.add_page()
     pdf.set_font("Arial", size=12)
 
@@ -40,11 +93,30 @@ def gerar_relatorio_pdf(parametro, modelo, X, y, image_id=None):
         pdf.cell(200, 10, txt=f"Imagem: {image_id}", ln=True)
 
     pdf.ln(5)
-    pdf.cell(200, 10, txt=f"RMSE: {erro_rmse:.4f}", ln=True)
+    if item.get('substituto'):
+        pdf.cell(200, 10, txt=(
+            "Nenhum preditor significativo: modelo com o melhor preditor isolado."),
+            ln=True)
+    pdf.cell(200, 10, txt=f"RMSE: {item['rmse']:.4f}", ln=True)
+
+    if validacao:
+        pdf.cell(
+            200, 10, txt=f"RMSE leave-one-out: {validacao['rmse_loo']:.4f}", ln=True)
+        pdf.cell(
+            200, 10, txt=f"RMSE {validacao['k']}-fold: {validacao['rmse_kfold']:.4f}", ln=True)
+        pdf.cell(200, 10, txt=(
+            f"IC {validacao['nivel']:.0%} bootstrap do RMSE: "
+            f"{validacao['rmse_ic'][0]:.4f} - {validacao['rmse_ic'][1]:.4f}"), ln=True)
 
-    # Gráfico
+    # Gráfico: o fpdf clássico só lê imagens de um caminho (o fpdf2 também
+    # aceitaria os bytes direto)
     pdf.ln(10)
-    pdf.image(graph_path, x=10, w=180)
+    with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
+        tmp.write(png)
+    try:
+        pdf.image(tmp.name, x=10, w=180)
+    finally:
+        os.remove(tmp.name)
 
     # Resumo estatístico
     pdf.add_page()
@@ -53,15 +125,51 @@ def gerar_relatorio_pdf(parametro, modelo, X, y, image_id=None):
     for line in summary_lines:
         pdf.multi_cell(0, 4, txt=line)
 
-    # PDF 
-    pdf_path = os.path.join(temp_dir, f'relatorio_{parametro}.pdf')
-    pdf.output(pdf_path)
+    if validacao:
+        pdf.ln(4)
+        pdf.multi_cell(0, 4, txt="Intervalos bootstrap dos coeficientes:")
+        for line in validacao['coeficientes'].to_string().split('\n'):
+            pdf.multi_cell(0, 4, txt=line)
+
+
+@rastreado
+def montar_relatorio_pdf(itens, image_id=None):
+    """Monta um único PDF, em memória, com todos os parâmetros.
+
+    `itens` é uma lista de dicionários com 'parametro', 'modelo', 'X', 'y' e,
+    opcionalmente, 'validacao'. Se nada mudou desde a última chamada com os
+    mesmos modelos e imagem, o PDF guardado é devolvido sem ser refeito.
+    """
+    chaves = [impressao_digital(item) for item in itens]
+    chave_pdf = hashlib.sha1(
+        '|'.join(chaves + [str(image_id)]).encode('utf-8')).hexdigest()
+    if chave_pdf in _CACHE_PDFS:
+        _CACHE_PDFS.move_to_end(chave_pdf)
+        return _CACHE_PDFS[chave_pdf]
+
+    from fpdf import FPDF
+    from statsmodels.tools.eval_measures import rmse
+
+    itens = [dict(item) for item in itens]
+    for item in itens:
+        item['y_pred'] = item['modelo'].predict(item['X'])
+        item['rmse'] = rmse(item['y'], item['y_pred'])
+
+    pdf = FPDF()
+    for item, png in zip(itens, _figuras(itens, chaves)):
+        _pagina_parametro(pdf, item, png, image_id)
+
+    dados = pdf.output(dest='S')
+    dados = dados.encode('latin-1') if isinstance(dados, str) else bytes(dados)
+    _guardar(_CACHE_PDFS, chave_pdf, dados)
+    return dados
 
-    with open(pdf_path, "rb") as f:
-        st.download_button(
-            label=f"📄 Baixar Relatório {parametro}",
-            data=f,
-            file_name=f"relatorio_{parametro}.pdf",
-            mime="application/pdf"
-        )
 
+def gerar_relatorio_pdf(itens, image_id=None):
+    parametros = '_'.join(item['parametro'] for item in itens)
+    st.download_button(
+        label=f"📄 Baixar Relatório {parametros.replace('_', ', ')}",
+        data=montar_relatorio_pdf(itens, image_id),
+        file_name=f"relatorio_{parametros}.pdf",
+        mime="application/pdf"
+    )
@@ -0,0 +1,228 @@
+# SELEÇÃO DE PREDITORES
+# Eliminação backward, seleção forward e melhor subconjunto para o OLS sem
+# intercepto usado no app. Todos os ajustes são resolvidos a partir da matriz
+# de Gram (XᵀX, Xᵀy), calculada uma única vez por conjunto de pontos, de modo
+# que cada candidato custa O(k³) em vez de um novo ajuste sobre os N pontos.
+# Quando nenhum preditor passa no critério do método, o modelo fica com o
+# melhor preditor isolado (menor soma dos quadrados dos resíduos), e o
+# resultado sai marcado com 'substituto'.
+import itertools
+
+import numpy as np
+import pandas as pd
+
+METODOS = {
+    'unico': 'Eliminação única (p-valor)',
+    'backward': 'Eliminação backward',
+    'forward': 'Seleção forward',
+    'melhor_subconjunto': 'Melhor subconjunto (BIC)',
+}
+
+
+class SistemaNormal:
+    """Equações normais de várias respostas sobre as mesmas colunas.
+
+    As colunas são normalizadas pela norma para melhorar o condicionamento
+    da matriz de Gram; os coeficientes voltam na escala original.
+    """
+
+    def __init__(self, X, Y):
+        X = np.asarray(X, dtype=np.float64)
+        Y = np.asarray(Y, dtype=np.float64)
+        self._iniciar(X.T @ X, X.T @ Y, np.einsum('ij,ij->j', Y, Y), X.shape[0])
+
+    @classmethod
+    def de_estatisticas(cls, XtX, XtY, yty, n):
+        """Sistema montado direto das estatísticas suficientes (XᵀX, XᵀY, yᵀy, n)."""
+        XtX = np.asarray(XtX, dtype=np.float64)
+        sistema = cls.__new__(cls)
+        sistema._iniciar(XtX, np.asarray(XtY, dtype=np.float64).reshape(len(XtX), -1),
+                         np.atleast_1d(np.asarray(yty, dtype=np.float64)), int(n))
+        return sistema
+
+    def _iniciar(self, G, XtY, yy, n):
+        self.n = n
+        escala = np.sqrt(np.diag(G))
+        escala[escala == 0] = 1.0
+        self.escala = escala
+        self.G = G / np.outer(escala, escala)
+        self.B = XtY / escala[:, None]
+        self.yy = yy
+
+    def ajustar(self, idx, j):
+        """Ajusta a resposta `j` com as colunas `idx`.
+
+        Retorna (coeficientes, p-valores, soma dos quadrados dos resíduos).
+        """
+        from scipy import stats  # só na primeira seleção, não no import do app
+
+        idx = list(idx)
+        G = self.G[np.ix_(idx, idx)]
+        b = self.B[idx, j]
+        G_inv = np.linalg.pinv(G)
+        beta = G_inv @ b
+        rss = max(self.yy[j] - beta @ b, 0.0)
+        gl = self.n - len(idx)
+        if gl > 0:
+            sigma2 = rss / gl
+            erro = np.sqrt(np.maximum(np.diag(G_inv) * sigma2, 0.0))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = beta / erro
+            p = 2 * stats.t.sf(np.abs(t), gl)
+        else:
+            p = np.full(len(idx), np.nan)
+        return beta / self.escala[idx], p, rss
+
+    def rss_em_lote(self, subconjuntos, j):
+        """RSS de vários subconjuntos de mesmo tamanho em uma só resolução."""
+        idx = np.asarray(subconjuntos)
+        G = self.G[idx[:, :, None], idx[:, None, :]]
+        b = self.B[idx, j]
+        try:
+            beta = np.linalg.solve(G, b[..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            beta = np.einsum('mij,mj->mi', np.linalg.pinv(G), b)
+        return np.maximum(self.yy[j] - np.einsum('mi,mi->m', beta, b), 0.0)
+
+
+def _bic(n, rss, k):
+    return n * np.log(np.maximum(rss, 1e-300) / n) + k * np.log(n)
+
+
+def _unico(sistema, idx, j, p_limite):
+    _, p, _ = sistema.ajustar(idx, j)
+    return [i for i, pv in zip(idx, p) if pv < p_limite]
+
+
+def _backward(sistema, idx, j, p_limite):
+    atual = list(idx)
+    while atual:
+        _, p, _ = sistema.ajustar(atual, j)
+        pior = int(np.nanargmax(p)) if not np.all(np.isnan(p)) else 0
+        if p[pior] < p_limite:
+            break
+        atual.pop(pior)
+    return atual
+
+
+def _forward(sistema, idx, j, p_limite):
+    atual, restantes = [], list(idx)
+    while restantes and len(atual) + 1 < sistema.n:
+        melhores = []
+        for c in restantes:
+            _, p, rss = sistema.ajustar(atual + [c], j)
+            melhores.append((p[-1], rss, c))
+        p, _, c = min(melhores, key=lambda m: (np.nan_to_num(m[0], nan=1.0), m[1]))
+        if not p < p_limite:
+            break
+        atual.append(c)
+        restantes.remove(c)
+    return atual
+
+
+def _melhor_subconjunto(sistema, idx, j, p_limite=None):
+    melhor, melhor_bic = [], np.inf
+    for k in range(1, min(len(idx), sistema.n - 1) + 1):
+        subconjuntos = list(itertools.combinations(idx, k))
+        bic = _bic(sistema.n, sistema.rss_em_lote(subconjuntos, j), k)
+        m = int(np.argmin(bic))
+        if bic[m] < melhor_bic:
+            melhor, melhor_bic = list(subconjuntos[m]), bic[m]
+    return melhor
+
+
+_ESTRATEGIAS = {
+    'unico': _unico,
+    'backward': _backward,
+    'forward': _forward,
+    'melhor_subconjunto': _melhor_subconjunto,
+}
+
+
+def _escolher(sistema, idx, j, metodo, p_limite):
+    """Preditores escolhidos por `metodo` e se houve substituição pelo
+    melhor preditor isolado (nenhum passou no critério)."""
+    escolhidos = _ESTRATEGIAS[metodo](sistema, idx, j, p_limite)
+    if escolhidos or not idx:
+        return escolhidos, False
+    rss = sistema.rss_em_lote([[i] for i in idx], j)
+    return [idx[int(np.argmin(rss))]], True
+
+
+def _resultado(sistema, colunas, escolhidos, j, substituto=False):
+    nomes = [colunas[i] for i in escolhidos]
+    if escolhidos:
+        beta, p, _ = sistema.ajustar(escolhidos, j)
+    else:
+        beta, p = np.array([]), np.array([])
+    return {
+        'preditores': nomes,
+        'params': pd.Series(beta, index=nomes),
+        'pvalues': pd.Series(p, index=nomes),
+        'substituto': substituto,
+    }
+
+
+def linhas_validas(dados, parametro, candidatos):
+    """Máscara das linhas com `parametro` e todos os `candidatos` finitos.
+
+    É o mesmo critério na seleção da sessão e no registro de modelos.
+    """
+    X = dados[list(candidatos)].to_numpy(dtype=np.float64)
+    y = dados[parametro].to_numpy(dtype=np.float64)
+    return np.isfinite(X).all(axis=1) & np.isfinite(y)
+
+
+def selecionar_de_estatisticas(XtX, Xty, yty, n, colunas, metodo='unico',
+                               p_limite=0.05):
+    """Seleção de uma resposta a partir das estatísticas suficientes.
+
+    Mesmo resultado de `selecionar_modelos` para um parâmetro, sem precisar
+    dos pontos originais.
+    """
+    if metodo not in _ESTRATEGIAS:
+        raise ValueError(f"Método de seleção desconhecido: {metodo}")
+    sistema = SistemaNormal.de_estatisticas(XtX, Xty, yty, n)
+    escolhidos, substituto = _escolher(
+        sistema, list(range(len(colunas))), 0, metodo, p_limite)
+    return _resultado(sistema, list(colunas), escolhidos, 0, substituto)
+
+
+def selecionar_modelos(dados, candidatos_por_parametro, metodo='unico',
+                       p_limite=0.05):
+    """Seleciona os preditores de todos os parâmetros em uma só passada.
+
+    A matriz de Gram de todas as colunas candidatas é montada uma vez para
+    cada conjunto de linhas válidas e compartilhada entre os parâmetros.
+
+    Retorna {parametro: {'preditores', 'params', 'pvalues', 'substituto',
+    'validas'}}, em que 'validas' é a máscara das linhas de `dados` usadas
+    na seleção e 'substituto' indica que nenhum preditor passou no critério
+    e ficou o melhor preditor isolado.
+    """
+    if metodo not in _ESTRATEGIAS:
+        raise ValueError(f"Método de seleção desconhecido: {metodo}")
+
+    colunas = list(dict.fromkeys(
+        c for cands in candidatos_por_parametro.values() for c in cands))
+    X = dados[colunas].to_numpy(dtype=np.float64)
+
+    # Parâmetros com as mesmas linhas válidas compartilham o mesmo sistema
+    grupos = {}
+    for parametro, candidatos in candidatos_por_parametro.items():
+        validas = linhas_validas(dados, parametro, candidatos)
+        grupos.setdefault(validas.tobytes(), (validas, []))[1].append(parametro)
+
+    resultados = {}
+    for validas, parametros in grupos.values():
+        # Colunas de outros parâmetros podem não ser finitas nessas linhas;
+        # zeradas, só afetam entradas da matriz que este grupo não usa
+        Xv = X[validas]
+        sistema = SistemaNormal(np.where(np.isfinite(Xv), Xv, 0.0),
+                                dados.loc[validas, parametros])
+        for j, parametro in enumerate(parametros):
+            idx = [colunas.index(c) for c in candidatos_por_parametro[parametro]]
+            escolhidos, substituto = _escolher(sistema, idx, j, metodo, p_limite)
+            resultados[parametro] = _resultado(sistema, colunas, escolhidos, j, substituto)
+            resultados[parametro]['validas'] = validas
+    return resultados
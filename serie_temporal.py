@@ -0,0 +1,98 @@
+# SÉRIE TEMPORAL
+# Aplica os modelos ajustados a todas as cenas da coleção filtrada e resume a
+# estimativa sobre a área de estudo (o envoltório dos pontos usado também na
+# triagem das cenas), cena a cena, no servidor.
+import hashlib
+import json
+from concurrent.futures import as_completed
+
+import ee
+import pandas as pd
+
+import executor_ee
+from indices import BANDAS
+from prediction_model import aplicar_modelo_na_imagem, bandas_esperadas, equacao_bandas
+from preprocessing import mask_cloud_and_shadows_sr
+from triagem import area_triagem
+
+PERCENTIS = [10, 50, 90]
+
+
+def _reducer():
+    return ee.Reducer.mean() \
+        .combine(ee.Reducer.percentile(PERCENTIS), sharedInputs=True) \
+        .combine(ee.Reducer.count(), sharedInputs=True)
+
+
+def chave_modelos(modelos, area, limiar_mndwi, escala):
+    """Identifica o conjunto (modelos, área, limiar, escala) de uma série."""
+    texto = json.dumps({'modelos': modelos, 'limiar': limiar_mndwi,
+                        'escala': escala}, sort_keys=True) + area.serialize()
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]
+
+
+def _estatisticas_da_cena(modelos, geometria, limiar_mndwi, escala):
+    parametros = list(modelos)
+    disponiveis = bandas_esperadas(parametros)
+
+    def resumir(image):
+        img = equacao_bandas(mask_cloud_and_shadows_sr(image).select(BANDAS), parametros)
+        agua = img.normalizedDifference(['B3', 'B11']).gte(limiar_mndwi)
+        estimativas = ee.Image.cat([
+            aplicar_modelo_na_imagem(list(coefs), coefs, img,
+                                     bandas_disponiveis=disponiveis).rename(p)
+            for p, coefs in modelos.items()
+        ])
+        estimativas = estimativas.where(estimativas.lt(0), 0).updateMask(agua)
+        stats = estimativas.reduceRegion(
+            reducer=_reducer(), geometry=geometria, scale=escala,
+            maxPixels=1e10, bestEffort=True)
+        return ee.Feature(None, stats).set({
+            'id': image.get('system:index'),
+            'data': ee.Date(image.get('system:time_start')).format('YYYY-MM-dd'),
+        })
+
+    return resumir
+
+
+def estatisticas_por_cena(collection, ids, modelos, roi, limiar_mndwi=0.0,
+                          escala=20, tamanho_pagina=25, cache=None,
+                          progresso=None, area=None):
+    """Média, percentis e número de pixels de água por cena e parâmetro.
+
+    `modelos` é {parametro: {preditor: coeficiente}}. As estatísticas são
+    calculadas em `area` (um polígono; por padrão, `area_triagem(roi)`), e
+    não só nos pontos de coleta. `collection` vem sem máscara
+    (`colecao_s2`): só as cenas `ids` são mascaradas e resumidas por um
+    `map` + `reduceRegion` no servidor e trazidas em páginas de
+    `tamanho_pagina` cenas por requisição. Com `cache` (um dict), cenas já
+    resumidas para os mesmos modelos, área e limiar não são pedidas de novo.
+    `progresso(feitas, total)` é chamado após cada página. As páginas vão
+    juntas ao executor do EE e são lidas na ordem em que ficam prontas.
+    """
+    cache = {} if cache is None else cache
+    area = area_triagem(roi) if area is None else area
+    chave = chave_modelos(modelos, area, limiar_mndwi, escala)
+    faltando = [i for i in ids if (chave, i) not in cache]
+
+    resumir = _estatisticas_da_cena(modelos, area, limiar_mndwi, escala)
+    executor = executor_ee.padrao()
+    futuros = {}
+    for inicio in range(0, len(faltando), tamanho_pagina):
+        pagina = faltando[inicio:inicio + tamanho_pagina]
+        resumo = collection.filter(ee.Filter.inList('system:index', pagina)) \
+            .map(resumir)
+        futuros[executor.submeter(resumo)] = len(pagina)
+
+    feitas = 0
+    for futuro in as_completed(futuros):
+        for f in futuro.result()['features']:
+            cache[(chave, f['properties']['id'])] = f['properties']
+        feitas += futuros[futuro]
+        if progresso:
+            progresso(feitas, len(faltando))
+
+    linhas = [cache[(chave, i)] for i in ids if (chave, i) in cache]
+    if not linhas:
+        return pd.DataFrame()
+    return pd.DataFrame(linhas).set_index('data').sort_index()
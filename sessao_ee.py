@@ -0,0 +1,64 @@
+# SESSÃO DO EARTH ENGINE
+# Inicialização única por processo: o app chama `iniciar` a cada rerun, mas
+# as credenciais só são lidas e o `ee.Initialize` só roda na primeira vez.
+# Nas seguintes, `renovar_token` apenas confere a validade do token de acesso
+# e o renova pouco antes de expirar, sem ir ao servidor do EE.
+import os
+import threading
+from datetime import datetime, timezone
+
+import ee
+
+import rastreamento
+
+# Conta de serviço e arquivo JSON da chave; sem eles, credenciais padrão
+CONTA_PADRAO = os.environ.get('QASAT_EE_CONTA')
+CHAVE_PADRAO = os.environ.get('QASAT_EE_CHAVE')
+
+# Renova o token quando faltar menos do que isso (em segundos) para expirar
+MARGEM_TOKEN = 5 * 60
+
+_lock = threading.Lock()
+_INICIADA = False
+_CREDENCIAIS = None
+
+
+def iniciar(conta=CONTA_PADRAO, chave=CHAVE_PADRAO):
+    """Inicializa o Earth Engine uma vez por processo e devolve as credenciais.
+
+    Chamadas seguintes não refazem nada (as credenciais passadas são
+    ignoradas). Sem conta e chave, usa as credenciais padrão do `ee`.
+    """
+    global _INICIADA, _CREDENCIAIS
+    with _lock:
+        if not _INICIADA:
+            if conta and chave:
+                _CREDENCIAIS = ee.ServiceAccountCredentials(conta, chave)
+                ee.Initialize(_CREDENCIAIS)
+            else:
+                ee.Initialize()
+            rastreamento.instrumentar_ee()
+            _INICIADA = True
+        return _CREDENCIAIS
+
+
+def renovar_token(margem=MARGEM_TOKEN):
+    """Renova o token da conta de serviço se ele expira em menos de `margem` s.
+
+    Retorna True quando houve renovação. Com credenciais padrão (ou antes de
+    `iniciar`), não faz nada: o próprio cliente do EE cuida delas.
+    """
+    credenciais = _CREDENCIAIS
+    if credenciais is None or not hasattr(credenciais, 'refresh'):
+        return False
+    # `expiry` das credenciais do google-auth é um datetime UTC sem fuso
+    expira = getattr(credenciais, 'expiry', None)
+    agora = datetime.now(timezone.utc).replace(tzinfo=None)
+    if credenciais.token and expira is not None and (expira - agora).total_seconds() > margem:
+        return False
+
+    from google.auth.transport.requests import Request
+
+    with _lock:
+        credenciais.refresh(Request())
+    return True
@@ -0,0 +1,99 @@
+# EXPORTAÇÃO DE TABELAS
+# Matchups e índices de todos os parâmetros em uma única tabela com tipos
+# compactos, gravada em Parquet (por grupos de linhas) ou, opcionalmente, CSV.
+import importlib.util
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from indices import BANDAS
+
+LINHAS_POR_GRUPO = 64 * 1024
+
+# Só verifica se o pyarrow existe; importá-lo fica para a primeira gravação
+FORMATOS = (['parquet', 'csv'] if importlib.util.find_spec('pyarrow') is not None
+            else ['csv'])
+
+MIME = {'parquet': 'application/vnd.apache.parquet', 'csv': 'text/csv'}
+
+
+def tabela_matchups(df_ref, df_indices, parametros):
+    """Reflectâncias, valores in situ e índices em float32, data categórica
+    e a geometria do ponto em WKB."""
+    import shapely
+
+    colunas = {}
+    for coluna in list(BANDAS) + list(parametros) + list(df_indices.columns):
+        origem = df_indices if coluna in df_indices.columns else df_ref
+        if coluna in origem.columns:
+            colunas[coluna] = origem[coluna].to_numpy(dtype=np.float32)
+    colunas['date'] = pd.Categorical(df_ref['date'].astype(str))
+    colunas['lon'] = df_ref['lon'].to_numpy(dtype=np.float64)
+    colunas['lat'] = df_ref['lat'].to_numpy(dtype=np.float64)
+    colunas['geometry'] = shapely.to_wkb(
+        shapely.points(colunas['lon'], colunas['lat']))
+    return pd.DataFrame(colunas)
+
+
+def _lotes(tabela, linhas_por_grupo):
+    for inicio in range(0, len(tabela), linhas_por_grupo):
+        yield tabela.iloc[inicio:inicio + linhas_por_grupo]
+
+
+def escrever_parquet(tabela, destino, linhas_por_grupo=LINHAS_POR_GRUPO):
+    """Grava `tabela` em um arquivo Parquet, um grupo de linhas por vez.
+
+    `destino` é um caminho ou um arquivo binário (ex.: BytesIO).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(tabela.iloc[:0], preserve_index=False)
+    with pq.ParquetWriter(destino, schema, compression='zstd') as escritor:
+        for lote in _lotes(tabela, linhas_por_grupo):
+            escritor.write_table(
+                pa.Table.from_pandas(lote, schema=schema, preserve_index=False))
+    return destino
+
+
+def escrever_dataset(tabela, pasta, linhas_por_grupo=LINHAS_POR_GRUPO):
+    """Dataset Parquet particionado por ano da coleta (pasta/ano=AAAA/...)."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    tabela = tabela.assign(ano=tabela['date'].astype(str).str[:4].astype(int))
+    schema = pa.Schema.from_pandas(tabela.iloc[:0], preserve_index=False)
+    lotes = (pa.RecordBatch.from_pandas(lote, schema=schema, preserve_index=False)
+             for lote in _lotes(tabela, linhas_por_grupo))
+    ds.write_dataset(
+        lotes, pasta, schema=schema, format='parquet',
+        partitioning=ds.partitioning(pa.schema([('ano', pa.int64())]), flavor='hive'),
+        existing_data_behavior='delete_matching',
+        max_rows_per_group=linhas_por_grupo,
+        file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'))
+    return pasta
+
+
+def escrever_csv(tabela, destino, linhas_por_grupo=LINHAS_POR_GRUPO):
+    """CSV em blocos de linhas, sem a coluna de geometria binária."""
+    tabela = tabela.drop(columns='geometry')
+    fechar = isinstance(destino, (str, os.PathLike))
+    arquivo = open(destino, 'w', encoding='utf-8', newline='') if fechar else destino
+    try:
+        for i, lote in enumerate(_lotes(tabela, linhas_por_grupo)):
+            lote.to_csv(arquivo, index=False, header=i == 0)
+    finally:
+        if fechar:
+            arquivo.close()
+    return destino
+
+
+def tabela_em_bytes(tabela, formato='parquet'):
+    """Conteúdo do arquivo para download, no formato pedido."""
+    if formato == 'parquet':
+        return escrever_parquet(tabela, io.BytesIO()).getvalue()
+    texto = io.StringIO()
+    escrever_csv(tabela, texto)
+    return texto.getvalue().encode('utf-8')
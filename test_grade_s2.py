@@ -0,0 +1,50 @@
+import geopandas as gpd
+import pandas as pd
+import pytest
+
+from grade_s2 import indexar_pontos, pedidos_por_pixel
+
+# Tiles do Sentinel-2 que cobrem pontos conhecidos (zonas ímpares e pares,
+# hemisférios sul e norte)
+TILES_CONHECIDOS = [
+    ((-43.9500, -19.8500), '23KPU'),   # Belo Horizonte
+    ((2.3522, 48.8566), '31UDQ'),      # Paris
+    ((12.4964, 41.9028), '33TTG'),     # Roma
+    ((9.1900, 45.4642), '32TNR'),      # Milão
+]
+
+
+def _pontos(coords, crs=4326, datas=None):
+    x, y = zip(*coords)
+    dados = {'date': pd.to_datetime(datas or ['2024-01-01'] * len(coords))}
+    return gpd.GeoDataFrame(dados, geometry=gpd.points_from_xy(x, y), crs=crs)
+
+
+@pytest.mark.parametrize('coords, tile', TILES_CONHECIDOS)
+def test_tile_mgrs_de_pontos_conhecidos(coords, tile):
+    assert indexar_pontos(_pontos([coords]))['tile'].iloc[0] == tile
+
+
+def test_pixel_na_grade_utm():
+    # Pontos dados em UTM 23S, dentro dos pixels (61000, 780401) e (61000, 780402)
+    utm = _pontos([(610003.0, 7804012.0), (610007.5, 7804019.9), (610001.0, 7804021.0)],
+                  crs=32723).to_crs(4326)
+    indice = indexar_pontos(utm)
+    assert (indice['epsg'] == 32723).all()
+    assert indice['coluna'].tolist() == [61000, 61000, 61000]
+    assert indice['linha'].tolist() == [780401, 780401, 780402]
+
+
+def test_pedidos_por_pixel_agrupa_e_centraliza():
+    utm = _pontos([(610003.0, 7804012.0), (610007.5, 7804019.9), (610001.0, 7804021.0),
+                   (610003.0, 7804012.0)], crs=32723,
+                  datas=['2024-01-01', '2024-01-01', '2024-01-01', '2024-02-01'])
+    pedidos, grupo = pedidos_por_pixel(utm.to_crs(4326))
+
+    # Mesmo pixel e data: um pedido só; outra data: outro pedido
+    assert len(pedidos) == 3
+    assert grupo[0] == grupo[1] and len(set(grupo)) == 3
+    centros = pedidos.set_crs(4326, allow_override=True).to_crs(32723).geometry
+    assert centros.iloc[grupo[0]].x == pytest.approx(610005.0, abs=1e-3)
+    assert centros.iloc[grupo[0]].y == pytest.approx(7804015.0, abs=1e-3)
+    assert (pedidos['tile'] == '23KPU').all()
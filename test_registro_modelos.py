@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from registro_modelos import RegistroModelos
+from selecao_modelo import METODOS, selecionar_modelos
+
+
+def _matchups(n=80, semente=0):
+    rng = np.random.default_rng(semente)
+    dados = pd.DataFrame(rng.uniform(0.01, 0.2, (n, 4)), columns=['a', 'b', 'c', 'd'])
+    dados['TURBIDEZ'] = 20 * dados['a'] + 8 * dados['b'] + rng.normal(0, 0.2, n)
+    dados['CHLA'] = 15 * dados['c'] - 4 * dados['d'] + rng.normal(0, 0.2, n)
+    # Índices inválidos só nos candidatos de um parâmetro, e um y ausente
+    dados.loc[3, 'd'] = np.inf
+    dados.loc[7, 'c'] = np.nan
+    dados.loc[11, 'TURBIDEZ'] = np.nan
+    dados['lon'] = rng.uniform(-44.0, -43.9, n)
+    dados['lat'] = rng.uniform(-19.9, -19.8, n)
+    dados['date'] = '2024-03-01'
+    return dados
+
+
+CANDIDATOS = {'TURBIDEZ': ['a', 'b', 'c'], 'CHLA': ['b', 'c', 'd']}
+
+
+@pytest.mark.parametrize('metodo', list(METODOS))
+def test_registrar_reproduz_o_ajuste_da_sessao(tmp_path, metodo):
+    dados = _matchups()
+    selecoes = selecionar_modelos(dados, CANDIDATOS, metodo=metodo)
+    registro = RegistroModelos(str(tmp_path / 'modelos.npz'))
+    for parametro, candidatos in CANDIDATOS.items():
+        modelo = registro.registrar(dados, parametro, candidatos, metodo=metodo)
+        sessao = selecoes[parametro]
+        assert modelo['preditores'] == sessao['preditores']
+        assert modelo['n'] == int(sessao['validas'].sum())
+        np.testing.assert_allclose(
+            [modelo['coeficientes'][p] for p in sessao['preditores']],
+            sessao['params'].to_numpy(), rtol=1e-9)
+
+
+def test_atualizar_ignora_matchups_ja_incluidos(tmp_path):
+    dados = _matchups()
+    registro = RegistroModelos(str(tmp_path / 'modelos.npz'))
+    antes = registro.registrar(dados, 'TURBIDEZ', CANDIDATOS['TURBIDEZ'])
+    depois = registro.atualizar('TURBIDEZ', dados)
+    assert depois['n'] == antes['n']
+    assert depois['campanhas'] == 1
@@ -0,0 +1,95 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from selecao_modelo import (METODOS, SistemaNormal, selecionar_de_estatisticas,
+                            selecionar_modelos)
+
+
+def _dados(n=60, semente=0):
+    rng = np.random.default_rng(semente)
+    dados = pd.DataFrame(rng.uniform(0.01, 0.2, (n, 4)), columns=['a', 'b', 'c', 'd'])
+    dados['y'] = 30 * dados['a'] - 5 * dados['c'] + rng.normal(0, 0.1, n)
+    return dados
+
+
+@pytest.mark.parametrize('metodo', ['unico', 'backward', 'forward'])
+def test_sem_preditor_significativo_usa_o_melhor_isolado(metodo):
+    dados = _dados()
+    candidatos = ['a', 'b', 'c', 'd']
+    # Com p_limite = 0 nenhum preditor passa no critério
+    sel = selecionar_modelos(dados, {'y': candidatos}, metodo=metodo, p_limite=0.0)['y']
+
+    rss = [np.linalg.lstsq(dados[[c]], dados['y'], rcond=None)[1][0] for c in candidatos]
+    assert sel['substituto']
+    assert sel['preditores'] == [candidatos[int(np.argmin(rss))]]
+    assert len(sel['params']) == 1
+
+
+def test_substituto_tambem_nas_estatisticas_suficientes():
+    dados = _dados()
+    X = dados[['a', 'b', 'c', 'd']].to_numpy()
+    y = dados['y'].to_numpy()
+    sel = selecionar_de_estatisticas(X.T @ X, X.T @ y, y @ y, len(y), list('abcd'),
+                                     metodo='backward', p_limite=0.0)
+    assert sel['substituto']
+    assert len(sel['preditores']) == 1
+
+
+@pytest.mark.parametrize('metodo', list(METODOS))
+def test_selecao_normal_nao_e_substituta(metodo):
+    sel = selecionar_modelos(_dados(), {'y': ['a', 'b', 'c', 'd']}, metodo=metodo)['y']
+    assert not sel['substituto']
+    assert 'a' in sel['preditores']
+
+
+CANDIDATOS = ['a', 'b', 'c', 'd']
+
+
+def _ols(dados, colunas):
+    sm = pytest.importorskip('statsmodels.api')
+    return sm.OLS(dados['y'], dados[list(colunas)]).fit()
+
+
+def test_ajuste_pela_matriz_de_gram_igual_ao_statsmodels():
+    dados = _dados()
+    sistema = SistemaNormal(dados[CANDIDATOS], dados[['y']])
+    for idx in ([0, 1, 2, 3], [0, 2], [1]):
+        beta, p, rss = sistema.ajustar(idx, 0)
+        ref = _ols(dados, [CANDIDATOS[i] for i in idx])
+        np.testing.assert_allclose(beta, ref.params.to_numpy(), rtol=1e-8)
+        np.testing.assert_allclose(p, ref.pvalues.to_numpy(), rtol=1e-6, atol=1e-12)
+        np.testing.assert_allclose(rss, ref.ssr, rtol=1e-8)
+
+
+def test_unico_igual_ao_ajuste_do_app_original():
+    dados = _dados(semente=3)
+    completo = _ols(dados, CANDIDATOS)
+    esperado = [c for c in CANDIDATOS if completo.pvalues[c] < 0.05]
+    sel = selecionar_modelos(dados, {'y': CANDIDATOS}, metodo='unico')['y']
+    assert sel['preditores'] == esperado
+    np.testing.assert_allclose(sel['params'].to_numpy(),
+                               _ols(dados, esperado).params.to_numpy(), rtol=1e-8)
+
+
+def test_backward_igual_a_eliminacao_com_statsmodels():
+    dados = _dados(semente=5)
+    atual = list(CANDIDATOS)
+    while atual:
+        pvalores = _ols(dados, atual).pvalues
+        if pvalores.max() < 0.05:
+            break
+        atual.remove(pvalores.idxmax())
+    sel = selecionar_modelos(dados, {'y': CANDIDATOS}, metodo='backward')['y']
+    assert sel['preditores'] == atual
+
+
+def test_melhor_subconjunto_igual_ao_menor_bic_do_statsmodels():
+    dados = _dados(semente=7)
+    subconjuntos = [list(c) for k in range(1, len(CANDIDATOS) + 1)
+                    for c in itertools.combinations(CANDIDATOS, k)]
+    esperado = min(subconjuntos, key=lambda c: _ols(dados, c).bic)
+    sel = selecionar_modelos(dados, {'y': CANDIDATOS}, metodo='melhor_subconjunto')['y']
+    assert sel['preditores'] == esperado
@@ -0,0 +1,25 @@
+import numpy as np
+
+from zonas import _percentis_por_rotulo
+
+
+def test_percentis_por_rotulo_igual_ao_np_percentile():
+    rng = np.random.default_rng(0)
+    n_zonas = 6
+    # A zona 4 fica sem pixels e a 5 com um só
+    rotulos = rng.choice([0, 1, 2, 3], 500)
+    rotulos = np.concatenate([rotulos, [5]])
+    valores = rng.gamma(2.0, 3.0, len(rotulos))
+    contagem = np.bincount(rotulos, minlength=n_zonas)
+    percentis = [0, 10, 25, 50, 75, 90, 100]
+
+    resultado = _percentis_por_rotulo(rotulos, valores, contagem, percentis)
+
+    for zona in range(n_zonas):
+        for p in percentis:
+            obtido = resultado[f'p{p}'][zona]
+            if contagem[zona] == 0:
+                assert np.isnan(obtido)
+            else:
+                esperado = np.percentile(valores[rotulos == zona], p)
+                np.testing.assert_allclose(obtido, esperado, rtol=1e-12)
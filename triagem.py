@@ -0,0 +1,48 @@
+# TRIAGEM DE CENAS
+# Qualidade de cada cena sobre a área de estudo, e não sobre o tile inteiro
+# (CLOUDY_PIXEL_PERCENTAGE). Um único `reduceRegion` por cena, mapeado no
+# servidor, dá a fração da área sem nuvem, sombra, cirrus ou neve (mesma
+# lógica de MSK_CLDPRB/MSK_SNWPRB/SCL da máscara) e a fração de água válida.
+# As cenas são ordenadas por essas frações e a máscara completa (com a
+# reescala das bandas) só é aplicada às cenas efetivamente usadas.
+import ee
+
+from preprocessing import mascara_valida, mask_cloud_and_shadows_sr
+
+# Resolução das bandas SCL e MSK_*, em metros
+ESCALA_TRIAGEM = 20
+
+# MNDWI a partir do qual o pixel válido conta como água
+LIMIAR_AGUA = 0.0
+
+# Margem, em metros, em volta do envoltório dos pontos de coleta
+MARGEM_AREA = 50
+
+
+def area_triagem(roi, margem=MARGEM_AREA):
+    """Envoltório convexo dos pontos da área de estudo, com uma margem."""
+    return roi.geometry().convexHull(1).buffer(margem, 1)
+
+
+def triar(geometria, limiar_agua=LIMIAR_AGUA, escala=ESCALA_TRIAGEM):
+    """Função para `ImageCollection.map` que grava em cada cena as frações
+    'valida' e 'agua_valida' (de 0 a 1) dos pixels de `geometria`."""
+    def _triar(image):
+        valida = mascara_valida(image)
+        agua = image.normalizedDifference(['B3', 'B11']).gte(limiar_agua)
+        fracoes = ee.Image.cat([
+            valida.rename('valida'),
+            valida.And(agua).rename('agua_valida'),
+        ]).unmask(0)
+        medias = fracoes.reduceRegion(
+            reducer=ee.Reducer.mean(), geometry=geometria, scale=escala,
+            maxPixels=1e9, bestEffort=True)
+        return image.set(medias)
+    return _triar
+
+
+def melhor_cena(colecao, geometria, criterio='valida'):
+    """Cena da coleção com a maior fração `criterio` em `geometria`, já
+    mascarada. Só as cenas da coleção passam pela triagem."""
+    triadas = colecao.map(triar(geometria)).sort(criterio, False)
+    return mask_cloud_and_shadows_sr(ee.Image(triadas.first()))
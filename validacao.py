@@ -0,0 +1,106 @@
+# VALIDAÇÃO DOS MODELOS
+# Validação cruzada leave-one-out (forma fechada), k-fold e bootstrap para o
+# OLS sem intercepto, sem reajustar o modelo ponto a ponto.
+import numpy as np
+import pandas as pd
+
+
+def _preparar(X, y):
+    dados = pd.concat([X, y], axis=1).replace([np.inf, -np.inf], np.nan).dropna()
+    return (dados[X.columns].to_numpy(dtype=np.float64),
+            dados[y.name].to_numpy(dtype=np.float64))
+
+
+def _exigir_preditores(X):
+    if X.shape[1] == 0:
+        raise ValueError("O modelo não tem preditores: não há o que validar.")
+
+
+def _rmse(residuos, axis=None):
+    return np.sqrt(np.mean(residuos ** 2, axis=axis))
+
+
+def residuos_loo(X, y):
+    """Resíduos leave-one-out pela matriz chapéu: e_i / (1 - h_ii)."""
+    _exigir_preditores(X)
+    Q, _ = np.linalg.qr(X)
+    h = np.einsum('ij,ij->i', Q, Q)
+    beta = np.linalg.lstsq(X, y, rcond=None)[0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (y - X @ beta) / (1 - h)
+
+
+def rmse_kfold(X, y, k=5, semente=0):
+    """RMSE de validação k-fold resolvido pelas equações normais.
+
+    A matriz de Gram de cada fold é obtida subtraindo a contribuição das
+    linhas de teste da matriz completa.
+    """
+    _exigir_preditores(X)
+    n = len(y)
+    k = min(k, n)
+    ordem = np.random.default_rng(semente).permutation(n)
+    G, b = X.T @ X, X.T @ y
+    residuos = np.empty(n)
+    for teste in np.array_split(ordem, k):
+        Xt, yt = X[teste], y[teste]
+        beta = np.linalg.lstsq(G - Xt.T @ Xt, b - Xt.T @ yt, rcond=None)[0]
+        residuos[teste] = yt - Xt @ beta
+    return _rmse(residuos)
+
+
+def bootstrap(X, y, n_replicas=1000, nivel=0.95, semente=0):
+    """Intervalos bootstrap dos coeficientes e do RMSE fora da amostra.
+
+    Cada réplica é representada pelos pesos (contagens) de reamostragem, e
+    todas são resolvidas juntas como um único problema de mínimos quadrados
+    empilhado: G_b = Xᵀ diag(w_b) X e b_b = Xᵀ diag(w_b) y.
+    """
+    _exigir_preditores(X)
+    n, p = X.shape
+    rng = np.random.default_rng(semente)
+    pesos = rng.multinomial(n, np.full(n, 1.0 / n), size=n_replicas).astype(np.float64)
+
+    G = (pesos @ (X[:, :, None] * X[:, None, :]).reshape(n, p * p)).reshape(-1, p, p)
+    b = pesos @ (X * y[:, None])
+    G_inv = np.linalg.pinv(G)
+    betas = np.einsum('rij,rj->ri', G_inv, b)
+
+    # RMSE nas linhas que ficaram fora de cada réplica
+    residuos = y[None, :] - betas @ X.T
+    fora = pesos == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rmse_fora = np.sqrt((residuos ** 2 * fora).sum(axis=1) / fora.sum(axis=1))
+    rmse_fora = rmse_fora[np.isfinite(rmse_fora)]
+
+    alfa = (1 - nivel) / 2
+    quantis = [alfa, 1 - alfa]
+    return np.quantile(betas, quantis, axis=0), np.quantile(rmse_fora, quantis)
+
+
+def validar_modelo(X, y, k=5, n_replicas=1000, nivel=0.95, semente=0):
+    """Resumo de validação do modelo final (X já com os preditores escolhidos).
+
+    Levanta ValueError se X não tem colunas.
+    """
+    _exigir_preditores(X)
+    colunas = list(X.columns)
+    Xv, yv = _preparar(X, y)
+    beta = np.linalg.lstsq(Xv, yv, rcond=None)[0]
+    loo = residuos_loo(Xv, yv)
+    coef_ic, rmse_ic = bootstrap(Xv, yv, n_replicas, nivel, semente)
+    return {
+        'n': len(yv),
+        'rmse': _rmse(yv - Xv @ beta),
+        'rmse_loo': _rmse(loo),
+        'press': float(np.sum(loo ** 2)),
+        'rmse_kfold': rmse_kfold(Xv, yv, k, semente),
+        'k': min(k, len(yv)),
+        'nivel': nivel,
+        'rmse_ic': tuple(rmse_ic),
+        'coeficientes': pd.DataFrame({
+            'coef': beta,
+            'ic_inf': coef_ic[0],
+            'ic_sup': coef_ic[1],
+        }, index=colunas),
+    }
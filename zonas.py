@@ -0,0 +1,157 @@
+# ESTATÍSTICAS ZONAIS
+# Resumo da estimativa por zona (reservatório, braço do reservatório, ...):
+# média, mediana, percentis, número de pixels e histograma, só nos pixels de
+# água (a estimativa já vem com a máscara do MNDWI). No Earth Engine, todas
+# as zonas saem de uma única chamada a `reduceRegions`; sobre um GeoTIFF já
+# baixado, as zonas são rasterizadas em um array de rótulos e agregadas com
+# `np.bincount`, sem um laço de máscaras por polígono.
+import json
+
+import ee
+import numpy as np
+import pandas as pd
+
+import executor_ee
+from rastreamento import rastreado
+
+PERCENTIS = [10, 25, 50, 75, 90]
+
+# Faixa (mín., máx.) e número de classes do histograma, na unidade do parâmetro
+FAIXA_HISTOGRAMA = (0.0, 5.0)
+CLASSES_HISTOGRAMA = 20
+
+
+def _nomes_das_zonas(gdf, campo):
+    if campo is not None:
+        return gdf[campo].astype(str).tolist()
+    return [str(i) for i in gdf.index]
+
+
+def _colunas_estatisticas(percentis):
+    return ['media'] + [f'p{p}' for p in percentis] + ['pixels']
+
+
+def _reducer(percentis, faixa, classes):
+    return ee.Reducer.mean() \
+        .combine(ee.Reducer.percentile(percentis), sharedInputs=True) \
+        .combine(ee.Reducer.count(), sharedInputs=True) \
+        .combine(ee.Reducer.fixedHistogram(faixa[0], faixa[1], classes),
+                 sharedInputs=True)
+
+
+def _tabela(nomes, colunas, percentis, faixa, classes):
+    """DataFrame por zona, com a mediana (p50) em coluna própria."""
+    df = pd.DataFrame(colunas, index=pd.Index(nomes, name='zona'))
+    if 50 in percentis:
+        df.insert(1, 'mediana', df['p50'])
+    df.attrs['bordas_histograma'] = np.linspace(faixa[0], faixa[1], classes + 1).tolist()
+    return df
+
+
+@rastreado
+def estatisticas_zonais(estimativa, zonas, campo=None, escala=20,
+                        percentis=PERCENTIS, faixa=FAIXA_HISTOGRAMA,
+                        classes=CLASSES_HISTOGRAMA):
+    """Estatísticas da imagem `estimativa` (uma banda) em cada polígono.
+
+    `zonas` é um GeoDataFrame em EPSG:4326 e `campo`, a coluna com o nome de
+    cada zona (por padrão, o índice). Todas as zonas vão em uma só chamada a
+    `reduceRegions` e voltam como uma lista por coluna.
+
+    Retorna um DataFrame indexado pela zona com 'media', 'mediana', 'pN',
+    'pixels' e 'histograma' (contagem por classe); as bordas das classes
+    ficam em `df.attrs['bordas_histograma']`.
+    """
+    nomes = _nomes_das_zonas(zonas, campo)
+    poligonos = zonas[['geometry']].copy()
+    poligonos['zona'] = range(len(zonas))
+    colecao = ee.FeatureCollection(json.loads(poligonos.to_json())['features'])
+
+    resumo = estimativa.reduceRegions(
+        collection=colecao, reducer=_reducer(percentis, faixa, classes),
+        scale=escala, tileScale=4)
+    estatisticas = _colunas_estatisticas(percentis)
+    seletores = ['zona'] + ['mean'] + [f'p{p}' for p in percentis] + ['count', 'histogram']
+    listas = executor_ee.padrao().executar(resumo.reduceColumns(
+        ee.Reducer.toList().repeat(len(seletores)), seletores
+    ).get('list'))
+
+    # Zonas sem resultado (nulos) podem faltar nas listas: cada valor vai
+    # para a posição da sua zona, e as ausentes ficam com NaN
+    zona = np.asarray(listas[0], dtype=np.int64)
+    colunas = {}
+    for j, nome in enumerate(estatisticas):
+        coluna = np.full(len(zonas), np.nan)
+        coluna[zona] = np.asarray(listas[j + 1], dtype=np.float64)
+        colunas[nome] = coluna
+    # fixedHistogram devolve [[limite inferior, contagem], ...] por zona
+    histogramas = [[0] * classes for _ in range(len(zonas))]
+    for i, histograma in zip(zona, listas[-1]):
+        if histograma:
+            histogramas[i] = [int(c) for _, c in histograma]
+    colunas['histograma'] = histogramas
+    return _tabela(nomes, colunas, percentis, faixa, classes)
+
+
+def _percentis_por_rotulo(rotulos, valores, contagem, percentis):
+    """Percentis (interpolação linear) de cada rótulo, sobre os valores
+    ordenados por (rótulo, valor)."""
+    ordenados = valores[np.lexsort((valores, rotulos))]
+    inicio = np.concatenate([[0], np.cumsum(contagem)[:-1]])
+    com_dados = contagem > 0
+    resultado = {}
+    for p in percentis:
+        posicao = inicio + (contagem - 1) * (p / 100.0)
+        abaixo = np.floor(posicao).astype(np.int64)
+        acima = np.ceil(posicao).astype(np.int64)
+        peso = posicao - abaixo
+        valor = np.full(len(contagem), np.nan)
+        valor[com_dados] = (ordenados[abaixo[com_dados]] * (1 - peso[com_dados])
+                            + ordenados[acima[com_dados]] * peso[com_dados])
+        resultado[f'p{p}'] = valor
+    return resultado
+
+
+@rastreado
+def estatisticas_zonais_locais(caminho_raster, zonas, campo=None,
+                               percentis=PERCENTIS, faixa=FAIXA_HISTOGRAMA,
+                               classes=CLASSES_HISTOGRAMA):
+    """Mesmas estatísticas de `estatisticas_zonais` sobre um GeoTIFF baixado.
+
+    As zonas são rasterizadas uma vez em um array de rótulos (0 = fora de
+    todas; em sobreposições vale a última zona) e cada estatística sai de
+    uma agregação sobre todos os pixels válidos de uma só vez.
+    """
+    import rasterio
+    from rasterio import features
+
+    nomes = _nomes_das_zonas(zonas, campo)
+    with rasterio.open(caminho_raster) as src:
+        geometrias = zonas.to_crs(src.crs).geometry
+        rotulos = features.rasterize(
+            ((g, i + 1) for i, g in enumerate(geometrias) if g is not None and not g.is_empty),
+            out_shape=src.shape, transform=src.transform, fill=0, dtype='int32')
+        valores = src.read(1, masked=True)
+
+    validos = (rotulos > 0) & ~np.ma.getmaskarray(valores)
+    valores = np.ma.getdata(valores)
+    validos &= np.isfinite(valores)
+    rotulos = rotulos[validos] - 1
+    valores = valores[validos].astype(np.float64)
+
+    n = len(zonas)
+    contagem = np.bincount(rotulos, minlength=n)
+    soma = np.bincount(rotulos, weights=valores, minlength=n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        colunas = {'media': np.where(contagem > 0, soma / contagem, np.nan)}
+    colunas.update(_percentis_por_rotulo(rotulos, valores, contagem, percentis))
+    colunas['pixels'] = contagem.astype(np.float64)
+
+    # Como o fixedHistogram do EE: valores fora de [mín., máx.) não entram
+    largura = (faixa[1] - faixa[0]) / classes
+    classe = np.floor((valores - faixa[0]) / largura).astype(np.int64)
+    dentro = (classe >= 0) & (classe < classes)
+    histograma = np.bincount(rotulos[dentro] * classes + classe[dentro],
+                             minlength=n * classes).reshape(n, classes)
+    colunas['histograma'] = histograma.tolist()
+    return _tabela(nomes, colunas, percentis, faixa, classes)